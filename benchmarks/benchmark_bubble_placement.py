@@ -0,0 +1,121 @@
+"""
+Compares placing speech bubbles the way create_speech_bubble_metadata
+used to, drawing a position and testing it against every placed
+bubble up to 5 times, against drawing it from the free cells of an
+occupancy grid. Reports the share of bubbles placed and the time per
+bubble for pages of 1 to 8 panels. Run from the repository's root:
+
+    python -m benchmarks.benchmark_bubble_placement
+"""
+import os
+import tempfile
+import numpy as np
+from argparse import ArgumentParser
+
+from preprocesing import config_file as cfg
+from preprocesing.layout_engine.page_creator.bubble_placement import (
+    OccupancyGrid,
+    place_speech_bubble
+)
+from preprocesing.speech_bubble_writing_area import get_speech_bubble_templates
+from tests.factories import make_illustrations, make_pages, make_speech_bubbles
+from .common import timeit
+
+MAX_ATTEMPS = 5
+
+
+def rect_in_rect(r1x, r1y, r1w, r1h, r2x, r2y, r2w, r2h):
+    return r1x + r1w >= r2x and r1x <= r2x + r2w and r1y + r1h >= r2y and r1y <= r2y + r2h
+
+
+def place_by_retrying(panel, w, h, placed):
+    """
+    Place a bubble by drawing positions and testing
+    them against every placed bubble
+
+    :param placed: Left, top, width and height of the page's bubbles
+
+    :type placed: list
+
+    :return: Whether the bubble was placed
+
+    :rtype: bool
+    """
+    scale = np.sqrt(panel.area * cfg.bubble_to_panel_area_max_ratio / (h * w))
+    w = round(w * scale)
+    h = round(h * scale)
+    xy = np.array(panel.coords)
+    min_coord = np.min(xy[xy[:, 0] == np.min(xy[:, 0])], 0)
+
+    for _ in range(MAX_ATTEMPS + 1):
+        x = round(min_coord[0] + (panel.width // 2 - 15) * np.random.random())
+        y = round(min_coord[1] + (panel.height // 2 - 15) * np.random.random())
+        if (x >= 0 and y >= 0 and x + w <= cfg.page_width and
+                y + h <= cfg.page_height and
+                not any(rect_in_rect(*bubble, x, y, w, h) for bubble in placed)):
+            placed.append((x, y, w, h))
+            return True
+    return False
+
+
+def place_pages(pages, sizes, per_panel, on_grid):
+    """
+    Place per_panel bubbles in every panel of the pages
+
+    :param sizes: Width and height of the templates to cycle through
+
+    :type sizes: list
+
+    :param on_grid: Whether to place them on an occupancy grid
+
+    :type on_grid: bool
+
+    :return: The number of bubbles placed
+
+    :rtype: int
+    """
+    placed = 0
+    for page in pages:
+        panels = page.leaf_children if page.num_panels > 1 else [page]
+        occupancy = OccupancyGrid(cfg.page_width, cfg.page_height)
+        rects = []
+        for i, panel in enumerate(panels):
+            for j in range(per_panel):
+                w, h = sizes[(i + j) % len(sizes)]
+                if on_grid:
+                    placed += place_speech_bubble(panel, w, h,
+                                                  occupancy) is not None
+                else:
+                    placed += place_by_retrying(panel, w, h, rects)
+    return placed
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--per_panel", type=int,
+                        default=cfg.max_speech_bubbles_per_panel)
+    args = parser.parse_args()
+    n = args.pages
+
+    with tempfile.TemporaryDirectory() as folder:
+        images = make_illustrations(folder, count=2)
+        writing_areas = make_speech_bubbles(os.path.join(folder, "bubbles"))
+        templates = get_speech_bubble_templates(
+            [area["path"] for area in writing_areas])
+    sizes = [(template["width"], template["height"])
+             for template in templates.values()]
+
+    print("panels | retrying placed (%) | us per bubble | grid placed (%) | us per bubble")
+    for num_panels in range(1, 9):
+        pages = make_pages(n, images, num_panels=num_panels)
+        bubbles = sum(len(page.leaf_children) if page.num_panels > 1 else 1
+                      for page in pages)*args.per_panel
+        row = [num_panels]
+        for on_grid in (False, True):
+            np.random.seed(0)
+            placed = place_pages(pages, sizes, args.per_panel, on_grid)
+            seconds = timeit(lambda: place_pages(pages, sizes,
+                                                 args.per_panel, on_grid))
+            row += [100*placed/bubbles, 1e6*seconds/bubbles]
+        print("%6d | %19.1f | %13.1f | %15.1f | %13.1f" % tuple(row))
@@ -0,0 +1,67 @@
+"""
+Compares Page trees against CompactPage arrays: how many bytes a
+page takes pickled and held in memory, how long it takes to pickle
+and unpickle, and how long converting between them takes. Run from
+the repository's root:
+
+    python -m benchmarks.benchmark_compact_pages
+"""
+import os
+import pickle
+import tempfile
+import tracemalloc
+from argparse import ArgumentParser
+
+from preprocesing.layout_engine.objects.compact_page import CompactPage
+from tests.factories import (
+    make_illustrations,
+    make_pages,
+    make_font,
+    make_speech_bubbles,
+    add_speech_bubbles
+)
+from .common import timeit
+
+
+def traced_size(func):
+    tracemalloc.start()
+    kept = func()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del kept
+    return size
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument("--pages", type=int, default=200)
+    args = parser.parse_args()
+    n = args.pages
+
+    with tempfile.TemporaryDirectory() as folder:
+        images = make_illustrations(folder, count=2)
+        font = make_font(os.path.join(folder, "font.ttf"))
+        writing_areas = make_speech_bubbles(os.path.join(folder, "bubbles"))
+        pages = make_pages(n, images, seed=0)
+        add_speech_bubbles(pages, writing_areas, font)
+
+    compact_pages = [CompactPage(page) for page in pages]
+    protocol = pickle.HIGHEST_PROTOCOL
+
+    print("%d pages with speech bubbles, per page:" % n)
+    print("         | pickled (B) | in memory (B) | pickle + unpickle (us)")
+    for name, items in (("Page", pages), ("Compact", compact_pages)):
+        blobs = [pickle.dumps(item, protocol) for item in items]
+        pickled = sum(len(blob) for blob in blobs)/n
+        memory = traced_size(lambda: [pickle.loads(blob)
+                                      for blob in blobs])/n
+        round_trip = timeit(lambda: [pickle.loads(pickle.dumps(item, protocol))
+                                     for item in items])/n
+        print("%8s | %11.0f | %13.0f | %22.1f" % (name, pickled, memory,
+                                                 round_trip*1e6))
+
+    to_compact = timeit(lambda: [CompactPage(page) for page in pages])/n
+    to_page = timeit(lambda: [page.to_page() for page in compact_pages])/n
+    print()
+    print("CompactPage(page): %.1f us, to_page(): %.1f us" % (to_compact*1e6,
+                                                            to_page*1e6))
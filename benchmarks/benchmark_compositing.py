@@ -0,0 +1,46 @@
+"""
+Compares pages/sec of compositing panel illustrations with
+full page masks against compositing within each panel's
+bounding box. Run from the repository's root:
+
+    python -m benchmarks.benchmark_compositing
+"""
+import tempfile
+import numpy as np
+from argparse import ArgumentParser
+
+from preprocesing import config_file as cfg
+from tests.factories import make_illustrations, make_pages
+from .common import timeit
+
+
+def render_all(pages):
+    for page in pages:
+        page.render()
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument("--pages", type=int, default=8)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        images = make_illustrations(folder)
+
+        print("panels | full page (pages/s) | panel local (pages/s) | max diff")
+        for num_panels in range(2, 9):
+            pages = make_pages(args.pages, images, num_panels=num_panels)
+
+            cfg.panel_local_compositing = False
+            full_time = timeit(lambda: render_all(pages))
+            full = [np.asarray(page.render(), dtype=int) for page in pages]
+
+            cfg.panel_local_compositing = True
+            local_time = timeit(lambda: render_all(pages))
+            local = [np.asarray(page.render(), dtype=int) for page in pages]
+
+            diff = max(np.abs(a - b).max() for a, b in zip(full, local))
+            print("%6d | %19.2f | %21.2f | %8d" % (num_panels,
+                                                   args.pages/full_time,
+                                                   args.pages/local_time,
+                                                   diff))
@@ -0,0 +1,59 @@
+"""
+Compares pages/sec of drawing pages with the PIL compositor
+against the NumPy/OpenCV compositor, rendering every output
+of a page with speech bubbles. Run from the repository's root:
+
+    python -m benchmarks.benchmark_compositors
+"""
+import os
+import tempfile
+import numpy as np
+from argparse import ArgumentParser
+
+from preprocesing import config_file as cfg
+from preprocesing.layout_engine.render_engine import render_page, RENDER_OUTPUTS
+from tests.factories import (
+    make_illustrations,
+    make_pages,
+    make_font,
+    make_speech_bubbles,
+    add_speech_bubbles
+)
+from .common import timeit
+
+
+def render_all(render_data):
+    return [render_page(panels, speech_bubbles, outputs=RENDER_OUTPUTS)
+            for panels, speech_bubbles in render_data]
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument("--pages", type=int, default=8)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        images = make_illustrations(folder)
+        font = make_font(os.path.join(folder, "font.ttf"))
+        writing_areas = make_speech_bubbles(os.path.join(folder, "bubbles"))
+
+        print("panels | pil (pages/s) | numpy (pages/s) | differing pixels")
+        for num_panels in range(1, 9):
+            pages = make_pages(args.pages, images, num_panels=num_panels)
+            add_speech_bubbles(pages, writing_areas, font)
+            render_data = [page.get_render_data() for page in pages]
+
+            cfg.compositor = "pil"
+            pil_time = timeit(lambda: render_all(render_data))
+            pil = render_all(render_data)
+
+            cfg.compositor = "numpy"
+            numpy_time = timeit(lambda: render_all(render_data))
+            numpy = render_all(render_data)
+
+            diff = max((np.asarray(a["bw"]) != np.asarray(b["bw"])).mean()
+                       for a, b in zip(pil, numpy))
+            print("%6d | %13.2f | %15.2f | %15.2f%%" % (num_panels,
+                                                      args.pages/pil_time,
+                                                      args.pages/numpy_time,
+                                                      100*diff))
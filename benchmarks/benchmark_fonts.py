@@ -0,0 +1,70 @@
+"""
+Times rendering speech bubbles with fonts and templates loaded for
+every bubble against keeping them in the worker's font cache and
+template store. Run from the repository's root, optionally with
+a real font file:
+
+    python -m benchmarks.benchmark_fonts --font path/to/font.ttf
+"""
+import os
+import tempfile
+from argparse import ArgumentParser
+
+from preprocesing.layout_engine.objects.speech_bubble import (
+    get_font,
+    speech_bubble_templates
+)
+from tests.factories import (
+    make_illustrations,
+    make_pages,
+    make_font,
+    make_speech_bubbles,
+    add_speech_bubbles
+)
+from .common import timeit
+
+
+def render_all(speech_bubbles, fonts_cached, templates_cached):
+    for speech_bubble in speech_bubbles:
+        if not fonts_cached:
+            get_font.cache_clear()
+        if not templates_cached:
+            speech_bubble_templates.clear()
+        speech_bubble.render("LA")
+
+
+def time_bubbles(speech_bubbles, fonts_cached, templates_cached):
+    best = timeit(lambda: render_all(speech_bubbles, fonts_cached,
+                                     templates_cached), repeat=5)
+    return best/len(speech_bubbles)
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument("--pages", type=int, default=16)
+    parser.add_argument("--font", type=str, default=None)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        images = make_illustrations(folder, count=2)
+        font = args.font or make_font(os.path.join(folder, "font.ttf"))
+        writing_areas = make_speech_bubbles(os.path.join(folder, "bubbles"))
+
+        pages = make_pages(args.pages, images)
+        add_speech_bubbles(pages, writing_areas, font)
+        speech_bubbles = [speech_bubble
+                          for page in pages
+                          for panel in page.leaf_children
+                          for speech_bubble in panel.speech_bubbles]
+
+        # Warm up the bubble templates in the OS cache
+        time_bubbles(speech_bubbles, True, True)
+        uncached = time_bubbles(speech_bubbles, False, False)
+        fonts_cached = time_bubbles(speech_bubbles, True, False)
+        cached = time_bubbles(speech_bubbles, True, True)
+
+        print("bubbles | uncached | fonts cached | fonts and templates cached (ms/bubble)")
+        print("%7d | %8.2f | %12.2f | %26.2f" % (len(speech_bubbles),
+                                                 1000*uncached,
+                                                 1000*fonts_cached,
+                                                 1000*cached))
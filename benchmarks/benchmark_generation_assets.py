@@ -0,0 +1,105 @@
+"""
+Compares loading the illustrations and texts pages are generated
+from the way main.py used to, globbing every illustration and reading
+the whole text dataset into a DataFrame, against GenerationAssets
+which keeps the illustrations' listing and memory-maps the text
+store. The first load with GenerationAssets makes the listing and the
+store, later ones only read them. Then the asset manifest is built,
+built again after 1% of the illustrations changed and loaded the way
+generation loads it. Run from the repository's root:
+
+    python -m benchmarks.benchmark_generation_assets
+"""
+import io
+import os
+import tempfile
+import pandas as pd
+from PIL import Image
+from glob2 import glob
+from argparse import ArgumentParser
+
+import paths
+from preprocesing.generation_assets import GenerationAssets
+from preprocesing.asset_manifest import build_manifest, load_asset_manifest
+from preprocesing.text_store import _text_stores
+from tests.factories import make_texts, make_speech_bubbles
+from .common import timeit
+
+
+def make_image_tree(folder, count, subfolders):
+    jpeg = io.BytesIO()
+    Image.new("L", (64, 48)).save(jpeg, "JPEG")
+    jpeg = jpeg.getvalue()
+    images = []
+    for i in range(count):
+        subfolder = os.path.join(folder, "%04d" % (i % subfolders))
+        if i < subfolders:
+            os.makedirs(subfolder)
+        images.append(os.path.join(subfolder, "%d.jpg" % i))
+        with open(images[-1], "wb") as f:
+            f.write(jpeg)
+    return images
+
+
+def make_manifest_files():
+    writing_areas = make_speech_bubbles(paths.DATASET_IMAGES_SPEECH_BUBBLES_FOLDER)
+    with open(paths.DATASET_IMAGES_SPEECH_BUBBLES_WRITING_AREAS_FILE, "w") as f:
+        for area in writing_areas:
+            f.write("%s,%d,%d,%d,%d\n" % (area["path"], area["x"], area["y"],
+                                          area["width"], area["height"]))
+    os.makedirs(paths.DATASET_FONTS_FOLDER)
+    with open(paths.DATASET_FONTS_VIABLE_FONTS_FILE, "w") as f:
+        f.write("font.ttf,True,True\n")
+
+
+def load_old():
+    images = sorted(glob(os.path.join(
+        paths.DATASET_IMAGES_DANBOORU_BLACK_WHITE_IMAGES_FOLDER, "**", "*.jpg")))
+    texts = pd.read_parquet(paths.DATASET_TEXT_JESC_DIALOGUES_FOLDER)
+    return images, texts
+
+
+def load_assets():
+    # Every run maps the store again like a new process does
+    _text_stores.clear()
+    assets = GenerationAssets(paths.ENGLISH_LANGUAGE)
+    return assets.images, assets.texts
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument("--images", type=int, default=300000)
+    parser.add_argument("--subfolders", type=int, default=150)
+    parser.add_argument("--rows", type=int, default=2800000)
+    args = parser.parse_args()
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as folder:
+        os.chdir(folder)
+        images = make_image_tree(
+            paths.DATASET_IMAGES_DANBOORU_BLACK_WHITE_IMAGES_FOLDER,
+            args.images, args.subfolders)
+        make_texts(paths.DATASET_TEXT_FOLDER, args.rows)
+        make_manifest_files()
+
+        old = timeit(load_old, repeat=1)
+        first = timeit(load_assets, repeat=1)
+        later = timeit(load_assets)
+        old_images, old_texts = load_old()
+        images, texts = load_assets()
+        assert images == old_images and len(texts) == len(old_texts)
+
+        build = timeit(build_manifest, repeat=1)
+        for image in images[::100]:
+            os.utime(image, ns=(0, 0))
+        rebuild = timeit(build_manifest, repeat=1)
+        load = timeit(load_asset_manifest)
+        assert load_asset_manifest().images == old_images
+        os.chdir(cwd)
+
+    print("illustrations | texts   | glob and DataFrame (s) | first load (s) | later loads (s)")
+    print("%13d | %7d | %22.2f | %14.2f | %15.3f" % (args.images, args.rows,
+                                                      old, first, later))
+    print()
+    print("manifest build (s) | build after 1% changed (s) | load (s)")
+    print("%18.2f | %26.2f | %8.3f" % (build, rebuild, load))
@@ -0,0 +1,58 @@
+"""
+Compares pages/sec of rendering black and white pages in color
+and converting them against rendering them in grayscale, along
+with the size of the page images. Run from the repository's root:
+
+    python -m benchmarks.benchmark_grayscale
+"""
+import os
+import tempfile
+from argparse import ArgumentParser
+
+from preprocesing import config_file as cfg
+from preprocesing.layout_engine.render_engine import render_page, RENDER_BW
+from tests.factories import (
+    make_illustrations,
+    make_pages,
+    make_font,
+    make_speech_bubbles,
+    add_speech_bubbles
+)
+from .common import timeit
+
+
+def render_all(render_data):
+    images = [render_page(panels, speech_bubbles)[RENDER_BW]
+              for panels, speech_bubbles in render_data]
+    return [image.convert("L") if image.mode != "L" else image
+            for image in images]
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument("--pages", type=int, default=8)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        images = make_illustrations(folder)
+        font = make_font(os.path.join(folder, "font.ttf"))
+        writing_areas = make_speech_bubbles(os.path.join(folder, "bubbles"))
+
+        pages = make_pages(args.pages, images)
+        add_speech_bubbles(pages, writing_areas, font)
+        render_data = [page.get_render_data() for page in pages]
+
+        print("compositor | color (pages/s) | grayscale (pages/s) | page MB color/grayscale")
+        for compositor in ["pil", "numpy"]:
+            cfg.compositor = compositor
+            sizes = {}
+            times = {}
+            for grayscale in [False, True]:
+                cfg.grayscale_bw_pages = grayscale
+                times[grayscale] = timeit(lambda: render_all(render_data))
+                page = render_page(*render_data[0])[RENDER_BW]
+                sizes[grayscale] = len(page.getbands())*page.width*page.height/2**20
+
+            print("%10s | %15.2f | %19.2f | %10.1f/%.1f" % (
+                compositor, args.pages/times[False], args.pages/times[True],
+                sizes[False], sizes[True]))
@@ -0,0 +1,62 @@
+"""
+Compares creating the layout of every page, its base panels,
+transforms and shrinking, against taking it from a layout bank.
+Reports the time to build and load the bank, its size on disk and
+its coverage, then the pages per second create_inital_page_metadata
+makes both ways. Run from the repository's root:
+
+    python -m benchmarks.benchmark_layout_bank
+"""
+import os
+import time
+import tempfile
+from argparse import ArgumentParser
+
+from preprocesing import config_file as cfg
+from preprocesing.layout_engine.page_creator.page_plans import plan_pages, get_page_plan
+from preprocesing.layout_engine.page_creator.create_page_metadata import create_inital_page_metadata
+from preprocesing.layout_engine.page_creator.layout_bank import (
+    create_layout_bank,
+    load_layout_bank,
+    print_layout_bank_coverage
+)
+from .common import timeit
+
+SEED = 0
+
+
+def create_layouts(plans, n):
+    return [create_inital_page_metadata((get_page_plan(plans, i), 100, 10,
+                                         10, (SEED, i)))
+            for i in range(n)]
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument("--layouts", type=int, default=2000)
+    parser.add_argument("--pages", type=int, default=2000)
+    args = parser.parse_args()
+    n = args.pages
+
+    with tempfile.TemporaryDirectory() as folder:
+        bank_file = os.path.join(folder, "layout_bank.pkl")
+        start = time.perf_counter()
+        bank = create_layout_bank(args.layouts, seed=1, bank_file=bank_file)
+        build = time.perf_counter() - start
+        size = os.path.getsize(bank_file)
+        load = timeit(lambda: load_layout_bank(bank_file))
+
+    print_layout_bank_coverage(bank)
+    print()
+    print("%d layouts built in %.1f s, %.0f kB on disk, loaded in %.0f ms" % (
+        len(bank), build, size/1024, load*1e3))
+
+    plans = plan_pages(SEED, 0, n, 100, 10, 10, 10, 3)
+    cfg.use_layout_bank = False
+    live = timeit(lambda: create_layouts(plans, n), repeat=1)
+    cfg.use_layout_bank = True
+    banked = timeit(lambda: create_layouts(plans, n))
+    print()
+    print("pages | live (pages/s) | layout bank (pages/s) | speedup")
+    print("%5d | %14.0f | %21.0f | %6.1fx" % (n, n/live, n/banked,
+                                              live/banked))
@@ -0,0 +1,97 @@
+"""
+Compares storing the pages' metadata as a pretty-printed JSON file
+per page, the way Page.dump_data writes it, against records in
+Parquet shards. Reports the time to write and to read every page
+back, to look pages up by name, the bytes on disk and the number of
+files. Run from the repository's root:
+
+    python -m benchmarks.benchmark_metadata_store
+"""
+import os
+import json
+import tempfile
+import numpy as np
+from argparse import ArgumentParser
+
+from preprocesing import config_file as cfg
+from preprocesing.layout_engine.metadata_store import (
+    MetadataStore,
+    open_metadata_sink,
+    serialize_metadata,
+    METADATA_SINK_JSON,
+    METADATA_SINK_PARQUET
+)
+from tests.factories import (
+    make_illustrations,
+    make_pages,
+    make_speech_bubbles,
+    make_font,
+    add_speech_bubbles
+)
+from .common import timeit
+
+
+def write_json_files(folder, metadata):
+    for name, data in metadata:
+        with open(folder + name + cfg.metadata_format, "w+") as json_file:
+            json.dump(data, json_file, indent=2)
+
+
+def write_shards(folder, metadata):
+    sink = open_metadata_sink(METADATA_SINK_PARQUET, folder)
+    for name, data in metadata:
+        sink.write(name, serialize_metadata(data))
+    sink.close()
+
+
+def get_folder_size(folder):
+    files = os.listdir(folder)
+    return sum(os.path.getsize(folder + filename) for filename in files), len(files)
+
+
+def look_up(folder, names):
+    store = MetadataStore(folder)
+    for name in names:
+        store.get(name)
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument("--pages", type=int, default=20000)
+    parser.add_argument("--lookups", type=int, default=1000)
+    args = parser.parse_args()
+    n = args.pages
+
+    # A few hundred real pages are repeated under new names
+    with tempfile.TemporaryDirectory() as folder:
+        images = make_illustrations(folder, count=2)
+        writing_areas = make_speech_bubbles(os.path.join(folder, "bubbles"))
+        font = os.path.join(folder, "font.ttf")
+        make_font(font)
+        pages = make_pages(200, images)
+        add_speech_bubbles(pages, writing_areas, font)
+    metadata = []
+    for i in range(n):
+        data = dict(pages[i % len(pages)].get_metadata(), name="page-%08d" % i)
+        metadata.append((data["name"], json.loads(json.dumps(data))))
+    names = [metadata[i][0] for i in
+             np.random.RandomState(0).randint(0, n, args.lookups)]
+
+    print("sink    | write (s) | read all (s) | %d lookups (s) | MB on disk | files" %
+          args.lookups)
+    for sink, write in ((METADATA_SINK_JSON, write_json_files),
+                        (METADATA_SINK_PARQUET, write_shards)):
+        with tempfile.TemporaryDirectory() as folder:
+            folder += "/"
+
+            def write_once():
+                for filename in os.listdir(folder):
+                    os.remove(folder + filename)
+                write(folder, metadata)
+
+            seconds = timeit(write_once, repeat=1)
+            size, files = get_folder_size(folder)
+            read = timeit(lambda: sum(1 for _ in MetadataStore(folder)))
+            lookups = timeit(lambda: look_up(folder, names), repeat=1)
+        print("%-7s | %9.2f | %12.2f | %15.2f | %10.1f | %5d" % (
+            sink, seconds, read, lookups, size/2**20, files))
@@ -0,0 +1,81 @@
+"""
+Reports the bytes the parent holds per page when it keeps every page
+of a run like the metadata stage does, measured with tracemalloc for
+1 to 8 panels with 0 to 2 speech bubbles per panel. Page trees are
+compared against their CompactPage. Run from the repository's root:
+
+    python -m benchmarks.benchmark_page_memory
+"""
+import gc
+import os
+import tempfile
+import tracemalloc
+from argparse import ArgumentParser
+
+from preprocesing.layout_engine.objects.compact_page import CompactPage
+from tests.factories import (
+    make_illustrations,
+    make_pages,
+    make_font,
+    make_speech_bubbles,
+    add_speech_bubbles
+)
+
+
+def traced_size(func):
+    """
+    Get how many bytes the result of a function holds
+
+    :param func: Function without arguments whose result is kept
+
+    :type func: function
+
+    :return: The result and the bytes allocated and still held
+
+    :rtype: tuple
+    """
+    gc.collect()
+    tracemalloc.start()
+    kept = func()
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return kept, size
+
+
+def get_bubbles(page):
+    panels = page.leaf_children if page.num_panels > 1 else [page]
+    return sum(len(panel.speech_bubbles) for panel in panels)
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument("--pages", type=int, default=100)
+    args = parser.parse_args()
+    n = args.pages
+
+    with tempfile.TemporaryDirectory() as folder:
+        images = make_illustrations(folder, count=2)
+        font = make_font(os.path.join(folder, "font.ttf"))
+        writing_areas = make_speech_bubbles(os.path.join(folder, "bubbles"))
+
+        def create(num_panels, per_panel):
+            pages = make_pages(n, images, num_panels=num_panels)
+            if per_panel:
+                add_speech_bubbles(pages, writing_areas, font,
+                                   per_panel=per_panel)
+            return pages
+
+        print("panels | bubbles per panel | bubbles per page | page (B) | compact (B)")
+        for num_panels in range(1, 9):
+            for per_panel in range(3):
+                # Fonts and templates are loaded once so they're
+                # not counted as the pages' memory
+                create(num_panels, per_panel)
+                pages, size = traced_size(lambda: create(num_panels,
+                                                         per_panel))
+                _, compact_size = traced_size(
+                    lambda: [CompactPage(page) for page in pages])
+                bubbles = sum(get_bubbles(page) for page in pages)/n
+                print("%6d | %17d | %16.1f | %8.0f | %11.0f" % (
+                    num_panels, per_panel, bubbles, size/n, compact_size/n))
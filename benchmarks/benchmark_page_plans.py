@@ -0,0 +1,110 @@
+"""
+Compares drawing the random choices of pages one by one, the way
+create_inital_page_metadata and preprocess_metadata used to with a
+NumPy call per page, panel, bubble and text, against drawing the
+plans of every page at once. The text lookups are compared too,
+a DataFrame row per writing area against the texts of a page
+picked at once from the text store. Run from the
+repository's root:
+
+    python -m benchmarks.benchmark_page_plans
+"""
+import numpy as np
+import pandas as pd
+from argparse import ArgumentParser
+
+import paths
+from preprocesing import config_file as cfg
+from preprocesing.layout_engine.page_creator.page_plans import plan_pages
+from preprocesing.text_store import TextStore
+from .common import timeit
+
+IMAGES_LEN = 50000
+FONTS_LEN = 300
+SPEECH_BUBBLES_LEN = 600
+WRITING_AREAS = 3
+TEXTS_LEN = 10000
+
+
+def sample_pages_one_by_one(n):
+    """
+    Draw the choices of n pages with a NumPy call per choice
+
+    :param n: Number of pages
+
+    :type n: int
+
+    :return: The text indices of every page
+
+    :rtype: list
+    """
+    random = np.random
+    pages = []
+    for _ in range(n):
+        number_of_panels = random.choice(
+            list(cfg.num_pages_ratios.keys()),
+            p=list(cfg.num_pages_ratios.values()))
+        random.choice(list(cfg.vertical_horizontal_ratios.keys()),
+                      p=list(cfg.vertical_horizontal_ratios.values()))
+        random.random()
+        if random.random() < cfg.background_add_chance:
+            random.randint(0, IMAGES_LEN)
+
+        text_indices = []
+        for _ in range(number_of_panels):
+            random.randint(0, IMAGES_LEN)
+            num_speech_bubbles = random.randint(
+                cfg.min_speech_bubbles_per_panel,
+                cfg.max_speech_bubbles_per_panel)
+            for _ in range(num_speech_bubbles):
+                random.randint(0, FONTS_LEN)
+                random.randint(0, SPEECH_BUBBLES_LEN)
+                for _ in range(WRITING_AREAS):
+                    text_indices.append(random.randint(0, TEXTS_LEN))
+        if random.random() < cfg.panel_removal_chance:
+            random.choice([1, cfg.panel_removal_max])
+        pages.append(text_indices)
+    return pages
+
+
+def sample_pages_planned(n):
+    return plan_pages(0, 0, n, IMAGES_LEN, FONTS_LEN, SPEECH_BUBBLES_LEN,
+                      TEXTS_LEN, WRITING_AREAS)
+
+
+def lookup_texts_one_by_one(texts, pages):
+    return [[texts.iloc[i] for i in indices] for indices in pages]
+
+
+def lookup_texts_per_page(texts, pages):
+    text_store = TextStore.from_dataframe(texts)
+    return [text_store.get_texts(indices) for indices in pages]
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument("--pages", type=int, nargs="+",
+                        default=[1000, 10000, 100000])
+    args = parser.parse_args()
+
+    texts = pd.DataFrame({
+        paths.ENGLISH_LANGUAGE: ["text %d" % i for i in range(TEXTS_LEN)],
+        paths.JAPANASE_LANGUAGE: ["テキスト %d" % i for i in range(TEXTS_LEN)]
+    })
+
+    print("pages | one by one (pages/s) | planned (pages/s) | speedup")
+    for n in args.pages:
+        one_by_one = timeit(lambda: sample_pages_one_by_one(n), repeat=1)
+        planned = timeit(lambda: sample_pages_planned(n))
+        print("%5d | %20.0f | %17.0f | %6.1fx" % (n, n/one_by_one,
+                                                   n/planned,
+                                                   one_by_one/planned))
+
+    n = min(args.pages)
+    pages = sample_pages_one_by_one(n)
+    one_by_one = timeit(lambda: lookup_texts_one_by_one(texts, pages),
+                        repeat=1)
+    per_page = timeit(lambda: lookup_texts_per_page(texts, pages))
+    print()
+    print("text lookups | one by one (pages/s) | per page (pages/s)")
+    print("%12d | %20.0f | %18.0f" % (n, n/one_by_one, n/per_page))
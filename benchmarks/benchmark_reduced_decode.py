@@ -0,0 +1,86 @@
+"""
+Compares decoding illustrations at full size against reduced
+size JPEG decodes for pages with 1 to 8 panels. Pages with a
+single panel are rendered with a background. Run from the
+repository's root:
+
+    python -m benchmarks.benchmark_reduced_decode
+"""
+import os
+import tempfile
+from argparse import ArgumentParser
+
+from preprocesing import config_file as cfg
+from preprocesing.crop_bounds_index import create_crop_bounds_index, load_crop_bounds_index
+from preprocesing.layout_engine.illustration_cache import illustration_cache
+from preprocesing.layout_engine.render_engine import (
+    RENDER_BW,
+    RENDER_COLORED,
+    get_crop_box,
+    open_reduced
+)
+from tests.factories import make_illustrations, make_pages
+from .common import timeit
+
+
+def get_decoded_bytes(pages):
+    """
+    Sum the bytes of every illustration decoded to render the pages
+    """
+    nbytes = 0
+    for page in pages:
+        images, _ = page.get_render_data()
+        images = [image for _, image in images]
+        if page.background is not None:
+            images.append(page.background)
+        for image in images:
+            img, _ = open_reduced(image, "L", get_crop_box(image))
+            nbytes += img.size[0]*img.size[1]
+    return nbytes
+
+
+def render_all(pages):
+    for page in pages:
+        page.render_outputs([RENDER_BW, RENDER_COLORED])
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument("--pages", type=int, default=4)
+    parser.add_argument("--min_size", type=int, default=3200)
+    parser.add_argument("--max_size", type=int, default=6000)
+    args = parser.parse_args()
+
+    # Measure decoding rather than cache hits
+    illustration_cache.max_bytes = 0
+
+    with tempfile.TemporaryDirectory() as folder:
+        images = make_illustrations(folder, min_size=args.min_size,
+                                    max_size=args.max_size)
+        index_file = os.path.join(folder, "crop_bounds.npz")
+        create_crop_bounds_index([os.path.join(folder, "bw"),
+                                  os.path.join(folder, "colored")],
+                                 index_file)
+        load_crop_bounds_index(index_file)
+
+        print("panels | full (s/page) | reduced (s/page) | full (MB/page) | reduced (MB/page)")
+        for num_panels in range(1, 9):
+            if num_panels == 1:
+                pages = make_pages(args.pages, images, num_panels=2)
+                for i, page in enumerate(pages):
+                    page.children = []
+                    page.leaf_children = []
+                    page.num_panels = 1
+                    page.background = images[i % len(images)]
+            else:
+                pages = make_pages(args.pages, images, num_panels=num_panels)
+
+            results = []
+            for reduced in [False, True]:
+                cfg.reduced_decode = reduced
+                seconds = timeit(lambda: render_all(pages), repeat=2)
+                nbytes = get_decoded_bytes(pages)
+                results += [seconds/args.pages, nbytes/args.pages/1024**2]
+
+            print("%6d | %13.3f | %16.3f | %14.1f | %17.1f" % (
+                num_panels, results[0], results[2], results[1], results[3]))
@@ -0,0 +1,149 @@
+"""
+Compares the memory of workers which decode the speech bubble
+templates into their own store and hold their own copy of the
+writing areas, as every worker used to, against workers attached
+to the shared assets the parent placed in shared memory once.
+Every worker gets every template and the writing areas of every
+speech bubble the way rendering and creating pages does and
+reports its memory while all of them are alive. The proportional
+set size splits pages shared by processes between them so its
+sum over the workers is the memory they take together. Run from
+the repository's root on Linux:
+
+    python -m benchmarks.benchmark_shared_assets
+"""
+import os
+import time
+import tempfile
+import multiprocessing as mp
+import numpy as np
+from PIL import Image, ImageDraw
+from argparse import ArgumentParser
+
+from preprocesing.layout_engine.shared_assets import (
+    create_shared_assets,
+    init_shared_assets
+)
+from preprocesing.layout_engine.objects.speech_bubble import get_speech_bubble_template
+
+WRITING_AREAS_PER_BUBBLE = 3
+
+
+def make_templates(folder, count, seed=0):
+    """
+    Write speech bubble templates of sizes in the range of
+    the dataset's with a few writing areas each
+
+    :return: The sizes and writing areas of the templates by path
+
+    :rtype: tuple
+    """
+    rng = np.random.RandomState(seed)
+    templates = {}
+    writing_areas = {}
+    for i in range(count):
+        w, h = rng.randint(250, 550, 2).tolist()
+        img = Image.new("RGBA", (w, h), (0, 0, 0, 0))
+        draw = ImageDraw.Draw(img)
+        draw.ellipse((4, 4, w - 5, h - 5), fill=(255, 255, 255, 255),
+                     outline=(0, 0, 0, 255), width=4)
+        path = os.path.join(folder, "bubble%d.png" % i)
+        img.save(path)
+        templates[path] = dict(width=w, height=h, bbox=(0, 0, w, h))
+        writing_areas[path] = [dict(path=path, width=w//3, height=h//4,
+                                    x=w//5 + j, y=h//4 + j)
+                               for j in range(WRITING_AREAS_PER_BUBBLE)]
+    return templates, writing_areas
+
+
+def get_memory():
+    """
+    Get the memory of this process on Linux
+
+    :return: Resident, proportional and private memory in MB
+
+    :rtype: tuple
+    """
+    memory = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            items = line.split()
+            if len(items) == 3 and items[2] == "kB":
+                memory[items[0]] = int(items[1])/1024
+    return (memory["Rss:"], memory["Pss:"],
+            memory["Private_Clean:"] + memory["Private_Dirty:"])
+
+
+def run_worker(assets, speech_bubbles, writing_areas, mode, barrier, results):
+    """
+    Get every template and writing area like a worker of
+    a long run does and report the memory once every worker did
+    """
+    init_shared_assets(assets)
+    if assets is not None:
+        writing_areas = assets.writing_areas
+    for path in speech_bubbles:
+        get_speech_bubble_template(path, mode)
+        writing_areas[path]
+    barrier.wait()
+    results.put(get_memory())
+    barrier.wait()
+
+
+def measure(shared, templates, writing_areas, mode, workers):
+    """
+    Start the workers one way and sum their memory
+
+    :return: The parent's setup time and the summed
+    resident, proportional and private memory in MB
+
+    :rtype: tuple
+    """
+    speech_bubbles = list(writing_areas.keys())
+    assets = None
+    start = time.perf_counter()
+    if shared:
+        assets = create_shared_assets(speech_bubbles, templates, [mode],
+                                      writing_areas)
+    setup = time.perf_counter() - start
+
+    ctx = mp.get_context("fork")
+    barrier = ctx.Barrier(workers + 1)
+    results = ctx.Queue()
+    processes = [ctx.Process(target=run_worker,
+                             args=(assets, speech_bubbles, writing_areas,
+                                   mode, barrier, results))
+                 for _ in range(workers)]
+    for process in processes:
+        process.start()
+    barrier.wait()
+    memory = [results.get() for _ in processes]
+    barrier.wait()
+    for process in processes:
+        process.join()
+    if assets is not None:
+        assets.close()
+    return (setup,) + tuple(np.sum(memory, axis=0))
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument("--speech_bubbles", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=32)
+    parser.add_argument("--mode", type=str, default="LA",
+                        help="LA for black and white pages, RGBA for colored")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        templates, writing_areas = make_templates(folder, args.speech_bubbles)
+        decoded = sum(np.asarray(Image.open(path).convert(args.mode)).nbytes
+                      for path in templates)
+        print("%d templates, %.0f MB decoded in %s, %d workers" % (
+            args.speech_bubbles, decoded/2**20, args.mode, args.workers))
+        print()
+        print("assets            | setup (s) | summed RSS (MB) | summed PSS (MB) | summed private (MB)")
+        for shared in (False, True):
+            row = measure(shared, templates, writing_areas, args.mode,
+                          args.workers)
+            print("%-17s | %9.2f | %15.0f | %15.0f | %19.0f" % (
+                ("shared memory" if shared else "per-worker copies",) + row))
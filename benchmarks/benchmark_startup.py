@@ -0,0 +1,69 @@
+"""
+Measures how long main.py takes to start, importing main alone
+and importing what creating the pages' metadata needs. Each runs
+in a fresh interpreter with -X importtime, the best of several
+runs is reported with the slowest top level imports. Importing
+main and the metadata modules took 1.6 seconds before the actions
+imported their modules themselves, about 0.3 after, and importing
+main alone about 0.25 once choosing a compositor and a metadata
+sink stopped importing cv2 and pyarrow. Run from the repository's
+root:
+
+    python -m benchmarks.benchmark_startup
+"""
+import os
+import sys
+import subprocess
+from argparse import ArgumentParser
+
+STARTUPS = {
+    "main": "import main",
+    "metadata": """
+import main
+from preprocesing.generation_assets import GenerationAssets
+from preprocesing.layout_engine.page_creator.create_page_metadata import create_pages_metadata
+""",
+}
+
+
+def get_import_times(code):
+    """
+    Run code in a new interpreter with -X importtime
+
+    :param code: Code to run
+
+    :type code: str
+
+    :return: Cumulative seconds of the top level imports by module
+
+    :rtype: dict
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                            cwd=root, capture_output=True, text=True,
+                            check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        # Nested imports are indented and counted by their parent
+        if not name.startswith("  "):
+            times[name.strip()] = int(cumulative) / 1e6
+    return times
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=5)
+    args = parser.parse_args()
+
+    print("startup  | seconds | slowest imports")
+    for name, code in STARTUPS.items():
+        best = min((get_import_times(code) for _ in range(args.repeat)),
+                   key=lambda times: sum(times.values()))
+        slowest = sorted(best.items(), key=lambda item: -item[1])[:args.top]
+        print("%-8s | %7.3f | %s" % (
+            name, sum(best.values()),
+            ", ".join("%s %.3f" % item for item in slowest)))
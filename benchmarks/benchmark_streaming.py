@@ -0,0 +1,65 @@
+"""
+Compares the parent's peak traced memory of creating the metadata
+of every page and then rendering them against streaming the pages
+through the workers one at a time. Pages are only dumped, not
+rendered, so the parent's share is what's measured. Run from the
+repository's root:
+
+    python -m benchmarks.benchmark_streaming
+"""
+import os
+import tempfile
+import tracemalloc
+import pandas as pd
+from argparse import ArgumentParser
+
+import paths
+from preprocesing.layout_engine.page_creator.create_page_metadata import create_pages_metadata
+from preprocesing.layout_engine.pages_renderer import render_pages
+from preprocesing.layout_engine.pages_pipeline import create_pages
+from preprocesing.layout_engine.render_engine import RENDER_BW
+from tests.factories import make_illustrations, make_font, make_speech_bubbles
+
+
+def traced_peak(func):
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument("--pages", type=int, nargs="+", default=[64, 256, 1024])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        images = make_illustrations(folder, count=2)
+        font = make_font(os.path.join(folder, "font.ttf"))
+        writing_areas = make_speech_bubbles(os.path.join(folder, "bubbles"))
+        speech_bubbles = sorted(set(area["path"] for area in writing_areas))
+        texts = pd.DataFrame({paths.ENGLISH_LANGUAGE: ["hello there"]*100,
+                              paths.JAPANASE_LANGUAGE: ["こんにちは"]*100})
+        assets = (images, [font], texts, speech_bubbles, writing_areas,
+                  paths.ENGLISH_LANGUAGE)
+
+        os.chdir(folder)
+        os.makedirs(paths.GENERATED_METADATA_FOLDER)
+
+        def staged(n):
+            pages = create_pages_metadata(n, *assets, seed=0)
+            render_pages(pages, [RENDER_BW], dry=True)
+
+        def streamed(n):
+            create_pages(n, *assets, [RENDER_BW], dry=True, seed=0)
+
+        results = []
+        for n in args.pages:
+            results.append((n, traced_peak(lambda: staged(n)),
+                            traced_peak(lambda: streamed(n))))
+
+        print("pages | staged parent peak (MB) | streamed parent peak (MB)")
+        for n, staged_peak, streamed_peak in results:
+            print("%5d | %24.2f | %25.2f" % (n, staged_peak/2**20,
+                                              streamed_peak/2**20))
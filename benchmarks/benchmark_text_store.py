@@ -0,0 +1,107 @@
+"""
+Compares loading the text corpus the way main.py used to, the whole
+Parquet dataset read into a DataFrame and turned into arrays, against
+memory-mapping the Arrow text store. Each way runs in a fresh process
+which reports the time to load the texts, its private and shared
+resident memory after loading and after looking up the texts of the
+pages, the bytes sent to every worker and the pages whose texts are
+looked up per second. Workers share the store's pages instead of
+holding a copy each. Run
+from the repository's root:
+
+    python -m benchmarks.benchmark_text_store
+"""
+import os
+import sys
+import time
+import pickle
+import tempfile
+import subprocess
+import numpy as np
+import pandas as pd
+from argparse import ArgumentParser
+
+from preprocesing.text_store import create_text_store, open_text_store
+from tests.factories import make_texts
+from .common import timeit
+
+TEXTS_PER_PAGE = 12
+
+
+def get_rss():
+    """
+    Get the resident memory of this process on Linux, its private
+    memory and the pages of files it maps which other
+    processes share
+
+    :return: Private and file backed resident memory in MB
+
+    :rtype: tuple
+    """
+    rss = {}
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(("RssAnon:", "RssFile:")):
+                name, kb, _ = line.split()
+                rss[name] = int(kb)/1024
+    return rss["RssAnon:"], rss["RssFile:"]
+
+
+def run_child(mode, source, store_file, pages):
+    """
+    Load the texts one way and look up the texts of the
+    pages, prints a row of the table
+    """
+    start = time.perf_counter()
+    if mode == "dataframe":
+        texts = pd.read_parquet(source)
+        columns = {language: texts[language].to_numpy()
+                   for language in texts.columns}
+        languages = list(columns.keys())
+
+        def get_texts(indices):
+            picked = [columns[language][indices].tolist()
+                      for language in languages]
+            return [dict(zip(languages, text)) for text in zip(*picked)]
+        sent = len(pickle.dumps(columns, pickle.HIGHEST_PROTOCOL))
+        rows = len(texts)
+    else:
+        store = open_text_store(store_file)
+        get_texts = store.get_texts
+        sent = len(pickle.dumps(store, pickle.HIGHEST_PROTOCOL))
+        rows = len(store)
+    load = time.perf_counter() - start
+    loaded_rss = get_rss()
+
+    indices = np.random.RandomState(1).randint(0, rows, (pages, TEXTS_PER_PAGE))
+    indices = indices.tolist()
+    seconds = timeit(lambda: [get_texts(page) for page in indices])
+    print("%-10s | %8.2f | %14.0f | %13.0f | %17.0f | %16.0f | %9.1f | %7.0f" % (
+        (mode, load) + loaded_rss + get_rss() + (sent/2**20, pages/seconds)))
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument("--rows", type=int, default=2800000)
+    parser.add_argument("--pages", type=int, default=20000)
+    # Mode, Parquet source and store file of a measuring process
+    parser.add_argument("--child", nargs=3, default=None)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        mode, source, store_file = args.child
+        run_child(mode, source, store_file, args.pages)
+        sys.exit()
+
+    with tempfile.TemporaryDirectory() as folder:
+        source = make_texts(folder, args.rows)
+        store_file = os.path.join(folder, "texts.arrow")
+        build = timeit(lambda: create_text_store(source, store_file), repeat=1)
+        print("%d texts, store built in %.1f s, %.0f MB on disk" % (
+            args.rows, build, os.path.getsize(store_file)/2**20))
+        print()
+        print("texts      | load (s) | loaded private | loaded shared | looked up private | looked up shared | sent (MB) | pages/s")
+        for mode in ("dataframe", "text_store"):
+            subprocess.run([sys.executable, "-m", "benchmarks.benchmark_text_store",
+                            "--pages", str(args.pages),
+                            "--child", mode, source, store_file], check=True)
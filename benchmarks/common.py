@@ -0,0 +1,25 @@
+import time
+
+
+def timeit(func, repeat=3):
+    """
+    Run a function several times and return the best wall time
+
+    :param func: Function without arguments to time
+
+    :type func: function
+
+    :param repeat: Number of runs
+
+    :type repeat: int, optional
+
+    :return: Best time in seconds
+
+    :rtype: float
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
@@ -1,24 +1,13 @@
-import pytest
 from argparse import ArgumentParser
-import pandas as pd
 import os
 import paths
-from glob2 import glob
-from preprocesing import speech_bubble_writing_area
-
-from scraping.download_texts import download_and_extract_jesc
-from scraping.download_fonts import get_font_links
-from scraping.download_images import download_db_illustrations, remove_temporary_image_directories
-
-from preprocesing.speech_bubble_writing_area import create_speech_bubbles_writing_areas
-from preprocesing.text_dataset_format_changer import convert_jesc_to_dataframe
-from preprocesing.extract_and_verify_fonts import extract_fonts, move_fonts, verify_font_files, remove_temporary_font_directories
-from preprocesing.convert_images import convert_images_to_bw, split_speech_bubbles
-from preprocesing.layout_engine.pages_renderer import render_pages_bw, render_pages_colored
-from preprocesing.layout_engine.pages_segmenter import segment_pages
-from preprocesing.layout_engine.page_creator.create_page_metadata import create_pages_metadata
-from preprocesing.layout_engine.pages_annotator import create_coco_annotations_from_segmentations
-from preprocesing.zip_compressor import zip_files
+from preprocesing import config_file as cfg
+# Only the choices of the options are imported here, every action
+# imports what it needs so quick commands don't wait on pandas,
+# dask or scipy
+from preprocesing.multiprocessing import EXECUTORS_AVAILABLE
+from preprocesing.layout_engine.compositors import COMPOSITORS_AVAILABLE
+from preprocesing.layout_engine.metadata_store import METADATA_SINKS_AVAILABLE
 
 
 if __name__ == '__main__':
@@ -65,6 +54,20 @@ if __name__ == '__main__':
                         action="store_true",
                         help="Convert downloaded images to black and white")
 
+    parser.add_argument("--index_crop_bounds", "-icb",
+                        action="store_true",
+                        help="Index the crop bounds of the black and white and colored images")
+
+    parser.add_argument("--build_manifest", action="store_true",
+                        help="Index the illustrations, speech bubbles and fonts in " + paths.DATASET_MANIFEST_FILE + " so generation doesn't walk the datasets, only changed illustrations are indexed again")
+
+    parser.add_argument("--build_layout_bank", type=int, default=None,
+                        help="Create this many page layouts once and store them in " + paths.DATASET_LAYOUT_BANK_FILE + ", uses --seed")
+
+    parser.add_argument("--layout_bank", action="store_true",
+                        default=cfg.use_layout_bank,
+                        help="Take the layouts of the pages from the layout bank instead of creating them")
+
     parser.add_argument("--calculate_writing_areas", "-cwa",
                         action="store_true",
                         help="Calculate writing areas of speech bubbles")
@@ -91,6 +94,61 @@ if __name__ == '__main__':
                         action="store_true", default=False,
                         help="Generate segmentation files for every generated page. Only works in combination with black and white pages")
 
+    parser.add_argument("--seed", type=int, default=None,
+                        help="Seed of the generated pages, every page only depends on the seed and its index")
+
+    parser.add_argument("--shard", type=str, default=None,
+                        help="Generate only the i-th of N disjoint slices of the pages given as i/N. Needs --seed")
+
+    parser.add_argument("--stream", action="store_true", default=False,
+                        help="Generate, render and segment every page within one worker instead of in separate stages so memory doesn't grow with the number of pages")
+
+    parser.add_argument("--enqueue", action="store_true", default=False,
+                        help="Split the pages of --generate_pages into ranges of --task_size pages in the work queue instead of generating them, --worker processes on any host generate them")
+
+    parser.add_argument("--worker", action="store_true", default=False,
+                        help="Lease ranges of pages from the work queue and generate them until every range is done, ranges of crashed workers are leased again")
+
+    parser.add_argument("--work_queue", type=str,
+                        default=paths.GENERATED_WORK_QUEUE_FILE,
+                        help="SQLite file of the work queue, it must be on storage every worker's host sees with working file locks")
+
+    parser.add_argument("--task_size", type=int,
+                        default=cfg.work_queue_task_size,
+                        help="Pages of every range of the work queue")
+
+    parser.add_argument("--metadata_sink",
+                        help="How the pages' metadata is stored. Available " +
+                        str(METADATA_SINKS_AVAILABLE) +
+                        ", parquet writes a few sharded files instead of a file per page",
+                        default=cfg.metadata_sink, type=str)
+
+    parser.add_argument("--convert_metadata", type=str, default=None,
+                        help="Convert the generated metadata to one of " +
+                        str(METADATA_SINKS_AVAILABLE) +
+                        " and remove the files of the other format")
+
+    parser.add_argument("--compositor",
+                        help="Backend that draws the pages. Available " +
+                        str(COMPOSITORS_AVAILABLE),
+                        default=cfg.compositor, type=str)
+
+    parser.add_argument("--pool_backend",
+                        help="How the workers run. Available " +
+                        str(EXECUTORS_AVAILABLE) +
+                        ", inline runs every task in this process for debugging and profiling. Threads share the random states pages are seeded with so they can't create pages",
+                        default=cfg.pool_backend, type=str)
+
+    parser.add_argument("--workers", type=int, default=cfg.pool_workers,
+                        help="Number of workers, defaults to the number of cores")
+
+    parser.add_argument("--chunksize", type=int, default=cfg.pool_chunksize,
+                        help="Tasks sent to a worker at once, defaults to about four chunks per worker")
+
+    parser.add_argument("--maxtasksperchild", type=int,
+                        default=cfg.pool_maxtasksperchild,
+                        help="Chunks a worker process runs before it's replaced, defaults to never")
+
     parser.add_argument("--create_annotations", "-ca",
                         action="store_true", default=False,
                         help="Creates annotations for every generated page")
@@ -101,41 +159,94 @@ if __name__ == '__main__':
 
     args = parser.parse_args()
 
+    if not args.pool_backend in EXECUTORS_AVAILABLE:
+        raise Exception("That executor is not available. Available " +
+                        str(EXECUTORS_AVAILABLE))
+    cfg.pool_backend = args.pool_backend
+    cfg.pool_workers = args.workers
+    cfg.pool_chunksize = args.chunksize
+    cfg.pool_maxtasksperchild = args.maxtasksperchild
+    cfg.use_layout_bank = args.layout_bank
+
+    # Fail before the assets are loaded
+    if ((args.generate_pages is not None and not args.enqueue) or
+            args.build_layout_bank is not None or args.worker):
+        from preprocesing.layout_engine.page_creator.page_seeds import check_seeded_backend
+        check_seeded_backend()
+
+    if not args.metadata_sink in METADATA_SINKS_AVAILABLE:
+        raise Exception("That metadata sink is not available. Available " +
+                        str(METADATA_SINKS_AVAILABLE))
+    cfg.metadata_sink = args.metadata_sink
+
     if args.make_dirs:
         paths.makeFolders(paths.DATASET_FOLDER_PATHS)
 
     # Wrangling with the text dataset
     if args.download_jesc:
+        from scraping.download_texts import download_and_extract_jesc
+        from preprocesing.text_dataset_format_changer import convert_jesc_to_dataframe
+        from preprocesing.text_store import create_text_store
         download_and_extract_jesc()
         convert_jesc_to_dataframe()
+        create_text_store()
 
     # Font download
     if args.download_fonts:
+        from scraping.download_fonts import get_font_links
         get_font_links()
 
     # Font extraction
     if args.extract_fonts:
+        from preprocesing.extract_and_verify_fonts import extract_fonts, move_fonts
         extract_fonts()
         move_fonts()
 
     # Font verification
     if args.verify_fonts:
+        from preprocesing.extract_and_verify_fonts import verify_font_files
         verify_font_files()
 
     # Calculation of writeable areas in speech bubbles
     if args.calculate_writing_areas:
+        from preprocesing.speech_bubble_writing_area import create_speech_bubbles_writing_areas
         create_speech_bubbles_writing_areas(save=args.segmented)
 
     # Download image dataset from Kaggle
     if args.download_images:
+        from scraping.download_images import download_db_illustrations
         download_db_illustrations()
 
     # Convert image dataset into grayscale
     if args.convert_images:
+        from preprocesing.convert_images import convert_images_to_bw
         convert_images_to_bw()
 
+    # Index the black borders of the images once for the renderers
+    if args.index_crop_bounds:
+        from preprocesing.crop_bounds_index import create_crop_bounds_index
+        print("Indexing images crop bounds...")
+        create_crop_bounds_index()
+
+    if args.build_manifest:
+        from preprocesing.asset_manifest import build_manifest
+        print("Building asset manifest...")
+        manifest, indexed = build_manifest()
+        print("The manifest has " + str(len(manifest.images)) +
+              " illustrations, " + str(indexed) + " of them were indexed again, " +
+              str(len(manifest.speech_bubble_templates)) + " speech bubbles and " +
+              str(len(manifest.fonts)) + " fonts")
+
+    # Create the layouts pages take with --layout_bank
+    if args.build_layout_bank is not None:
+        from preprocesing.layout_engine.page_creator.layout_bank import create_layout_bank, print_layout_bank_coverage
+        print("Creating layout bank...")
+        layout_bank = create_layout_bank(args.build_layout_bank, seed=args.seed)
+        print_layout_bank_coverage(layout_bank)
+
     # Split speech bubbles
     if args.split_speech_bubbles:
+        from preprocesing.convert_images import split_speech_bubbles
         paths.makeFolders([paths.DATASET_IMAGES_UNSPLITTED_SPEECH_BUBBLES_SINGLE_FOLDER,
                            paths.DATASET_IMAGES_UNSPLITTED_SPEECH_BUBBLES_MULTIPLE_FOLDER,
                            paths.DATASET_IMAGES_SPEECH_BUBBLES_FOLDER])
@@ -148,6 +259,8 @@ if __name__ == '__main__':
     
     # Remove temporary data
     if args.remove_temp_data:
+        from preprocesing.extract_and_verify_fonts import remove_temporary_font_directories
+        from scraping.download_images import remove_temporary_image_directories
         remove_temporary_font_directories()
         remove_temporary_image_directories()
 
@@ -157,84 +270,127 @@ if __name__ == '__main__':
         if not language in paths.LANGUAGES_MODE_AVAILABLE:
             raise Exception("That language mode is not avaible. Available " +
                             str(paths.LANGUAGES_MODE_AVAILABLE))
+        if not args.compositor in COMPOSITORS_AVAILABLE:
+            raise Exception("That compositor is not available. Available " +
+                            str(COMPOSITORS_AVAILABLE))
+        cfg.compositor = args.compositor
+        from preprocesing.generation_assets import GenerationAssets
+        from preprocesing.layout_engine.render_engine import RENDER_BW, RENDER_COLORED
+        from preprocesing.layout_engine.page_creator.page_seeds import parse_shard, get_shard_range
 
         n = args.generate_pages[0]  # number of pages
-        bubbles_folder = paths.DATASET_IMAGES_SPEECH_BUBBLES_FOLDER
-        generated_images_folder = paths.GENERATED_IMAGES_FOLDER
-        generated_metadata_folder = paths.GENERATED_METADATA_FOLDER
-
-        print("Loading texts in " + language + "...")
-        texts = pd.read_parquet(
-            paths.DATASET_TEXT_JESC_DIALOGUES_FOLDER)
-        images = glob(os.path.join(paths.DATASET_IMAGES_DANBOORU_BLACK_WHITE_IMAGES_FOLDER, "**", "*.jpg"))
-        speech_bubbles = os.listdir(bubbles_folder)
-        speech_bubbles = [bubbles_folder + filename
-                          for filename in speech_bubbles]
-
-        # Load viable fonts for selected language
-        print("Loading fonts...")
-        fonts = []
-        try:
-            with open(paths.DATASET_FONTS_VIABLE_FONTS_FILE) as f:
-                for line in f.readlines():
-                    append_font = False
-                    path, japanese_viable, english_viable = line.split(",")
-                    english_viable = bool(english_viable.replace("\n", ""))
-                    japanese_viable = bool(japanese_viable.replace("\n", ""))
-                    if language == paths.ALL_LANGUAGE:
-                        append_font = english_viable and japanese_viable
-                    elif language == paths.ENGLISH_LANGUAGE:
-                        append_font = english_viable
-                    elif language == paths.JAPANASE_LANGUAGE:
-                        append_font = japanese_viable
-                    if append_font:
-                        fonts.append(path)
-                f.close()
-        except:
-            pass
-
-        # Load speech bubbles writing areas
-        print("Loading writing areas...")
-        speech_bubbles_writing_areas = []
-        try:
-            with open(paths.DATASET_IMAGES_SPEECH_BUBBLES_WRITING_AREAS_FILE) as f:
-                for line in f.readlines():
-                    path, x, y, w, h = line.split(",")
-                    speech_bubbles_writing_areas.append({
-                        "path": path,
-                        "width": int(w),
-                        "height": int(h),
-                        "x": int(x),
-                        "y": int(y),
-                    })
-                f.close()
-        except:
-            pass
-
-        print("Creating metadata...")
-        paths.makeFolders(paths.GENERATED_FOLDER_PATHS)
-        pages = create_pages_metadata(n,
-                                      images,
-                                      fonts,
-                                      texts,
-                                      speech_bubbles,
-                                      speech_bubbles_writing_areas,
-                                      language)
-
+        start = 0
+        if args.shard is not None and args.enqueue:
+            raise Exception("The workers of a queue split the run themselves, leave out --shard")
+        if args.shard is not None:
+            if args.seed is None:
+                raise Exception("Shards of a run need a seed to not overlap, use --seed")
+            n_total = n
+            start, n = get_shard_range(n_total, *parse_shard(args.shard))
+            print("Generating pages " + str(start) + " to " + str(start + n) +
+                  " of " + str(n_total) + "...")
+
+        # Render every requested output of a page in a single pass
+        outputs = []
         if args.generate_black_and_white_pages:
-            print("Rendering images in black and white...")
-            render_pages_bw(pages, dry=args.dry)
-
-        if args.generate_colored_pages: 
-            print("Rendering images in color...")
-            render_pages_colored(pages, dry=args.dry)
-
-        if args.segmented and args.generate_black_and_white_pages:
-            print("Segmentanting images...")
-            segment_pages(pages)
+            outputs.append(RENDER_BW)
+        if args.generate_colored_pages:
+            outputs.append(RENDER_COLORED)
+        segmented = args.segmented and args.generate_black_and_white_pages
+
+        if args.enqueue:
+            from preprocesing.work_queue import WorkQueue
+            from preprocesing.layout_engine.page_creator.page_seeds import get_run_seed
+            # Workers generate the pages with the options of the run
+            run = dict(n=n,
+                       seed=get_run_seed(args.seed),
+                       language=language,
+                       outputs=outputs,
+                       segmented=segmented,
+                       dry=args.dry,
+                       stream=args.stream,
+                       metadata_sink=cfg.metadata_sink,
+                       compositor=cfg.compositor,
+                       use_layout_bank=cfg.use_layout_bank)
+            paths.makeFolders([os.path.dirname(args.work_queue) or "."])
+            queue = WorkQueue(args.work_queue)
+            ranges = queue.enqueue(run, n, args.task_size)
+            print("Enqueued " + str(n) + " pages in " + str(ranges) +
+                  " ranges, start workers with --worker")
+            queue.close()
+        else:
+            # Every asset is only read once it's used, the texts
+            # and the illustrations' listing are kept on disk
+            print("Loading assets in " + language + "...")
+            assets = GenerationAssets(language)
+
+            paths.makeFolders(paths.GENERATED_FOLDER_PATHS)
+            if args.stream:
+                from preprocesing.layout_engine.pages_pipeline import create_pages
+                print("Creating pages...")
+                created, failed = create_pages(n,
+                                               assets.images,
+                                               assets.fonts,
+                                               assets.texts,
+                                               assets.speech_bubbles,
+                                               assets.speech_bubbles_writing_areas,
+                                               language,
+                                               outputs,
+                                               speech_bubble_templates=assets.speech_bubble_templates,
+                                               segmented=segmented,
+                                               dry=args.dry,
+                                               seed=args.seed,
+                                               start=start)
+                print("Created " + str(created) + " pages, " + str(failed) + " failed")
+            else:
+                from preprocesing.layout_engine.page_creator.create_page_metadata import create_pages_metadata, get_no_empty_writing_areas
+                from preprocesing.layout_engine.pages_renderer import render_pages
+                print("Creating metadata...")
+                pages = create_pages_metadata(n,
+                                              assets.images,
+                                              assets.fonts,
+                                              assets.texts,
+                                              assets.speech_bubbles,
+                                              assets.speech_bubbles_writing_areas,
+                                              language,
+                                              speech_bubble_templates=assets.speech_bubble_templates,
+                                              seed=args.seed,
+                                              start=start)
+
+                print("Rendering images" + (" and segmentating them" if segmented else "") + "...")
+                # The workers map the templates the pages were given from
+                # shared memory instead of decoding them each
+                speech_bubbles = list(get_no_empty_writing_areas(
+                    assets.speech_bubbles_writing_areas))
+                failed = render_pages(pages, outputs, segmented=segmented,
+                                      dry=args.dry, speech_bubbles=speech_bubbles,
+                                      speech_bubble_templates=assets.speech_bubble_templates)
+                print("Rendered " + str(len(pages) - failed) + " pages, " +
+                      str(failed) + " failed")
+
+    # Generate the ranges of pages of the work queue, any number
+    # of workers on any number of hosts can run at once
+    if args.worker:
+        from preprocesing.work_queue import WorkQueue, run_worker, print_work_queue_counts
+        print("Working on the queue at " + args.work_queue + "...")
+        done = run_worker(args.work_queue)
+        print("This worker generated " + str(done) + " ranges")
+        queue = WorkQueue(args.work_queue)
+        print_work_queue_counts(queue.get_counts())
+        queue.close()
+
+    # Move the metadata between a file per page and shards
+    if args.convert_metadata is not None:
+        from preprocesing.layout_engine.metadata_store import convert_metadata
+        print("Converting metadata...")
+        converted = convert_metadata(args.convert_metadata)
+        print("Converted the metadata of " + str(converted) + " pages")
 
     # Create annotations
     if args.create_annotations and os.path.isdir(paths.GENERATED_SEGMENTED_FOLDER):
+        from glob2 import glob
+        from preprocesing.layout_engine.pages_annotator import create_coco_annotations_from_segmentations
+        from preprocesing.zip_compressor import zip_files
         print("Creating annotations...")
         annotations = create_coco_annotations_from_segmentations()
 
@@ -251,6 +407,7 @@ if __name__ == '__main__':
 
     # Run tests
     if args.run_tests:
+        import pytest
         pytest.main([
             "tests/unit_tests/",
             "-s",
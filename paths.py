@@ -24,6 +24,7 @@ DATASET_TEXT_FOLDER = DATASET_FOLDER + "texts/"
 # DATASET_TEXT_FILES_FOLDER = DATASET_TEXT_FOLDER + "files/"
 DATASET_TEXT_JESC_DIALOGUES_FOLDER = DATASET_TEXT_FOLDER + "jesc_dialogues/"
 DATASET_TEXT_RAW_JESC_DIALOGUES_FILE = DATASET_FOLDER + "raw.tar.gz"
+DATASET_TEXT_STORE_FILE = DATASET_TEXT_FOLDER + "texts.arrow"
 
 # IMAGES DATASET #
 DATASET_IMAGES_FOLDER = DATASET_FOLDER + "images/"
@@ -45,6 +46,14 @@ DATASET_IMAGES_DANBOORU_COLORED_IMAGES_FOLDER = DATASET_IMAGES_DANBOORU_IMAGES_F
     "colored/"
 DATASET_IMAGES_SPEECH_BUBBLES_WRITING_AREAS_FILE = DATASET_IMAGES_FOLDER + \
     "speech_bubbles_writing_areas.csv"
+DATASET_IMAGES_CROP_BOUNDS_FILE = DATASET_IMAGES_FOLDER + "crop_bounds.npz"
+DATASET_IMAGES_BLACK_WHITE_LIST_FILE = DATASET_IMAGES_FOLDER + "bw_images.txt"
+
+# ASSETS #
+DATASET_MANIFEST_FILE = DATASET_FOLDER + "manifest.pkl"
+
+# LAYOUTS #
+DATASET_LAYOUT_BANK_FILE = DATASET_FOLDER + "layout_bank.pkl"
 
 DATASET_FOLDER_PATHS = [DATASET_FONTS_FOLDER,
                         DATASET_IMAGES_RAW_FOLDER,
@@ -69,6 +78,7 @@ GENERATED_FOLDER = "generated/"
 GENERATED_IMAGES_FOLDER = GENERATED_FOLDER + "images/"
 GENERATED_METADATA_FOLDER = GENERATED_FOLDER + "metadata/"
 GENERATED_SEGMENTED_FOLDER = GENERATED_FOLDER + "segmented/"
+GENERATED_WORK_QUEUE_FILE = GENERATED_FOLDER + "work_queue.sqlite"
 
 GENERATED_ANNOTATIONS_FILENAME = "annotations" + ".json"
 GENERATED_COCO_ANNOTATIONS_FILENAME = "coco_" + GENERATED_ANNOTATIONS_FILENAME
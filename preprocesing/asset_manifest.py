@@ -0,0 +1,298 @@
+import os
+import pickle
+import numpy as np
+import paths
+from PIL import Image
+from .multiprocessing import open_pool
+from .speech_bubble_writing_area import load_speech_bubbles_writing_areas
+
+# Manifests of another version are built again from scratch
+MANIFEST_VERSION = 1
+
+
+def scan_images(folder):
+    """
+    List the illustrations of a folder and its subfolders
+    with what they're compared by to find changed files
+
+    :param folder: Folder of the illustrations
+
+    :type folder: str
+
+    :return: Modification time in nanoseconds and size
+    of the illustrations by path
+
+    :rtype: dict
+    """
+    images = {}
+    if not os.path.isdir(folder):
+        return images
+    folders = [folder]
+    while folders:
+        with os.scandir(folders.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    folders.append(entry.path)
+                elif entry.name.endswith(".jpg"):
+                    stat = entry.stat()
+                    images[entry.path] = (stat.st_mtime_ns, stat.st_size)
+    return images
+
+
+def read_image_size(path):
+    """
+    Read the size of an illustration from its header
+
+    :param path: Path of the illustration
+
+    :type path: str
+
+    :return: Width and height or None if it couldn't be read
+
+    :rtype: tuple
+    """
+    try:
+        with Image.open(path) as img:
+            return img.size
+    except Exception:
+        print("We couldn't index " + path)
+        return None
+
+
+def read_viable_fonts(file=None):
+    """
+    Read which languages every font can write
+
+    :param file: File of the viable fonts, defaults
+    to paths.DATASET_FONTS_VIABLE_FONTS_FILE
+
+    :type file: str, optional
+
+    :return: Path of the fonts and whether they can write
+    Japanese and English
+
+    :rtype: list
+    """
+    if file is None:
+        file = paths.DATASET_FONTS_VIABLE_FONTS_FILE
+    if not os.path.isfile(file):
+        raise Exception("There's no viable fonts file at " + file +
+                        ", create it with --verify_fonts")
+    fonts = []
+    with open(file) as f:
+        for number, line in enumerate(f.read().splitlines()):
+            items = line.split(",")
+            if len(items) != 3:
+                raise Exception("Line " + str(number + 1) + " of " + file +
+                                " isn't a font and its viability")
+            path, japanese_viable, english_viable = items
+            fonts.append((path, japanese_viable == "True",
+                          english_viable == "True"))
+    return fonts
+
+
+def is_font_viable(japanese_viable, english_viable, language):
+    if language == paths.ALL_LANGUAGE:
+        return japanese_viable and english_viable
+    if language == paths.JAPANASE_LANGUAGE:
+        return japanese_viable
+    return english_viable
+
+
+class AssetManifest(object):
+    """
+    Everything generation needs to know about the assets without
+    walking or opening them: the illustrations with their size and
+    whether they have a colored twin, the speech bubble templates
+    with their size and writing areas and the languages every
+    font can write
+
+    :param images: Sorted paths of the black and white illustrations
+
+    :type images: list
+
+    :param image_sizes: Width and height of every illustration
+
+    :type image_sizes: numpy.ndarray
+
+    :param image_colored: Whether every illustration has a colored twin
+
+    :type image_colored: numpy.ndarray
+
+    :param image_stats: Modification time in nanoseconds and
+    size of every illustration when it was indexed
+
+    :type image_stats: numpy.ndarray
+
+    :param speech_bubbles: Sorted paths of the speech bubble templates
+
+    :type speech_bubbles: list
+
+    :param writing_areas: Writing areas of the speech bubbles as
+    load_speech_bubbles_writing_areas returns them
+
+    :type writing_areas: list
+
+    :param speech_bubble_templates: Width, height and bounding
+    box of the templates by path
+
+    :type speech_bubble_templates: dict
+
+    :param fonts: Path of the fonts and whether they can
+    write Japanese and English
+
+    :type fonts: list
+
+    :param version: Version of the manifest
+
+    :type version: int, optional
+    """
+
+    def __init__(self, images, image_sizes, image_colored, image_stats,
+                 speech_bubbles, writing_areas, speech_bubble_templates,
+                 fonts, version=MANIFEST_VERSION):
+        """
+        Constructor method
+        """
+        self.images = images
+        self.image_sizes = image_sizes
+        self.image_colored = image_colored
+        self.image_stats = image_stats
+        self.speech_bubbles = speech_bubbles
+        self.writing_areas = writing_areas
+        self.speech_bubble_templates = speech_bubble_templates
+        self.fonts = fonts
+        self.version = version
+
+    def get_fonts(self, language):
+        """
+        Get the fonts which can write a language
+
+        :param language: One of paths.LANGUAGES_MODE_AVAILABLE
+
+        :type language: str
+
+        :return: Paths of the fonts
+
+        :rtype: list
+        """
+        return [path for path, japanese_viable, english_viable in self.fonts
+                if is_font_viable(japanese_viable, english_viable, language)]
+
+    def save(self, filename):
+        """
+        Write the manifest to a single file
+
+        :param filename: Where to write the manifest
+
+        :type filename: str
+        """
+        with open(filename, "wb") as f:
+            pickle.dump(self.__dict__, f, pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, filename):
+        """
+        Read a manifest written by save
+
+        :param filename: Manifest file
+
+        :type filename: str
+
+        :return: The loaded manifest or None if it's of another version
+
+        :rtype: AssetManifest
+        """
+        with open(filename, "rb") as f:
+            data = pickle.load(f)
+        if data.get("version") != MANIFEST_VERSION:
+            return None
+        return cls(**data)
+
+
+def build_manifest(manifest_file=None):
+    """
+    Build the asset manifest. Only the illustrations which were
+    added or changed since the last manifest are opened, the
+    others keep what was indexed about them
+
+    :param manifest_file: Where to write the manifest, defaults
+    to paths.DATASET_MANIFEST_FILE
+
+    :type manifest_file: str, optional
+
+    :return: The manifest and the number of illustrations read
+
+    :rtype: tuple
+    """
+    # Imported here since generation loads the manifest
+    # without needing the renderer
+    from .layout_engine.render_engine import get_colored_image
+
+    if manifest_file is None:
+        manifest_file = paths.DATASET_MANIFEST_FILE
+
+    known = {}
+    if os.path.isfile(manifest_file):
+        previous = AssetManifest.load(manifest_file)
+        if previous is not None:
+            for path, size, stat in zip(previous.images,
+                                        previous.image_sizes.tolist(),
+                                        previous.image_stats.tolist()):
+                known[path] = (tuple(stat), tuple(size))
+
+    stats = scan_images(paths.DATASET_IMAGES_DANBOORU_BLACK_WHITE_IMAGES_FOLDER)
+    colored = scan_images(paths.DATASET_IMAGES_DANBOORU_COLORED_IMAGES_FOLDER)
+    changed = sorted(path for path, stat in stats.items()
+                     if known.get(path, (None,))[0] != stat)
+    sizes = {path: size for path, (_, size) in known.items()}
+    if changed:
+        sizes.update(zip(changed, open_pool(read_image_size, changed,
+                                            ordered=True)))
+
+    # Illustrations which can't be read are left out
+    images = sorted(path for path in stats if sizes.get(path) is not None)
+    image_sizes = np.array([sizes[path] for path in images],
+                           dtype=np.int32).reshape(-1, 2)
+    image_colored = np.array([get_colored_image(path) in colored
+                              for path in images], dtype=bool)
+    image_stats = np.array([stats[path] for path in images],
+                           dtype=np.int64).reshape(-1, 2)
+
+    writing_areas_file = paths.DATASET_IMAGES_SPEECH_BUBBLES_WRITING_AREAS_FILE
+    if not os.path.isfile(writing_areas_file):
+        raise Exception("There's no writing areas file at " +
+                        writing_areas_file +
+                        ", create it with --calculate_writing_areas")
+    writing_areas, templates = load_speech_bubbles_writing_areas(
+        writing_areas_file)
+    bubbles_folder = paths.DATASET_IMAGES_SPEECH_BUBBLES_FOLDER
+    speech_bubbles = [bubbles_folder + filename
+                      for filename in sorted(os.listdir(bubbles_folder))]
+
+    manifest = AssetManifest(images, image_sizes, image_colored, image_stats,
+                             speech_bubbles, writing_areas, templates,
+                             read_viable_fonts())
+    manifest.save(manifest_file)
+    return manifest, len(changed)
+
+
+def load_asset_manifest(filename=None):
+    """
+    Load the asset manifest
+
+    :param filename: Manifest file, defaults to
+    paths.DATASET_MANIFEST_FILE
+
+    :type filename: str, optional
+
+    :return: The manifest or None if it doesn't exist or is of
+    another version
+
+    :rtype: AssetManifest
+    """
+    if filename is None:
+        filename = paths.DATASET_MANIFEST_FILE
+    if not os.path.isfile(filename):
+        return None
+    return AssetManifest.load(filename)
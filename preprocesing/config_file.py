@@ -1,5 +1,3 @@
-import cv2
-
 # **Page rendering**
 page_width = 1600
 page_height = 2400
@@ -9,13 +7,84 @@ page_size = (page_width, page_height)
 output_format = ".jpg"
 metadata_format = ".json"
 
+# How the pages' metadata is stored: "json" writes a file per
+# page, "parquet" writes records in shards of metadata_shard_size
+# pages and row groups of metadata_row_group_size pages
+metadata_sink = "json"
+metadata_shard_size = 100000
+metadata_row_group_size = 1000
+metadata_compression = "zstd"
+
 compression_quality = 50
-cv2_compression = [int(cv2.IMWRITE_JPEG_QUALITY), compression_quality]
 pil_compression = "JPEG"
 
 
 boundary_width = 16
 
+# Composite panel illustrations within each panel's bounding
+# box instead of with full page masks. Pixels can differ from
+# the full page path by up to 2 intensity levels because the
+# box resize rounds the filter weights slightly differently
+panel_local_compositing = True
+
+# Byte budget of each worker's cache of decoded and
+# cropped illustrations, 0 disables it
+illustration_cache_max_bytes = 256*1024*1024
+
+# Ask the JPEG decoder for a reduced size decode when an
+# illustration is larger than what it's stretched to on the page.
+# It needs the crop bounds index. The decoded crop must still cover
+# this ratio of the stretched size, lower values decode smaller
+# images at the cost of sharpness
+reduced_decode = True
+reduced_decode_min_scale = 1.0
+
+# Backend that draws the pages, "pil" draws with PIL images and
+# "numpy" draws into preallocated arrays with OpenCV and NumPy.
+# The numpy outlines have round joints and the polygon edges
+# are rounded slightly differently than PIL's
+compositor = "pil"
+
+# Render black and white pages in grayscale instead of rendering
+# them in color and converting them when saving. Bubble edges can
+# differ by a level because they're blended after the conversion
+grayscale_bw_pages = True
+
+# **Workers**
+# Backend running the pool tasks, "process", "thread" or "inline"
+# which runs them one by one in the calling process for debugging
+# and profiling. Threads share the global random states so pages
+# and layouts can't be created with threads, only rendered
+pool_backend = "process"
+
+# Number of workers, None uses every core
+pool_workers = None
+
+# Tasks sent to a worker at once, None picks it from the number
+# of tasks so every worker gets about four chunks
+pool_chunksize = None
+
+# Chunks a process worker runs before it's replaced to release
+# memory it leaked. None keeps the workers and their caches
+pool_maxtasksperchild = None
+
+# **Work queue**
+# Pages of every range --enqueue splits a run into
+work_queue_task_size = 1000
+
+# Seconds a worker's lease of a range lasts, it's renewed every
+# third of it while the range is generated so only the ranges of
+# crashed workers are leased again
+work_queue_lease_seconds = 600
+
+# Times a range is leased before it's marked as failed
+work_queue_max_attempts = 3
+
+# Seconds an idle worker waits for leased ranges to
+# be done or leased again and for the database's lock
+work_queue_poll_seconds = 10
+work_queue_busy_timeout = 60
+
 # **Font coverage**
 # How many characters of the dataset should the font files support
 font_character_coverage = 0.76
@@ -56,6 +125,22 @@ panel_removal_max = 2
 # Background adding
 background_add_chance = 0.012
 
+# Page plans
+# Panels whose image, speech bubbles and texts are drawn with the
+# page's plan, pages with more panels draw the rest one by one
+planned_panels_per_page = 12
+
+# Pages whose plans are drawn at once
+page_plan_batch_size = 4096
+
+# Layout bank
+# Whether pages take their layouts from the layout bank
+# instead of creating them
+use_layout_bank = False
+
+# Chance of a layout taken from the bank being mirrored
+layout_bank_mirror_chance = 0.5
+
 # **Speech bubbles**
 min_speech_bubbles_per_panel = 0
 max_speech_bubbles_per_panel = 2
@@ -64,9 +149,27 @@ bubble_content_padding = 24
 bubble_to_panel_area_max_ratio = 0.48
 bubble_mask_x_increase = 16
 bubble_mask_y_increase = 16
+
+# Side in pixels of the cells of the grid speech bubbles are
+# placed on, smaller cells waste less room but take longer
+bubble_placement_cell_size = 16
 min_font_size = 24
 max_font_size = 48
 
+# How many fonts loaded at a size each worker keeps
+font_cache_size = 512
+
+# Byte budget of each worker's store of decoded speech
+# bubble templates and their inverted variants
+speech_bubble_template_cache_max_bytes = 128*1024*1024
+
+# Whether the parent places the speech bubble templates and the
+# writing areas in shared memory workers map instead of every
+# worker holding a copy, templates over the byte budget are
+# still decoded by every worker into its store
+use_shared_assets = True
+shared_speech_bubble_templates_max_bytes = 1024*1024*1024
+
 # *Transformations*
 
 # Slicing
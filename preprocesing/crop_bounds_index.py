@@ -0,0 +1,245 @@
+import os
+import hashlib
+import numpy as np
+import paths
+from glob2 import glob
+from PIL import Image
+from .multiprocessing import open_pool
+from .layout_engine.helpers import crop_image_only_outside_rows_columns
+
+# Columns of the index's table
+CROP_BOUNDS_COLUMNS = ["width", "height",
+                       "col_start", "col_end",
+                       "row_start", "row_end"]
+
+
+def get_image_key(path):
+    """
+    Hash an illustration's path relative to the illustration
+    dataset folder so the index doesn't depend on where the
+    dataset lives or how the path was joined
+
+    :param path: Path of the illustration
+
+    :type path: str
+
+    :return: 64 bit key of the illustration
+
+    :rtype: int
+    """
+    relative = os.path.relpath(os.path.normpath(path),
+                               os.path.normpath(paths.DATASET_IMAGES_DANBOORU_IMAGES_FOLDER))
+    relative = relative.replace(os.sep, "/")
+    digest = hashlib.blake2b(relative.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+class CropBoundsIndex(object):
+    """
+    A table of the size and black border crop bounds of every
+    illustration which is sorted by the illustrations' keys.
+    Illustrations which changed since they were indexed aren't
+    looked up so their borders are scanned again
+
+    :param keys: Sorted keys of the illustrations
+
+    :type keys: numpy.ndarray
+
+    :param table: Rows of CROP_BOUNDS_COLUMNS for each key
+
+    :type table: numpy.ndarray
+
+    :param stats: Modification time in nanoseconds and size
+    of each illustration when it was indexed
+
+    :type stats: numpy.ndarray
+    """
+
+    def __init__(self, keys, table, stats):
+        """
+        Constructor method
+        """
+        self.keys = keys
+        self.table = table
+        self.stats = stats
+        self.outdated = 0
+
+    def __len__(self):
+        return len(self.keys)
+
+    def get(self, path):
+        """
+        Get the row of an illustration
+
+        :param path: Path of the illustration
+
+        :type path: str
+
+        :return: The illustration's (width, height, col_start,
+        col_end, row_start, row_end) or None if it isn't indexed
+        or changed since it was indexed
+
+        :rtype: tuple
+        """
+        key = np.uint64(get_image_key(path))
+        idx = np.searchsorted(self.keys, key)
+        if idx >= len(self.keys) or self.keys[idx] != key:
+            return None
+
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        if (stat.st_mtime_ns, stat.st_size) != tuple(self.stats[idx]):
+            if not self.outdated:
+                print("Illustrations changed since the crop bounds index " +
+                      "was created, update it with --index_crop_bounds")
+            self.outdated += 1
+            return None
+        return tuple(int(value) for value in self.table[idx])
+
+    def save(self, filename):
+        """
+        Write the index to a compressed numpy file
+
+        :param filename: Where to write the index
+
+        :type filename: str
+        """
+        with open(filename, "wb") as f:
+            np.savez_compressed(f, keys=self.keys, table=self.table,
+                                stats=self.stats)
+
+    @classmethod
+    def load(cls, filename):
+        """
+        Read an index written by save
+
+        :param filename: Index file
+
+        :type filename: str
+
+        :return: The loaded index or None if it was written
+        without the illustrations' modification times and sizes
+
+        :rtype: CropBoundsIndex
+        """
+        with np.load(filename) as data:
+            if "stats" not in data:
+                print("The crop bounds index at " + filename + " is " +
+                      "outdated, create it again with --index_crop_bounds")
+                return None
+            return cls(data["keys"], data["table"], data["stats"])
+
+
+def compute_crop_bounds(path):
+    """
+    Decode an illustration and find the bounds which crop
+    out its black borders
+
+    :param path: Path of the illustration
+
+    :type path: str
+
+    :return: A tuple of the illustration's key, its row of
+    CROP_BOUNDS_COLUMNS and its modification time in nanoseconds
+    and size or None if it couldn't be read
+
+    :rtype: tuple
+    """
+    try:
+        stat = os.stat(path)
+        img = Image.open(path).convert("L")
+        bounds = crop_image_only_outside_rows_columns(np.asarray(img))
+        return (get_image_key(path), (img.size[0], img.size[1]) + tuple(bounds),
+                (stat.st_mtime_ns, stat.st_size))
+    except Exception:
+        print("We couldn't index " + path)
+        return None
+
+
+def create_crop_bounds_index(folders=None, index_file=None):
+    """
+    Concurrently and in parallel compute the crop bounds of
+    every illustration in the bw/ and colored/ trees once and
+    store them so the renderers don't have to scan every pixel
+
+    :param folders: Folders to index, defaults to the black and
+    white and colored illustration folders
+
+    :type folders: list, optional
+
+    :param index_file: Where to write the index, defaults
+    to paths.DATASET_IMAGES_CROP_BOUNDS_FILE
+
+    :type index_file: str, optional
+
+    :return: The created index
+
+    :rtype: CropBoundsIndex
+    """
+    if folders is None:
+        folders = [paths.DATASET_IMAGES_DANBOORU_BLACK_WHITE_IMAGES_FOLDER,
+                   paths.DATASET_IMAGES_DANBOORU_COLORED_IMAGES_FOLDER]
+    if index_file is None:
+        index_file = paths.DATASET_IMAGES_CROP_BOUNDS_FILE
+
+    images = []
+    for folder in folders:
+        images += glob(os.path.join(folder, "**", "*.jpg"))
+
+    rows = [row for row in open_pool(compute_crop_bounds, images)
+            if row is not None]
+    rows.sort(key=lambda row: row[0])
+
+    keys = np.array([row[0] for row in rows], dtype=np.uint64)
+    table = np.array([row[1] for row in rows], dtype=np.int32)
+    table = table.reshape(-1, len(CROP_BOUNDS_COLUMNS))
+    stats = np.array([row[2] for row in rows], dtype=np.int64).reshape(-1, 2)
+
+    index = CropBoundsIndex(keys, table, stats)
+    index.save(index_file)
+    return index
+
+
+# Loaded once per process by get_crop_bounds_index
+_crop_bounds_index = None
+_crop_bounds_index_loaded = False
+
+
+def load_crop_bounds_index(filename=None):
+    """
+    Load an index as this process' crop bounds index
+
+    :param filename: Index file, defaults to
+    paths.DATASET_IMAGES_CROP_BOUNDS_FILE
+
+    :type filename: str, optional
+
+    :return: The index or None if the file doesn't exist
+
+    :rtype: CropBoundsIndex
+    """
+    global _crop_bounds_index, _crop_bounds_index_loaded
+    if filename is None:
+        filename = paths.DATASET_IMAGES_CROP_BOUNDS_FILE
+
+    _crop_bounds_index_loaded = True
+    _crop_bounds_index = None
+    if os.path.isfile(filename):
+        _crop_bounds_index = CropBoundsIndex.load(filename)
+    return _crop_bounds_index
+
+
+def get_crop_bounds_index():
+    """
+    Get the illustrations' crop bounds index of this process,
+    it's loaded from disk the first time
+
+    :return: The index or None if it hasn't been created
+
+    :rtype: CropBoundsIndex
+    """
+    if not _crop_bounds_index_loaded:
+        load_crop_bounds_index()
+    return _crop_bounds_index
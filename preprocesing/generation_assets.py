@@ -0,0 +1,236 @@
+import os
+import paths
+from .text_store import load_text_store
+from .speech_bubble_writing_area import load_speech_bubbles_writing_areas
+from .asset_manifest import (
+    load_asset_manifest,
+    read_viable_fonts,
+    is_font_viable
+)
+
+
+def get_listing_modified(folder):
+    """
+    Get when a folder of illustrations last changed, the folder
+    and the folders right inside it are checked so the files
+    themselves don't have to be listed
+
+    :param folder: Folder of the illustrations
+
+    :type folder: str
+
+    :return: The latest modification time
+
+    :rtype: float
+    """
+    modified = os.path.getmtime(folder)
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if entry.is_dir():
+                modified = max(modified, entry.stat().st_mtime)
+    return modified
+
+
+def list_images(folder=None, list_file=None):
+    """
+    Get the sorted paths of the illustrations of a folder and its
+    subfolders. The listing is kept in a file and only made again
+    once the folder changes since walking a large dataset takes
+    seconds while reading the file takes milliseconds
+
+    :param folder: Folder of the illustrations, defaults to
+    paths.DATASET_IMAGES_DANBOORU_BLACK_WHITE_IMAGES_FOLDER
+
+    :type folder: str, optional
+
+    :param list_file: Where the listing is kept, defaults to
+    paths.DATASET_IMAGES_BLACK_WHITE_LIST_FILE
+
+    :type list_file: str, optional
+
+    :return: Paths of the illustrations
+
+    :rtype: list
+    """
+    if folder is None:
+        folder = paths.DATASET_IMAGES_DANBOORU_BLACK_WHITE_IMAGES_FOLDER
+    if list_file is None:
+        list_file = paths.DATASET_IMAGES_BLACK_WHITE_LIST_FILE
+    if not os.path.isdir(folder):
+        return []
+
+    if (os.path.isfile(list_file) and
+            os.path.getmtime(list_file) >= get_listing_modified(folder)):
+        with open(list_file) as f:
+            return f.read().splitlines()
+
+    images = []
+    for dirpath, _, filenames in os.walk(folder):
+        images.extend(os.path.join(dirpath, filename)
+                      for filename in filenames if filename.endswith(".jpg"))
+    # Sorted so every machine indexes the same files
+    images.sort()
+    if os.path.isdir(os.path.dirname(list_file) or "."):
+        with open(list_file, "w") as f:
+            f.write("\n".join(images))
+    return images
+
+
+def is_manifest_outdated(folder=None, manifest_file=None):
+    """
+    Check whether the illustrations changed since the asset
+    manifest was built the way list_images checks its listing,
+    or the writing areas or viable fonts files did
+
+    :param folder: Folder of the illustrations, defaults to
+    paths.DATASET_IMAGES_DANBOORU_BLACK_WHITE_IMAGES_FOLDER
+
+    :type folder: str, optional
+
+    :param manifest_file: Manifest file, defaults
+    to paths.DATASET_MANIFEST_FILE
+
+    :type manifest_file: str, optional
+
+    :return: Whether the manifest should be built again
+
+    :rtype: bool
+    """
+    if folder is None:
+        folder = paths.DATASET_IMAGES_DANBOORU_BLACK_WHITE_IMAGES_FOLDER
+    if manifest_file is None:
+        manifest_file = paths.DATASET_MANIFEST_FILE
+    if not os.path.isfile(manifest_file):
+        return False
+    modified = [os.path.getmtime(filename) for filename in
+                [paths.DATASET_IMAGES_SPEECH_BUBBLES_WRITING_AREAS_FILE,
+                 paths.DATASET_FONTS_VIABLE_FONTS_FILE]
+                if os.path.isfile(filename)]
+    if os.path.isdir(folder):
+        modified.append(get_listing_modified(folder))
+    return os.path.getmtime(manifest_file) < max(modified + [0])
+
+
+def load_viable_fonts(language, file=None):
+    """
+    Load the fonts which can write a language
+
+    :param language: One of paths.LANGUAGES_MODE_AVAILABLE
+
+    :type language: str
+
+    :param file: File of the viable fonts, defaults
+    to paths.DATASET_FONTS_VIABLE_FONTS_FILE
+
+    :type file: str, optional
+
+    :return: Paths of the fonts
+
+    :rtype: list
+    """
+    return [path for path, japanese_viable, english_viable
+            in read_viable_fonts(file)
+            if is_font_viable(japanese_viable, english_viable, language)]
+
+
+class GenerationAssets(object):
+    """
+    The assets pages are generated from. They're taken from the
+    asset manifest if it was built, otherwise each of them is
+    only loaded the first time it's used: the illustrations from
+    their kept listing and the fonts and writing areas from their
+    files. The texts are a memory-mapped store whose rows and
+    columns are only read once pages look them up
+
+    :param language: Language of the pages
+
+    :type language: str
+
+    :param manifest: The asset manifest, loaded from
+    paths.DATASET_MANIFEST_FILE if None
+
+    :type manifest: AssetManifest, optional
+    """
+
+    def __init__(self, language, manifest=None):
+        """
+        Constructor method
+        """
+        self.language = language
+        self.manifest = manifest
+        if self.manifest is None:
+            self.manifest = load_asset_manifest()
+        if self.manifest is not None and is_manifest_outdated():
+            print("The assets changed since the asset manifest "
+                  "was built, update it with --build_manifest")
+        self._images = None
+        self._texts = None
+        self._fonts = None
+        self._speech_bubbles = None
+        self._writing_areas = None
+
+    @property
+    def images(self):
+        if self._images is None:
+            if self.manifest is not None:
+                self._images = self.manifest.images
+            else:
+                self._images = list_images()
+        return self._images
+
+    @property
+    def texts(self):
+        if self._texts is None:
+            self._texts = load_text_store()
+        return self._texts
+
+    @property
+    def fonts(self):
+        if self._fonts is None:
+            if self.manifest is not None:
+                self._fonts = self.manifest.get_fonts(self.language)
+            else:
+                self._fonts = load_viable_fonts(self.language)
+        return self._fonts
+
+    @property
+    def speech_bubbles(self):
+        if self._speech_bubbles is None:
+            if self.manifest is not None:
+                self._speech_bubbles = self.manifest.speech_bubbles
+            else:
+                folder = paths.DATASET_IMAGES_SPEECH_BUBBLES_FOLDER
+                self._speech_bubbles = [folder + filename for filename
+                                        in sorted(os.listdir(folder))]
+        return self._speech_bubbles
+
+    def load_writing_areas(self):
+        """
+        Load the writing areas of the speech bubbles
+        and the size of their templates
+
+        :return: The writing areas and the templates by path
+
+        :rtype: tuple
+        """
+        if self._writing_areas is None:
+            if self.manifest is not None:
+                self._writing_areas = (self.manifest.writing_areas,
+                                       self.manifest.speech_bubble_templates)
+            else:
+                filename = paths.DATASET_IMAGES_SPEECH_BUBBLES_WRITING_AREAS_FILE
+                if not os.path.isfile(filename):
+                    raise Exception("There's no writing areas file at " +
+                                    filename + ", create it with "
+                                    "--calculate_writing_areas")
+                self._writing_areas = load_speech_bubbles_writing_areas(
+                    filename)
+        return self._writing_areas
+
+    @property
+    def speech_bubbles_writing_areas(self):
+        return self.load_writing_areas()[0]
+
+    @property
+    def speech_bubble_templates(self):
+        return self.load_writing_areas()[1]
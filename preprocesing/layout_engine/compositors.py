@@ -0,0 +1,548 @@
+import threading
+import numpy as np
+from PIL import Image, ImageDraw
+from .helpers import get_polygon_bbox
+from .. import config_file as cfg
+
+# Compositor backends the render engine can draw pages with
+COMPOSITOR_PIL = "pil"
+COMPOSITOR_NUMPY = "numpy"
+COMPOSITORS_AVAILABLE = [COMPOSITOR_PIL, COMPOSITOR_NUMPY]
+
+# OpenCV is imported once the first NumPy compositor is
+# created so choosing a compositor doesn't import it
+cv2 = None
+
+
+def get_region(img, box):
+    """
+    Get the region of an illustration that falls within a box on the
+    page. The illustration is stretched to the page's size as a simple
+    way to crop different parts of it, but only the region within the
+    box is resized. Pillow computes the filter weights from the whole
+    source so this matches cropping a full resize up to rounding
+
+    :param img: Cropped illustration of the panel
+
+    :type img: PIL.Image
+
+    :param box: The box on the page as (x0, y0, x1, y1)
+
+    :type box: tuple
+
+    :return: The region resized to the box's size
+
+    :rtype: PIL.Image
+    """
+    # TODO: Figure out how to do different types of
+    # image crops for smaller panels
+    x0, y0, x1, y1 = box
+    w_ratio = img.size[0]/cfg.page_width
+    h_ratio = img.size[1]/cfg.page_height
+    return img.resize((x1 - x0, y1 - y0),
+                      box=(x0*w_ratio, y0*h_ratio,
+                           x1*w_ratio, y1*h_ratio))
+
+
+def blend(dst, src, alpha):
+    """
+    Alpha blend src over dst in place with the same rounding Pillow
+    uses when pasting with a mask. Opaque pixels are copied and only
+    the partially transparent ones are blended since images like
+    speech bubbles are mostly fully opaque or fully transparent
+
+    :param dst: Pixels to blend onto
+
+    :type dst: numpy.ndarray
+
+    :param src: Pixels with dst's shape or a single value to blend in
+
+    :type src: numpy.ndarray or int
+
+    :param alpha: Alpha of src with dst's height and width
+
+    :type alpha: numpy.ndarray
+    """
+    opaque = alpha == 255
+    partial = np.nonzero((alpha > 0) & ~opaque)
+
+    if np.ndim(src) == 0:
+        np.copyto(dst, src, where=opaque)
+        src_partial = np.uint16(src)
+    else:
+        cv2.copyTo(src, opaque.view(np.uint8), dst)
+        src_partial = src[partial].astype(np.uint16)
+
+    alpha_partial = alpha[partial].astype(np.uint16)
+    if dst.ndim == 3:
+        alpha_partial = alpha_partial[:, None]
+
+    tmp = (dst[partial]*(255 - alpha_partial) +
+           src_partial*alpha_partial + 128)
+    dst[partial] = ((tmp >> 8) + tmp) >> 8
+
+
+def get_points(rect, origin=(0, 0)):
+    """
+    Convert a polygon to the integer points OpenCV draws. PIL
+    truncates the coordinates too so the edges mostly line up
+
+    :param rect: The polygon
+
+    :type rect: tuple
+
+    :param origin: Point to make the points relative to
+
+    :type origin: tuple, optional
+
+    :return: The points
+
+    :rtype: numpy.ndarray
+    """
+    points = np.floor(np.asarray(rect, dtype=np.float64) - origin)
+    return points.astype(np.int32)
+
+
+def clip_location(size, location):
+    """
+    Clip an image placed on the page to the page's bounds
+
+    :param size: Size of the image as (width, height)
+
+    :type size: tuple
+
+    :param location: Top left corner of the image on the page
+
+    :type location: tuple
+
+    :return: The slices of the page and of the image which
+    overlap or None if they don't
+
+    :rtype: tuple
+    """
+    x, y = location
+    width, height = size
+    x0, y0 = max(x, 0), max(y, 0)
+    x1 = min(x + width, cfg.page_width)
+    y1 = min(y + height, cfg.page_height)
+    if x1 <= x0 or y1 <= y0:
+        return None
+    page_slice = (slice(y0, y1), slice(x0, x1))
+    img_slice = (slice(y0 - y, y1 - y), slice(x0 - x, x1 - x))
+    return page_slice, img_slice
+
+
+class PILCompositor(object):
+    """
+    Draws pages as PIL images
+    """
+
+    def new_page(self, key, mode, color):
+        """
+        Create a blank page
+
+        :param key: Which output of the page it is
+
+        :type key: str
+
+        :param mode: Mode of the page, "L" or "RGB"
+
+        :type mode: str
+
+        :param color: Color to fill the page with, "white" or "black"
+
+        :type color: str
+
+        :return: The page
+        """
+        return Image.new(size=cfg.page_size, mode=mode, color=color)
+
+    def paste_background(self, page, bg):
+        """
+        Paste a background that has the page's size
+
+        :param page: Page to paste onto
+
+        :param bg: Background image
+
+        :type bg: PIL.Image
+        """
+        page.paste(bg, (0, 0))
+
+    def rasterize(self, rect):
+        """
+        Rasterize a panel's polygon into a mask which is either the
+        size of the panel's bounding box or of the whole page
+
+        :param rect: Polygon of the panel
+
+        :type rect: tuple
+
+        :return: The box the mask covers on the page as (x0, y0, x1, y1)
+        and the mask itself or None if the panel is outside the page
+
+        :rtype: tuple
+        """
+        if cfg.panel_local_compositing:
+            x0, y0, x1, y1 = get_polygon_bbox(rect, cfg.page_size)
+            if x1 <= x0 or y1 <= y0:
+                return None
+            rect = [(x - x0, y - y0) for x, y in rect]
+        else:
+            x0, y0, x1, y1 = 0, 0, cfg.page_width, cfg.page_height
+
+        mask = Image.new("L", (x1 - x0, y1 - y0), 0)
+        draw_mask = ImageDraw.Draw(mask)
+        draw_mask.polygon(rect, fill=255)
+
+        return (x0, y0, x1, y1), mask
+
+    def draw_outline(self, page, rect):
+        """
+        Draw a panel's outline
+
+        :param page: Page to draw onto
+
+        :param rect: Polygon of the panel
+
+        :type rect: tuple
+        """
+        draw_rect = ImageDraw.Draw(page)
+        draw_rect.line(rect, fill="black", width=cfg.boundary_width)
+
+    def paste_illustration(self, page, img, box, mask):
+        """
+        Paste a panel's illustration within the panel's mask
+
+        :param page: Page to paste onto
+
+        :param img: Cropped illustration of the panel
+
+        :type img: PIL.Image
+
+        :param box: The box the mask covers on the page
+
+        :type box: tuple
+
+        :param mask: The panel's rasterized polygon
+        """
+        page.paste(get_region(img, box), box[:2], mask)
+
+    def paste_mask(self, page, box, mask):
+        """
+        Fill a panel's mask on a mask page
+
+        :param page: Mask page to fill
+
+        :param box: The box the mask covers on the page
+
+        :type box: tuple
+
+        :param mask: The panel's rasterized polygon
+        """
+        page.paste(255, box, mask)
+
+    def paste_bubble(self, page, bubble, location):
+        """
+        Alpha composite a rendered speech bubble
+
+        :param page: Page to paste onto
+
+        :param bubble: Rendered speech bubble
+
+        :type bubble: PIL.Image
+
+        :param location: Top left corner of the bubble
+
+        :type location: tuple
+        """
+        if page.mode == "L":
+            if bubble.mode != "LA":
+                bubble = bubble.convert("LA")
+            luminance, alpha = bubble.split()
+            page.paste(luminance, location, alpha)
+        else:
+            page.paste(bubble, location, bubble)
+
+    def paste_bubble_mask(self, page, bubble, location):
+        """
+        Fill a speech bubble's alpha on a mask page
+
+        :param page: Mask page to fill
+
+        :param bubble: Rendered speech bubble
+
+        :type bubble: PIL.Image
+
+        :param location: Top left corner of the bubble
+
+        :type location: tuple
+        """
+        page.paste(255, location, bubble.getchannel("A"))
+
+    def to_image(self, page):
+        """
+        Get a finished page as a PIL image
+
+        :param page: The page
+
+        :return: The page's image
+
+        :rtype: PIL.Image
+        """
+        return page
+
+
+class NumpyCompositor(object):
+    """
+    Draws pages into uint8 arrays which are allocated once per
+    worker and reused for every page. Polygons are rasterized with
+    OpenCV into a reusable mask buffer and bubbles are blended with
+    NumPy so pages only become PIL images when they're finished
+    """
+
+    def __init__(self):
+        global cv2
+        import cv2
+        self.buffers = {}
+
+    def get_buffer(self, shape, key):
+        """
+        Get a preallocated buffer of the worker
+
+        :param shape: Shape of the buffer
+
+        :type shape: tuple
+
+        :param key: Which of the buffers to get
+
+        :return: The buffer
+
+        :rtype: numpy.ndarray
+        """
+        buffer = self.buffers.get(key)
+        if buffer is None or buffer.shape != shape:
+            buffer = np.empty(shape, dtype=np.uint8)
+            self.buffers[key] = buffer
+        return buffer
+
+    def new_page(self, key, mode, color):
+        """
+        Clear one of the worker's page buffers. Each output of a
+        page gets its own buffer so a page is only valid until the
+        next page with the same key is created
+
+        :param key: Which output of the page it is
+
+        :type key: str
+
+        :param mode: Mode of the page, "L" or "RGB"
+
+        :type mode: str
+
+        :param color: Color to fill the page with, "white" or "black"
+
+        :type color: str
+
+        :return: The page
+
+        :rtype: numpy.ndarray
+        """
+        if mode == "L":
+            shape = (cfg.page_height, cfg.page_width)
+        else:
+            shape = (cfg.page_height, cfg.page_width, 3)
+        page = self.get_buffer(shape, key)
+        page.fill(255 if color == "white" else 0)
+        return page
+
+    def paste_background(self, page, bg):
+        """
+        Paste a background that has the page's size
+
+        :param page: Page to paste onto
+
+        :param bg: Background image
+
+        :type bg: PIL.Image
+        """
+        bg = np.asarray(bg)
+        page[...] = bg if page.ndim == 2 else bg[..., None]
+
+    def rasterize(self, rect):
+        """
+        Rasterize a panel's polygon into the worker's mask buffer
+        within the panel's bounding box. The mask is only valid
+        until the next polygon is rasterized
+
+        :param rect: Polygon of the panel
+
+        :type rect: tuple
+
+        :return: The box the mask covers on the page as (x0, y0, x1, y1)
+        and the mask itself or None if the panel is outside the page
+
+        :rtype: tuple
+        """
+        x0, y0, x1, y1 = get_polygon_bbox(rect, cfg.page_size)
+        if x1 <= x0 or y1 <= y0:
+            return None
+
+        mask_buffer = self.get_buffer((cfg.page_height, cfg.page_width),
+                                      "mask")
+        mask = mask_buffer[y0:y1, x0:x1]
+        mask.fill(0)
+
+        cv2.fillPoly(mask, [get_points(rect, (x0, y0))], 255)
+
+        return (x0, y0, x1, y1), mask
+
+    def draw_outline(self, page, rect):
+        """
+        Draw a panel's outline
+
+        :param page: Page to draw onto
+
+        :param rect: Polygon of the panel
+
+        :type rect: tuple
+        """
+        cv2.polylines(page, [get_points(rect)], False, (0, 0, 0),
+                      thickness=cfg.boundary_width)
+
+    def paste_illustration(self, page, img, box, mask):
+        """
+        Copy a panel's illustration within the panel's mask
+
+        :param page: Page to paste onto
+
+        :param img: Cropped illustration of the panel
+
+        :type img: PIL.Image
+
+        :param box: The box the mask covers on the page
+
+        :type box: tuple
+
+        :param mask: The panel's rasterized polygon
+
+        :type mask: numpy.ndarray
+        """
+        x0, y0, x1, y1 = box
+        region = np.asarray(get_region(img, box))
+        if region.ndim < page.ndim:
+            region = cv2.cvtColor(region, cv2.COLOR_GRAY2RGB)
+        cv2.copyTo(region, mask, page[y0:y1, x0:x1])
+
+    def paste_mask(self, page, box, mask):
+        """
+        Fill a panel's mask on a mask page
+
+        :param page: Mask page to fill
+
+        :param box: The box the mask covers on the page
+
+        :type box: tuple
+
+        :param mask: The panel's rasterized polygon
+
+        :type mask: numpy.ndarray
+        """
+        x0, y0, x1, y1 = box
+        np.copyto(page[y0:y1, x0:x1], 255, where=mask > 0)
+
+    def paste_bubble(self, page, bubble, location):
+        """
+        Alpha blend a rendered speech bubble
+
+        :param page: Page to paste onto
+
+        :param bubble: Rendered speech bubble
+
+        :type bubble: PIL.Image
+
+        :param location: Top left corner of the bubble
+
+        :type location: tuple
+        """
+        clipped = clip_location(bubble.size, location)
+        if clipped is None:
+            return
+        page_slice, img_slice = clipped
+        if page.ndim == 2:
+            if bubble.mode != "LA":
+                bubble = bubble.convert("LA")
+            luminance, alpha = cv2.split(np.asarray(bubble)[img_slice])
+            blend(page[page_slice], luminance, alpha)
+        else:
+            bubble = np.asarray(bubble)[img_slice]
+            blend(page[page_slice], cv2.cvtColor(bubble, cv2.COLOR_RGBA2RGB),
+                  bubble[..., 3])
+
+    def paste_bubble_mask(self, page, bubble, location):
+        """
+        Fill a speech bubble's alpha on a mask page
+
+        :param page: Mask page to fill
+
+        :param bubble: Rendered speech bubble
+
+        :type bubble: PIL.Image
+
+        :param location: Top left corner of the bubble
+
+        :type location: tuple
+        """
+        clipped = clip_location(bubble.size, location)
+        if clipped is None:
+            return
+        page_slice, img_slice = clipped
+        alpha = np.asarray(bubble.getchannel("A"))[img_slice]
+        blend(page[page_slice], 255, alpha)
+
+    def to_image(self, page):
+        """
+        Copy a finished page out of its buffer into a PIL image
+
+        :param page: The page
+
+        :type page: numpy.ndarray
+
+        :return: The page's image
+
+        :rtype: PIL.Image
+        """
+        mode = "RGB" if page.ndim == 3 else "L"
+        return Image.frombytes(mode, (page.shape[1], page.shape[0]), page)
+
+
+# Compositors are created once per worker thread so their
+# buffers are reused for every page but never shared
+_worker = threading.local()
+
+
+def get_compositor(name=None):
+    """
+    Get the worker's compositor
+
+    :param name: Which of COMPOSITORS_AVAILABLE to get,
+    defaults to cfg.compositor
+
+    :type name: str, optional
+
+    :return: The compositor
+    """
+    if name is None:
+        name = cfg.compositor
+    if name not in COMPOSITORS_AVAILABLE:
+        raise Exception("That compositor is not available. Available " +
+                        str(COMPOSITORS_AVAILABLE))
+    compositors = getattr(_worker, "compositors", None)
+    if compositors is None:
+        compositors = _worker.compositors = {}
+    if name not in compositors:
+        if name == COMPOSITOR_PIL:
+            compositors[name] = PILCompositor()
+        else:
+            compositors[name] = NumpyCompositor()
+    return compositors[name]
@@ -1,3 +1,4 @@
+import math
 import numpy as np
 
 
@@ -52,6 +53,41 @@ def crop_image_only_outside(img, tol=0):
     return img[row_start:row_end, col_start:col_end]
     
 
+def get_polygon_bbox(polygon, size):
+    """
+    Returns the integer bounding box of a polygon
+    clipped to the bounds of an image. The box is
+    padded so every pixel the polygon rasterizes to
+    lies inside it
+
+    :param polygon: A list of xy coordinates
+
+    :type polygon: list
+
+    :param size: Width and height of the image the
+    polygon is drawn on
+
+    :type size: tuple
+
+    :return: Box as (x0, y0, x1, y1) with x1 and y1
+    exclusive, it's empty if x1 <= x0 or y1 <= y0
+
+    :rtype: tuple
+    """
+    xs = [point[0] for point in polygon]
+    ys = [point[1] for point in polygon]
+
+    # Pillow can fill a pixel past a sharp vertex
+    # so pad the box on every side
+    pad = 2
+    x0 = max(math.floor(min(xs)) - pad, 0)
+    y0 = max(math.floor(min(ys)) - pad, 0)
+    x1 = min(math.ceil(max(xs)) + pad + 1, size[0])
+    y1 = min(math.ceil(max(ys)) + pad + 1, size[1])
+
+    return (x0, y0, x1, y1)
+
+
 def invert_for_next(current):
     """
 
@@ -0,0 +1,126 @@
+import os
+import threading
+from collections import OrderedDict
+from .. import config_file as cfg
+
+
+class IllustrationCache(object):
+    """
+    A least recently used cache of decoded illustrations
+    which is local to the process using it and shared by its
+    threads. Entries are evicted once the images held are over
+    a byte budget
+
+    :param max_bytes: Byte budget of the cached images,
+    0 disables the cache
+
+    :type max_bytes: int
+    """
+
+    def __init__(self, max_bytes):
+        """
+        Constructor method
+        """
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, load):
+        """
+        Get an entry from the cache or load it and
+        store it if it fits in the budget
+
+        :param key: Key of the entry e.g. (path, target size)
+
+        :type key: tuple
+
+        :param load: Function without arguments which returns
+        a tuple of the entry and its size in bytes
+
+        :type load: function
+
+        :return: The entry
+        """
+        with self.lock:
+            if key in self.entries:
+                self.hits += 1
+                self.entries.move_to_end(key)
+                return self.entries[key][0]
+            self.misses += 1
+
+        # Threads missing the same key may both load it
+        value, nbytes = load()
+        if nbytes > self.max_bytes:
+            return value
+
+        with self.lock:
+            if key not in self.entries:
+                self.entries[key] = (value, nbytes)
+                self.nbytes += nbytes
+
+            # Evict the least recently used entries
+            while self.nbytes > self.max_bytes:
+                _, (_, evicted_nbytes) = self.entries.popitem(last=False)
+                self.nbytes -= evicted_nbytes
+                self.evictions += 1
+
+        return value
+
+    def clear(self):
+        """
+        Remove every entry and reset the counters
+        """
+        with self.lock:
+            self.entries.clear()
+            self.nbytes = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def clear_stats(self):
+        """
+        Reset the counters and keep the entries
+        """
+        with self.lock:
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def get_stats(self):
+        """
+        Get the counters of this process' cache
+
+        :return: Counters tagged with the process id
+        so they can be merged across workers
+
+        :rtype: dict
+        """
+        return dict(pid=os.getpid(),
+                    hits=self.hits,
+                    misses=self.misses,
+                    evictions=self.evictions,
+                    nbytes=self.nbytes)
+
+
+def get_image_nbytes(img):
+    """
+    Get how many bytes a decoded image holds
+
+    :param img: Image to measure
+
+    :type img: PIL.Image
+
+    :return: Size in bytes
+
+    :rtype: int
+    """
+    return img.size[0]*img.size[1]*len(img.getbands())
+
+
+# Every worker process gets its own cache
+illustration_cache = IllustrationCache(cfg.illustration_cache_max_bytes)
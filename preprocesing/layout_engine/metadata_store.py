@@ -0,0 +1,455 @@
+import os
+import json
+import uuid
+
+import paths
+from .. import config_file as cfg
+
+# Formats the pages' metadata can be stored in: a JSON file
+# per page or records in sharded Parquet files. pyarrow is only
+# imported once shards are read or written so choosing a sink
+# and reading JSON files don't import it
+METADATA_SINK_JSON = "json"
+METADATA_SINK_PARQUET = "parquet"
+METADATA_SINKS_AVAILABLE = [METADATA_SINK_JSON, METADATA_SINK_PARQUET]
+
+METADATA_SHARD_EXTENSION = ".parquet"
+# Row groups MetadataStore.get keeps decoded
+METADATA_CACHED_ROW_GROUPS = 8
+# Name and type of the shards' columns
+METADATA_COLUMNS = [("name", "string"), ("metadata", "string")]
+
+
+def get_metadata_schema():
+    """
+    Get the schema of the shards
+
+    :rtype: pyarrow.Schema
+    """
+    import pyarrow as pa
+    return pa.schema(METADATA_COLUMNS)
+
+
+def serialize_metadata(data):
+    """
+    Get the record of a page's metadata, its JSON
+    without any whitespace
+
+    :param data: The page's metadata
+
+    :type data: dict
+
+    :return: The record
+
+    :rtype: str
+    """
+    return json.dumps(data, separators=(",", ":"))
+
+
+def dump_page_metadata(page, folder=None):
+    """
+    Store a page's metadata from the worker which created it. With
+    the JSON sink the worker writes the page's file, otherwise
+    it gets the record for the parent's sink to write
+
+    :param page: The page
+
+    :type page: Page
+
+    :param folder: Folder of the metadata, defaults
+    to paths.GENERATED_METADATA_FOLDER
+
+    :type folder: str, optional
+
+    :return: The page's record or None if it was written
+
+    :rtype: str
+    """
+    if folder is None:
+        folder = paths.GENERATED_METADATA_FOLDER
+    if cfg.metadata_sink == METADATA_SINK_JSON:
+        page.dump_data(folder, dry=False)
+        return None
+    return serialize_metadata(page.get_metadata())
+
+
+class JsonMetadataSink(object):
+    """
+    Writes the metadata of every page to its own JSON file
+    the way Page.dump_data does
+
+    :param folder: Folder of the files
+
+    :type folder: str
+    """
+
+    def __init__(self, folder):
+        """
+        Constructor method
+        """
+        self.folder = folder
+
+    def write(self, name, record):
+        """
+        Write a page's metadata
+
+        :param name: Name of the page
+
+        :type name: str
+
+        :param record: The page's record, None when the
+        worker already wrote the page's file
+
+        :type record: str
+        """
+        if record is None:
+            return
+        with open(self.folder + name + cfg.metadata_format, "w+") as json_file:
+            json.dump(json.loads(record), json_file, indent=2)
+
+    def close(self):
+        pass
+
+
+class ParquetMetadataSink(object):
+    """
+    Writes the pages' records to Parquet files of
+    cfg.metadata_shard_size pages in row groups of
+    cfg.metadata_row_group_size pages so millions of pages
+    take a few files which are read a row group at a time
+
+    :param folder: Folder of the shards
+
+    :type folder: str
+    """
+
+    def __init__(self, folder):
+        """
+        Constructor method
+        """
+        self.folder = folder
+        # Shards of separate runs or machines don't collide
+        self.prefix = "metadata_" + uuid.uuid4().hex[:12] + "_"
+        self.shards = 0
+        self.writer = None
+        self.shard_rows = 0
+        self.names = []
+        self.records = []
+
+    def write(self, name, record):
+        """
+        Add a page's record, it's written once its row group is full
+
+        :param name: Name of the page
+
+        :type name: str
+
+        :param record: The page's record
+
+        :type record: str
+        """
+        self.names.append(name)
+        self.records.append(record)
+        if len(self.records) >= cfg.metadata_row_group_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Write the buffered records as a row group
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        if not self.records:
+            return
+        schema = get_metadata_schema()
+        if self.writer is None:
+            filename = "%s%05d%s" % (self.prefix, self.shards,
+                                     METADATA_SHARD_EXTENSION)
+            self.writer = pq.ParquetWriter(self.folder + filename,
+                                           schema,
+                                           compression=cfg.metadata_compression)
+            self.shards += 1
+        table = pa.table([self.names, self.records], schema=schema)
+        self.writer.write_table(table, row_group_size=len(self.records))
+        self.shard_rows += len(self.records)
+        self.names = []
+        self.records = []
+
+        if self.shard_rows >= cfg.metadata_shard_size:
+            self.writer.close()
+            self.writer = None
+            self.shard_rows = 0
+
+    def close(self):
+        """
+        Write the remaining records and close the shard
+        """
+        self.flush()
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+
+def open_metadata_sink(sink=None, folder=None):
+    """
+    Open the sink the parent writes the pages' records to
+
+    :param sink: One of METADATA_SINKS_AVAILABLE, defaults
+    to cfg.metadata_sink
+
+    :type sink: str, optional
+
+    :param folder: Folder of the metadata, defaults
+    to paths.GENERATED_METADATA_FOLDER
+
+    :type folder: str, optional
+
+    :return: The sink
+
+    :rtype: JsonMetadataSink or ParquetMetadataSink
+    """
+    if sink is None:
+        sink = cfg.metadata_sink
+    if folder is None:
+        folder = paths.GENERATED_METADATA_FOLDER
+    if sink == METADATA_SINK_JSON:
+        return JsonMetadataSink(folder)
+    if sink == METADATA_SINK_PARQUET:
+        return ParquetMetadataSink(folder)
+    raise Exception("That metadata sink is not available. Available " +
+                    str(METADATA_SINKS_AVAILABLE))
+
+
+class MetadataStore(object):
+    """
+    Reads the metadata of the pages of a folder whether it's
+    in JSON files, in Parquet shards or in both. Pages are
+    streamed a file or a row group at a time and can be looked up
+    by name, the shards' names are indexed the first time. The
+    folder is only listed once the shards are needed since JSON
+    files are opened by name. Pages stored more than once, e.g. by
+    a range of the work queue which was generated again, are read
+    from the first file or shard they're found in
+
+    :param folder: Folder of the metadata, defaults
+    to paths.GENERATED_METADATA_FOLDER
+
+    :type folder: str, optional
+    """
+
+    def __init__(self, folder=None):
+        """
+        Constructor method
+        """
+        if folder is None:
+            folder = paths.GENERATED_METADATA_FOLDER
+        self.folder = folder
+        self.json_files = None
+        self.shards = None
+        self.index = None
+        self.parquet_files = {}
+        self.row_groups = {}
+
+    def list_folder(self):
+        """
+        List the JSON files and the shards of the folder,
+        it's only listed the first time
+        """
+        if self.shards is not None:
+            return
+        files = []
+        if os.path.isdir(self.folder):
+            files = sorted(os.listdir(self.folder))
+        self.json_files = [filename for filename in files
+                           if filename.endswith(cfg.metadata_format)]
+        self.shards = [filename for filename in files
+                       if filename.endswith(METADATA_SHARD_EXTENSION)]
+
+    def __len__(self):
+        index = self.get_index()
+        json_pages = sum(1 for filename in self.json_files
+                         if filename[:-len(cfg.metadata_format)] not in index)
+        return len(index) + json_pages
+
+    def get_parquet_file(self, shard):
+        """
+        Open a shard once, its footer is only read the first time
+
+        :param shard: File name of the shard
+
+        :type shard: str
+
+        :return: The opened shard
+
+        :rtype: pyarrow.parquet.ParquetFile
+        """
+        import pyarrow.parquet as pq
+        if shard not in self.parquet_files:
+            self.parquet_files[shard] = pq.ParquetFile(self.folder + shard)
+        return self.parquet_files[shard]
+
+    def __iter__(self):
+        """
+        Stream the pages' metadata
+
+        :return: Names and metadata of the pages
+
+        :rtype: generator
+        """
+        self.list_folder()
+        names = set()
+        for filename in self.json_files:
+            name = filename[:-len(cfg.metadata_format)]
+            names.add(name)
+            with open(self.folder + filename) as f:
+                yield name, json.load(f)
+        for shard in self.shards:
+            parquet_file = self.get_parquet_file(shard)
+            for i in range(parquet_file.num_row_groups):
+                row_group = parquet_file.read_row_group(i).to_pydict()
+                for name, record in zip(row_group["name"],
+                                        row_group["metadata"]):
+                    if name in names:
+                        continue
+                    names.add(name)
+                    yield name, json.loads(record)
+
+    def get_index(self):
+        """
+        Get where every page of the shards is, only
+        their name column is read
+
+        :return: Shard, row group and row by page name
+
+        :rtype: dict
+        """
+        if self.index is None:
+            self.list_folder()
+            self.index = {}
+            for shard in self.shards:
+                parquet_file = self.get_parquet_file(shard)
+                for i in range(parquet_file.num_row_groups):
+                    names = parquet_file.read_row_group(
+                        i, columns=["name"]).column(0).to_pylist()
+                    for row, name in enumerate(names):
+                        self.index.setdefault(name, (shard, i, row))
+        return self.index
+
+    def get(self, name):
+        """
+        Get a page's metadata
+
+        :param name: Name of the page
+
+        :type name: str
+
+        :return: The page's metadata or None if it isn't stored
+
+        :rtype: dict
+        """
+        filename = self.folder + name + cfg.metadata_format
+        if os.path.isfile(filename):
+            with open(filename) as f:
+                return json.load(f)
+
+        location = self.get_index().get(name)
+        if location is None:
+            return None
+        shard, i, row = location
+        # The latest row groups read are kept, the
+        # oldest one is dropped first
+        records = self.row_groups.pop((shard, i), None)
+        if records is None:
+            records = self.get_parquet_file(shard).read_row_group(
+                i, columns=["metadata"]).column(0)
+            if len(self.row_groups) >= METADATA_CACHED_ROW_GROUPS:
+                del self.row_groups[next(iter(self.row_groups))]
+        self.row_groups[(shard, i)] = records
+        return json.loads(records[row].as_py())
+
+
+# Opened once per process by get_metadata_store
+_metadata_store = None
+
+
+def get_metadata_store():
+    """
+    Get this process' reader of paths.GENERATED_METADATA_FOLDER,
+    it's reopened when it misses a page after it listed the
+    folder so it sees new shards
+
+    :return: The reader
+
+    :rtype: MetadataStore
+    """
+    global _metadata_store
+    if _metadata_store is None:
+        _metadata_store = MetadataStore()
+    return _metadata_store
+
+
+def read_page_metadata(name):
+    """
+    Read a page's metadata from the generated metadata folder
+
+    :param name: Name of the page
+
+    :type name: str
+
+    :return: The page's metadata
+
+    :rtype: dict
+    """
+    global _metadata_store
+    store = get_metadata_store()
+    listed = store.shards is not None
+    metadata = store.get(name)
+    if metadata is None and listed:
+        # Shards may have been written since the folder was listed
+        _metadata_store = MetadataStore()
+        metadata = _metadata_store.get(name)
+    if metadata is None:
+        raise Exception("There's no metadata of the page " + name)
+    return metadata
+
+
+def convert_metadata(sink, folder=None):
+    """
+    Convert the metadata of a folder to a format, the files
+    of the other format are removed once every page is converted
+    so old datasets can be moved to shards and back
+
+    :param sink: One of METADATA_SINKS_AVAILABLE
+
+    :type sink: str
+
+    :param folder: Folder of the metadata, defaults
+    to paths.GENERATED_METADATA_FOLDER
+
+    :type folder: str, optional
+
+    :return: The number of pages converted
+
+    :rtype: int
+    """
+    output = open_metadata_sink(sink, folder)
+
+    # Only the pages of the other format are read
+    store = MetadataStore(output.folder)
+    store.list_folder()
+    if sink == METADATA_SINK_JSON:
+        sources = store.shards
+        store.json_files = []
+    else:
+        sources = store.json_files
+        store.shards = []
+
+    count = 0
+    for name, data in store:
+        output.write(name, serialize_metadata(data))
+        count += 1
+    output.close()
+
+    for filename in sources:
+        os.remove(store.folder + filename)
+    return count
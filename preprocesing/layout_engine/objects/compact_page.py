@@ -0,0 +1,487 @@
+import json
+import math
+import numpy as np
+from ..render_engine import render_page, RENDER_BW
+from ... import config_file as cfg
+from .page import Page
+from .panel import Panel
+from .speech_bubble import SpeechBubble
+
+# Bits of a panel's flags
+PANEL_NON_RECT = 1
+PANEL_SLICED = 2
+PANEL_NO_RENDER = 4
+
+# Keys of the writing areas in the order they're dumped,
+# the path is kept in the string table
+WRITING_AREA_KEYS = ("width", "height", "x", "y")
+
+# Transform metadata of a bubble, missing ones are NaN
+TRANSFORM_METADATA_KEYS = ("stretch_x_factor",
+                           "stretch_y_factor",
+                           "rotation_amount")
+
+# Arrays of a compact page with their types, they're pickled
+# in one buffer in this order so they stay aligned
+COMPACT_PAGE_ARRAYS = (("bubble_transform_metadata", np.float64),
+                       ("vertices", np.float32),
+                       ("sizes", np.float32),
+                       ("offsets", np.int32),
+                       ("parents", np.int32),
+                       ("names", np.int32),
+                       ("orientations", np.int32),
+                       ("images", np.int32),
+                       ("leaves", np.int32),
+                       ("bubble_panels", np.int32),
+                       ("bubble_boxes", np.int32),
+                       ("bubble_strings", np.int32),
+                       ("transform_offsets", np.int32),
+                       ("transforms", np.int32),
+                       ("text_offsets", np.int32),
+                       ("text_indices", np.int32),
+                       ("texts", np.int32),
+                       ("area_offsets", np.int32),
+                       ("area_paths", np.int32),
+                       ("writing_areas", np.int32),
+                       ("bubble_font_sizes", np.int16),
+                       ("flags", np.uint8))
+
+
+def get_panels_preorder(page):
+    """
+    Get a page's panels parents first with their parent's
+    position, the page is the first panel
+
+    :param page: The page
+
+    :type page: Page
+
+    :return: The panels and the position of their parents,
+    -1 for the page
+
+    :rtype: tuple
+    """
+    panels, parents = [], []
+    stack = [(page, -1)]
+    while stack:
+        panel, parent = stack.pop()
+        parents.append(parent)
+        panels.append(panel)
+        index = len(panels) - 1
+        for child in reversed(panel.children):
+            stack.append((child, index))
+    return panels, parents
+
+
+class CompactPage(object):
+    """
+    A finished page layout held in a few arrays instead of a tree
+    of Panel and SpeechBubble objects so it's cheap to keep and to
+    send between workers. Panels are in preorder with their vertices
+    in one float32 array split by offsets and a parent index array.
+    Speech bubbles are a struct of arrays and every string is an
+    index in the page's string table. Workers can save, render and
+    segment it directly, to_page rebuilds the Page
+
+    :param page: The page to compact
+
+    :type page: Page
+    """
+
+    def __init__(self, page):
+        """
+        Constructor method
+        """
+        self.name = page.name
+        self.num_panels = int(page.num_panels)
+        self.page_type = page.page_type
+        self.page_size = page.page_size
+        self.background = page.background
+
+        self.strings = []
+        string_indices = {}
+
+        def intern(string):
+            if string is None:
+                return -1
+            string = str(string)
+            if string not in string_indices:
+                string_indices[string] = len(self.strings)
+                self.strings.append(string)
+            return string_indices[string]
+
+        panels, parents = get_panels_preorder(page)
+        positions = {id(panel): i for i, panel in enumerate(panels)}
+
+        # Panels
+        coords = [panel.coords for panel in panels]
+        self.vertices = np.array([point for points in coords
+                                  for point in points], dtype=np.float32)
+        self.offsets = np.zeros(len(panels) + 1, dtype=np.int32)
+        np.cumsum([len(points) for points in coords], out=self.offsets[1:])
+        self.parents = np.array(parents, dtype=np.int32)
+        self.sizes = np.array([(panel.width, panel.height)
+                               for panel in panels], dtype=np.float32)
+        self.flags = np.array([PANEL_NON_RECT*bool(panel.non_rect) |
+                               PANEL_SLICED*bool(panel.sliced) |
+                               PANEL_NO_RENDER*bool(panel.no_render)
+                               for panel in panels], dtype=np.uint8)
+
+        # Children are named after their parents so only the
+        # end of their names is kept
+        names = []
+        for panel, parent in zip(panels, parents):
+            name = panel.name
+            if parent >= 0 and name.startswith(panels[parent].name):
+                name = name[len(panels[parent].name):]
+            names.append(intern(name))
+        self.names = np.array(names, dtype=np.int32)
+        self.orientations = np.array([intern(panel.orientation)
+                                      for panel in panels], dtype=np.int32)
+        self.images = np.array([intern(panel.image) for panel in panels],
+                               dtype=np.int32)
+        self.leaves = np.array([positions[id(panel)]
+                                for panel in page.leaf_children],
+                               dtype=np.int32)
+
+        # Speech bubbles
+        bubbles = [(i, bubble) for i, panel in enumerate(panels)
+                   for bubble in panel.speech_bubbles]
+        texts = [text for _, bubble in bubbles for text in bubble.texts]
+        self.text_languages = list(texts[0].keys()) if texts else []
+        areas = [area for _, bubble in bubbles
+                 for area in bubble.writing_areas]
+        transforms = [transform for _, bubble in bubbles
+                      for transform in bubble.transforms]
+
+        def get_offsets(lengths):
+            offsets = np.zeros(len(bubbles) + 1, dtype=np.int32)
+            np.cumsum(lengths, out=offsets[1:])
+            return offsets
+
+        self.bubble_panels = np.array([i for i, _ in bubbles],
+                                      dtype=np.int32)
+        self.bubble_boxes = np.array(
+            [(bubble.location[0], bubble.location[1],
+              bubble.width, bubble.height) for _, bubble in bubbles],
+            dtype=np.int32).reshape(len(bubbles), 4)
+        self.bubble_font_sizes = np.array([bubble.font_size
+                                           for _, bubble in bubbles],
+                                          dtype=np.int16)
+        self.bubble_strings = np.array(
+            [(intern(bubble.font), intern(bubble.speech_bubble),
+              intern(bubble.language), intern(bubble.text_orientation))
+             for _, bubble in bubbles], dtype=np.int32).reshape(len(bubbles), 4)
+        self.bubble_transform_metadata = np.array(
+            [[bubble.transform_metadata.get(key, np.nan)
+              for key in TRANSFORM_METADATA_KEYS]
+             for _, bubble in bubbles],
+            dtype=np.float64).reshape(len(bubbles),
+                                      len(TRANSFORM_METADATA_KEYS))
+
+        self.transform_offsets = get_offsets([len(bubble.transforms)
+                                              for _, bubble in bubbles])
+        self.transforms = np.array([intern(transform)
+                                    for transform in transforms],
+                                   dtype=np.int32)
+
+        self.text_offsets = get_offsets([len(bubble.texts)
+                                         for _, bubble in bubbles])
+        self.text_indices = np.array([index for _, bubble in bubbles
+                                      for index in bubble.text_indices],
+                                     dtype=np.int32)
+        self.texts = np.array([[intern(text.get(language))
+                                for language in self.text_languages]
+                               for text in texts], dtype=np.int32).reshape(
+                                   len(texts), len(self.text_languages))
+
+        self.area_offsets = get_offsets([len(bubble.writing_areas)
+                                         for _, bubble in bubbles])
+        self.area_paths = np.array([intern(area["path"]) for area in areas],
+                                   dtype=np.int32)
+        self.writing_areas = np.array([[area[key] for key in WRITING_AREA_KEYS]
+                                       for area in areas],
+                                      dtype=np.int32).reshape(
+                                          len(areas), len(WRITING_AREA_KEYS))
+
+    def __getstate__(self):
+        """
+        Pickle the arrays as a single buffer since every
+        array pickled on its own costs more than its data
+        """
+        state = {name: value for name, value in vars(self).items()
+                 if not isinstance(value, np.ndarray)}
+        arrays = [getattr(self, name) for name, _ in COMPACT_PAGE_ARRAYS]
+        state["shapes"] = [array.shape for array in arrays]
+        state["buffer"] = b"".join(array.tobytes() for array in arrays)
+        return state
+
+    def __setstate__(self, state):
+        shapes = state.pop("shapes")
+        buffer = state.pop("buffer")
+        vars(self).update(state)
+
+        offset = 0
+        for (name, dtype), shape in zip(COMPACT_PAGE_ARRAYS, shapes):
+            count = math.prod(shape)
+            array = np.frombuffer(buffer, dtype, count, offset)
+            setattr(self, name, array.reshape(shape))
+            offset += array.nbytes
+
+    def get_string(self, index):
+        return None if index < 0 else self.strings[index]
+
+    def get_coords(self, i):
+        """
+        Get the coordinates of a panel
+
+        :param i: Position of the panel
+
+        :type i: int
+
+        :return: The panel's coordinates
+
+        :rtype: list
+        """
+        points = self.vertices[self.offsets[i]:self.offsets[i + 1]].tolist()
+        return [tuple(point) for point in points]
+
+    def get_polygon(self, i):
+        """
+        Get a panel's polygon the way Panel.get_polygon does
+
+        :param i: Position of the panel
+
+        :type i: int
+
+        :return: The polygon's vertices
+
+        :rtype: tuple
+        """
+        coords = self.get_coords(i)
+        if self.flags[i] & PANEL_NON_RECT:
+            return tuple(coords)
+        return tuple(coords[:4]) + (coords[0],)
+
+    def get_children(self):
+        """
+        Get the children of every panel
+
+        :return: Positions of the children of every panel
+
+        :rtype: list
+        """
+        children = [[] for _ in range(len(self.parents))]
+        for i, parent in enumerate(self.parents.tolist()):
+            if parent >= 0:
+                children[parent].append(i)
+        return children
+
+    def get_panel_names(self):
+        names = []
+        for name, parent in zip(self.names.tolist(), self.parents.tolist()):
+            prefix = names[parent] if parent >= 0 else ""
+            names.append(prefix + self.strings[name])
+        return names
+
+    def get_speech_bubble(self, b):
+        """
+        Create the SpeechBubble object of a bubble
+
+        :param b: Position of the bubble
+
+        :type b: int
+
+        :return: The speech bubble
+
+        :rtype: SpeechBubble
+        """
+        x, y, width, height = self.bubble_boxes[b].tolist()
+        font, template, language, text_orientation = [
+            self.get_string(i) for i in self.bubble_strings[b].tolist()]
+
+        text_start, text_end = self.text_offsets[b:b + 2]
+        texts = [{language: self.get_string(i)
+                  for language, i in zip(self.text_languages, text)}
+                 for text in self.texts[text_start:text_end].tolist()]
+
+        area_start, area_end = self.area_offsets[b:b + 2]
+        writing_areas = []
+        for path, area in zip(self.area_paths[area_start:area_end].tolist(),
+                              self.writing_areas[area_start:area_end].tolist()):
+            writing_area = dict(path=self.strings[path])
+            writing_area.update(zip(WRITING_AREA_KEYS, area))
+            writing_areas.append(writing_area)
+
+        transform_start, transform_end = self.transform_offsets[b:b + 2]
+        transforms = [self.strings[i] for i in
+                      self.transforms[transform_start:transform_end].tolist()]
+        transform_metadata = {}
+        for key, value in zip(TRANSFORM_METADATA_KEYS,
+                              self.bubble_transform_metadata[b].tolist()):
+            if not np.isnan(value):
+                transform_metadata[key] = (int(value)
+                                           if key == "rotation_amount"
+                                           else value)
+
+        return SpeechBubble(
+            texts=texts,
+            text_indices=self.text_indices[text_start:text_end].tolist(),
+            font=font,
+            speech_bubble=template,
+            writing_areas=writing_areas,
+            location=(x, y),
+            width=width,
+            height=height,
+            language=language,
+            transforms=transforms,
+            transform_metadata=transform_metadata,
+            text_orientation=text_orientation,
+            font_size=int(self.bubble_font_sizes[b])
+        )
+
+    def get_render_data(self):
+        """
+        Get the panels and speech bubbles which are to actually
+        be rendered the way Page.get_render_data does
+
+        :return: A tuple of a list of (polygon, image)
+        tuples of the panels and a list of speech bubbles
+
+        :rtype: tuple
+        """
+        leaves = self.leaves.tolist()
+        if self.num_panels > 1 and not leaves:
+            children = self.get_children()
+            leaves = [i for i in range(1, len(children)) if not children[i]]
+
+        panels = []
+        if self.num_panels > 1:
+            panels = [(self.get_polygon(i), self.get_string(self.images[i]))
+                      for i in leaves]
+        else:
+            leaves = [0]
+
+        # Bubbles are rendered in the order of their panels
+        bubble_panels = self.bubble_panels
+        speech_bubbles = [self.get_speech_bubble(b) for i in leaves
+                          for b in np.flatnonzero(bubble_panels == i).tolist()]
+        return panels, speech_bubbles
+
+    def render_outputs(self, outputs=[RENDER_BW]):
+        """
+        Render this page to several images in a single pass
+
+        :param outputs: Which of the render engine's outputs
+        to create, defaults to [RENDER_BW]
+
+        :type outputs: list, optional
+
+        :return: Rendered images by output
+        :rtype: dict
+        """
+        panels, speech_bubbles = self.get_render_data()
+        return render_page(panels, speech_bubbles, self.background, outputs)
+
+    def get_metadata(self):
+        """
+        Get the page's data the way Page.get_metadata does
+        without building its panels
+
+        :return: A dictionary of the Page's data
+        :rtype: dict
+        """
+        children = self.get_children()
+        names = self.get_panel_names()
+        bubbles = [[] for _ in range(len(children))]
+        for b, i in enumerate(self.bubble_panels.tolist()):
+            bubbles[i].append(self.get_speech_bubble(b).dump_data())
+
+        def dump_panel(i):
+            flags = int(self.flags[i])
+            return dict(
+                name=names[i],
+                coordinates=self.get_coords(i),
+                orientation=self.get_string(self.orientations[i]),
+                children=[dump_panel(child) for child in children[i]],
+                non_rect=bool(flags & PANEL_NON_RECT),
+                sliced=bool(flags & PANEL_SLICED),
+                no_render=bool(flags & PANEL_NO_RENDER),
+                image=self.get_string(self.images[i]),
+                speech_bubbles=bubbles[i]
+            )
+
+        return dict(
+            name=self.name,
+            num_panels=self.num_panels,
+            page_type=self.page_type,
+            page_size=self.page_size,
+            background=self.background,
+            children=[dump_panel(child) for child in children[0]],
+            speech_bubbles=bubbles[0]
+        )
+
+    def dump_data(self, dataset_path, dry=True):
+        """
+        Export the page's data to JSON like Page.dump_data
+
+        :param dataset_path: Where to dump the JSON file
+
+        :type dataset_path: str
+
+        :param dry: Whether to just return or write the JSON file
+
+        :type dry: bool, optional
+
+        :return: Optional return when running dry of a json data dump
+        :rtype: str
+        """
+        data = self.get_metadata()
+
+        if not dry:
+            with open(dataset_path + self.name + cfg.metadata_format, "w+") as json_file:
+                json.dump(data, json_file, indent=2)
+        else:
+            return json.dumps(data, indent=2)
+
+    def to_page(self):
+        """
+        Rebuild the Page with its tree of panels and speech bubbles
+
+        :return: The page
+
+        :rtype: Page
+        """
+        page = Page(self.get_coords(0), self.page_type, self.num_panels,
+                    name=self.name)
+        page.background = self.background
+        page.page_size = self.page_size
+
+        names = self.get_panel_names()
+        panels = [page]
+        for i, parent in enumerate(self.parents.tolist()[1:], 1):
+            parent = panels[parent]
+            panel = Panel(self.get_coords(i), names[i], parent,
+                          self.get_string(self.orientations[i]),
+                          non_rect=bool(self.flags[i] & PANEL_NON_RECT))
+            parent.add_child(panel)
+            panels.append(panel)
+
+        for panel, (width, height), flags, image in zip(
+                panels, self.sizes.tolist(), self.flags.tolist(),
+                self.images.tolist()):
+            # Sizes are kept since transforms don't update them
+            panel.width = width
+            panel.height = height
+            panel.area = width*height
+            panel.area_proportion = round(
+                panel.area/(cfg.page_height*cfg.page_width), 2)
+            panel.sliced = bool(flags & PANEL_SLICED)
+            panel.no_render = bool(flags & PANEL_NO_RENDER)
+            panel.image = self.get_string(image)
+
+        for b, i in enumerate(self.bubble_panels.tolist()):
+            panels[i].speech_bubbles.append(self.get_speech_bubble(b))
+
+        page.leaf_children = [panels[i] for i in self.leaves.tolist()]
+        return page
@@ -1,8 +1,7 @@
-import numpy as np
-from PIL import Image, ImageDraw
 import json
 import uuid
-from ..helpers import crop_image_only_outside_rows_columns, crop_image_only_outside, get_leaf_panels
+from ..helpers import get_leaf_panels
+from ..render_engine import render_page, RENDER_BW, RENDER_COLORED
 from ... import config_file as cfg
 from .panel import Panel
 from .speech_bubble import SpeechBubble
@@ -30,6 +29,9 @@ class Page(Panel):
     :type children: list, optional:
     """
 
+    __slots__ = ("num_panels", "page_type", "background",
+                 "leaf_children", "page_size")
+
     def __init__(self,
                  coords=[],
                  page_type="",
@@ -98,6 +100,24 @@ class Page(Panel):
         :rtype: str
         """
 
+        data = self.get_metadata()
+
+        if not dry:
+            with open(dataset_path + self.name + cfg.metadata_format, "w+") as json_file:
+                json.dump(data, json_file, indent=2)
+        else:
+            return json.dumps(data, indent=2)
+
+    def get_metadata(self):
+        """
+        A method to take all the Page's relevant data
+        and create a dictionary out of it which dump_data
+        exports to JSON
+
+        :return: A dictionary of the Page's data
+        :rtype: dict
+        """
+
         # Recursively dump children
         if len(self.children) > 0:
             children_rec = [child.dump_data() for child in self.children]
@@ -115,11 +135,7 @@ class Page(Panel):
             speech_bubbles=speech_bubbles
         )
 
-        if not dry:
-            with open(dataset_path + self.name + cfg.metadata_format, "w+") as json_file:
-                json.dump(data, json_file, indent=2)
-        else:
-            return json.dumps(data, indent=2)
+        return data
 
     def load_data(self, filename):
         """
@@ -132,56 +148,66 @@ class Page(Panel):
         :type filename: str
         """
         with open(filename, "rb") as json_file:
+            self.load_metadata(json.load(json_file))
 
-            data = json.load(json_file)
-
-            self.name = data['name']
-            self.num_panels = int(data['num_panels'])
-            self.page_type = data['page_type']
-            self.background = data['background']
-
-            if len(data['speech_bubbles']) > 0:
-                for speech_bubble in data['speech_bubbles']:
-                    # Line constraints
-                    text_orientation = speech_bubble['text_orientation']
-                    transform_metadata = speech_bubble['transform_metadata']
-                    bubble = SpeechBubble(
-                        texts=speech_bubble['texts'],
-                        text_indices=speech_bubble['text_indices'],
-                        font=speech_bubble['font'],
-                        speech_bubble=speech_bubble['speech_bubble'],
-                        writing_areas=speech_bubble['writing_areas'],
-                        resize_to=speech_bubble['resize_to'],
-                        location=speech_bubble['location'],
-                        width=speech_bubble['width'],
-                        height=speech_bubble['height'],
-                        transforms=speech_bubble['transforms'],
-                        transform_metadata=transform_metadata,
-                        text_orientation=text_orientation
-                    )
-
-                    self.speech_bubbles.append(bubble)
-
-            # Recursively load children
-            if len(data['children']) > 0:
-                for child in data['children']:
-                    panel = Panel(
-                        coords=child['coordinates'],
-                        name=child['name'],
-                        parent=self,
-                        orientation=child['orientation'],
-                        non_rect=child['non_rect']
-                    )
-                    panel.load_data(child)
-                    self.children.append(panel)
+    def load_metadata(self, data):
+        """
+        Load the page from its metadata as dump_data writes
+        it or the metadata store reads it
 
-    def render(self, show=False):
+        :param data: The page's metadata
+
+        :type data: dict
         """
-        A function to render this page to an image
+        self.name = data['name']
+        self.num_panels = int(data['num_panels'])
+        self.page_type = data['page_type']
+        self.background = data['background']
+
+        if len(data['speech_bubbles']) > 0:
+            for speech_bubble in data['speech_bubbles']:
+                # Line constraints
+                text_orientation = speech_bubble['text_orientation']
+                transform_metadata = speech_bubble['transform_metadata']
+                bubble = SpeechBubble(
+                    texts=speech_bubble['texts'],
+                    text_indices=speech_bubble['text_indices'],
+                    font=speech_bubble['font'],
+                    speech_bubble=speech_bubble['speech_bubble'],
+                    writing_areas=speech_bubble['writing_areas'],
+                    font_size=speech_bubble.get('font_size'),
+                    location=speech_bubble['location'],
+                    width=speech_bubble['width'],
+                    height=speech_bubble['height'],
+                    transforms=speech_bubble['transforms'],
+                    transform_metadata=transform_metadata,
+                    text_orientation=text_orientation
+                )
 
-        :param show: Whether to return this image or to show it
+                self.speech_bubbles.append(bubble)
+
+        # Recursively load children
+        if len(data['children']) > 0:
+            for child in data['children']:
+                panel = Panel(
+                    coords=child['coordinates'],
+                    name=child['name'],
+                    parent=self,
+                    orientation=child['orientation'],
+                    non_rect=child['non_rect']
+                )
+                panel.load_data(child)
+                self.children.append(panel)
 
-        :type show: bool, optional
+    def get_render_data(self):
+        """
+        Get the panels and speech bubbles which are
+        to actually be rendered
+
+        :return: A tuple of a list of (polygon, image)
+        tuples of the panels and a list of speech bubbles
+
+        :rtype: tuple
         """
 
         leaf_children = []
@@ -192,79 +218,44 @@ class Page(Panel):
             else:
                 leaf_children = self.leaf_children
 
-        W = cfg.page_width
-        H = cfg.page_height
-
-        # Create a new blank image
-        page_img = Image.new(size=(W, H), mode="RGBA", color="white")
-        draw_rect = ImageDraw.Draw(page_img)
-
-        # Set background if needed
-        if self.background is not None:
-            bg = Image.open(self.background).convert("L")
-            img_array = np.asarray(bg)
-            crop_array = crop_image_only_outside(img_array)
-            bg = Image.fromarray(crop_array)
-            bg = bg.resize((W, H))
-            page_img.paste(bg, (0, 0))
-
-        # Render panels
-        for panel in leaf_children:
+        panels = [(panel.get_polygon(), panel.image)
+                  for panel in leaf_children]
 
-            # Panel coords
-            rect = panel.get_polygon()
-
-            # Open the illustration to put within panel
-            if panel.image is not None:
-                img = Image.open(panel.image)
-
-                # Clean it up by cropping the black areas
-                img_array = np.asarray(img)
-                crop_array = crop_image_only_outside(img_array)
+        # If it's a single panel page
+        if self.num_panels < 2:
+            leaf_children = [self]
 
-                img = Image.fromarray(crop_array)
+        speech_bubbles = [sb for panel in leaf_children
+                          for sb in panel.speech_bubbles]
 
-                # Resize it to the page's size as a simple
-                # way to crop differnt parts of it
+        return panels, speech_bubbles
 
-                # TODO: Figure out how to do different types of
-                # image crops for smaller panels
-                w_rev_ratio = cfg.page_width/img.size[0]
-                h_rev_ratio = cfg.page_height/img.size[1]
+    def render_outputs(self, outputs=[RENDER_BW]):
+        """
+        A function to render this page to several images
+        in a single pass
 
-                img = img.resize(
-                    (round(img.size[0]*w_rev_ratio),
-                     round(img.size[1]*h_rev_ratio))
-                )
+        :param outputs: Which of the render engine's outputs
+        to create, defaults to [RENDER_BW]
 
-                # Create a mask for the panel illustration
-                mask = Image.new("L", cfg.page_size, 0)
-                draw_mask = ImageDraw.Draw(mask)
+        :type outputs: list, optional
 
-                # On the mask draw and therefore cut out the panel's
-                # area so that the illustration can be fit into
-                # the page itself
-                draw_mask.polygon(rect, fill=255)
+        :return: Rendered images by output
+        :rtype: dict
+        """
+        panels, speech_bubbles = self.get_render_data()
+        return render_page(panels, speech_bubbles, self.background, outputs)
 
-            # Draw outline
-            draw_rect.line(rect, fill="black", width=cfg.boundary_width)
+    def render(self, show=False):
+        """
+        A function to render this page to an image
 
-            # Paste illustration onto the page
-            if panel.image is not None:
-                page_img.paste(img, (0, 0), mask)
+        :param show: Whether to return this image or to show it
 
-        # If it's a single panel page
-        if self.num_panels < 2:
-            leaf_children.append(self)
+        :type show: bool, optional
+        """
 
-        # Render bubbles
-        for panel in leaf_children:
-            if len(panel.speech_bubbles) < 1:
-                continue
-            # For each bubble
-            for sb in panel.speech_bubbles:
-                bubble, location = sb.render()
-                page_img.paste(bubble, location, bubble)
+        page_img = self.render_outputs([RENDER_BW])[RENDER_BW]
 
         if show:
             page_img.show()
@@ -280,87 +271,7 @@ class Page(Panel):
         :type show: bool, optional
         """
 
-        leaf_children = []
-        if self.num_panels > 1:
-            # Get all the panels to be rendered
-            if len(self.leaf_children) < 1:
-                get_leaf_panels(self, leaf_children)
-            else:
-                leaf_children = self.leaf_children
-
-        W = cfg.page_width
-        H = cfg.page_height
-
-        # Create a new blank image
-        page_img = Image.new(size=(W, H), mode="RGBA", color="white")
-        draw_rect = ImageDraw.Draw(page_img)
-
-        # Set background if needed
-        if self.background is not None:
-            bg = Image.open(self.background).convert("L")
-            img_array = np.asarray(bg)
-            crop_array = crop_image_only_outside(img_array)
-            bg = Image.fromarray(crop_array)
-            bg = bg.resize((W, H))
-            page_img.paste(bg, (0, 0))
-
-        # Render panels
-        for panel in leaf_children:
-
-            # Panel coords
-            rect = panel.get_polygon()
-
-            # Open the illustration to put within panel
-            if panel.image is not None:
-                imgBW = Image.open(panel.image)
-                imgColored = Image.open(panel.get_colored_image())
-
-                # Clean it up by cropping the black areas
-                img_array = np.asarray(imgBW)
-                col_start, col_end, row_start, row_end = crop_image_only_outside_rows_columns(img_array)
-                img = imgColored.crop((col_start, row_start, col_end, row_end))
-
-                # Resize it to the page's size as a simple
-                # way to crop differnt parts of it
-
-                # TODO: Figure out how to do different types of
-                # image crops for smaller panels
-                w_rev_ratio = cfg.page_width/img.size[0]
-                h_rev_ratio = cfg.page_height/img.size[1]
-
-                img = img.resize(
-                    (round(img.size[0]*w_rev_ratio),
-                     round(img.size[1]*h_rev_ratio))
-                )
-
-                # Create a mask for the panel illustration
-                mask = Image.new("L", cfg.page_size, 0)
-                draw_mask = ImageDraw.Draw(mask)
-
-                # On the mask draw and therefore cut out the panel's
-                # area so that the illustration can be fit into
-                # the page itself
-                draw_mask.polygon(rect, fill=255)
-
-            # Draw outline
-            draw_rect.line(rect, fill="black", width=cfg.boundary_width)
-
-            # Paste illustration onto the page
-            if panel.image is not None:
-                page_img.paste(img, (0, 0), mask)
-
-        # If it's a single panel page
-        if self.num_panels < 2:
-            leaf_children.append(self)
-
-        # Render bubbles
-        for panel in leaf_children:
-            if len(panel.speech_bubbles) < 1:
-                continue
-            # For each bubble
-            for sb in panel.speech_bubbles:
-                bubble, location = sb.render()
-                page_img.paste(bubble, location, bubble)
+        page_img = self.render_outputs([RENDER_COLORED])[RENDER_COLORED]
 
         if show:
             page_img.show()
@@ -37,6 +37,13 @@ class Panel(object):
     :type non_rect: bool, optional
     """
 
+    # Every page keeps many panels so they don't get a __dict__
+    __slots__ = ("x1y1", "x2y2", "x3y3", "x4y4",
+                 "name", "parent", "coords", "non_rect",
+                 "width", "height", "area", "area_proportion",
+                 "children", "orientation", "sliced", "no_render",
+                 "image", "speech_bubbles")
+
     def __init__(self,
                  coords,
                  name,
@@ -55,13 +62,6 @@ class Panel(object):
         self.x3y3 = coords[2]
         self.x4y4 = coords[3]
 
-        self.lines = [
-            (self.x1y1, self.x2y2),
-            (self.x2y2, self.x3y3),
-            (self.x3y3, self.x4y4),
-            (self.x4y4, self.x1y1)
-        ]
-
         self.name = name
         self.parent = parent
 
@@ -96,6 +96,22 @@ class Panel(object):
         # A list of speech bubble objects to render around this panel
         self.speech_bubbles = []
 
+    @property
+    def lines(self):
+        """
+        The lines between the panel's corners, they're derived
+        from the corners so they follow the transforms
+
+        :return: A list of the four lines as pairs of points
+        :rtype: list
+        """
+        return [
+            (self.x1y1, self.x2y2),
+            (self.x2y2, self.x3y3),
+            (self.x3y3, self.x4y4),
+            (self.x4y4, self.x1y1)
+        ]
+
     def get_polygon(self):
         """
         Return the coords in a format that can be used to render a polygon
@@ -239,7 +255,7 @@ class Panel(object):
                     font=speech_bubble['font'],
                     speech_bubble=speech_bubble['speech_bubble'],
                     writing_areas=speech_bubble['writing_areas'],
-                    resize_to=speech_bubble['resize_to'],
+                    font_size=speech_bubble.get('font_size'),
                     location=speech_bubble['location'],
                     width=speech_bubble['width'],
                     height=speech_bubble['height'],
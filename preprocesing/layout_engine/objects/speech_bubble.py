@@ -1,9 +1,138 @@
 import numpy as np
 from PIL import Image, ImageDraw, ImageFont, ImageOps
+from functools import lru_cache
 import textwrap
 import paths
+from ..illustration_cache import IllustrationCache, get_image_nbytes
+from ..shared_assets import get_shared_assets
 from ... import config_file as cfg
 
+# Decoded speech bubble templates are kept per
+# process since few templates are used by many bubbles
+speech_bubble_templates = IllustrationCache(
+    cfg.speech_bubble_template_cache_max_bytes)
+
+# Text is measured on a single draw context per process
+# since measuring doesn't depend on the image drawn on
+_measure_draw = ImageDraw.Draw(Image.new("L", (1, 1)))
+
+
+@lru_cache(maxsize=cfg.font_cache_size)
+def get_font(font, size):
+    """
+    Load a font at a size. The most recently used fonts are
+    kept per process since the same fonts are used by many bubbles
+
+    :param font: Path of the font file
+
+    :type font: str
+
+    :param size: Font size
+
+    :type size: int
+
+    :return: The font
+
+    :rtype: PIL.ImageFont.FreeTypeFont
+    """
+    return ImageFont.truetype(font, size)
+
+
+def invert_speech_bubble(bubble):
+    """
+    Invert the colors of a speech bubble but not its alpha
+
+    :param bubble: The speech bubble
+
+    :type bubble: PIL.Image
+
+    :return: The inverted speech bubble
+
+    :rtype: PIL.Image
+    """
+    if bubble.mode in ('RGBA', 'LA'):
+        *bands, a = bubble.split()
+        color_image = Image.merge(bubble.mode[:-1], bands)
+        inverted_image = ImageOps.invert(color_image)
+        return Image.merge(bubble.mode, (*inverted_image.split(), a))
+    return ImageOps.invert(bubble)
+
+
+def get_speech_bubble_template(speech_bubble, mode, inverted=False):
+    """
+    Get a decoded speech bubble template from the run's shared
+    assets, the process' template store or load it. Inverted
+    templates are made from the stored template once. Templates
+    are shared so they must be copied before they're changed
+
+    :param speech_bubble: Path of the template
+
+    :type speech_bubble: str
+
+    :param mode: Mode to decode the template in
+
+    :type mode: str
+
+    :param inverted: Whether to get the inverted template
+
+    :type inverted: bool, optional
+
+    :return: The template
+
+    :rtype: PIL.Image
+    """
+    shared_assets = get_shared_assets()
+    if shared_assets is not None and not inverted:
+        bubble = shared_assets.get_template(speech_bubble, mode)
+        if bubble is not None:
+            return bubble
+
+    def load():
+        if inverted:
+            bubble = get_speech_bubble_template(speech_bubble, mode)
+            bubble = invert_speech_bubble(bubble)
+        else:
+            bubble = Image.open(speech_bubble).convert(mode)
+        return bubble, get_image_nbytes(bubble)
+
+    return speech_bubble_templates.get((speech_bubble, mode, inverted), load)
+
+
+def fit_text(font, text, width):
+    """
+    Find the font size at which text spans a width by scaling its
+    width at the minimum font size, clamped to the allowed sizes
+
+    :param font: Path of the font file
+
+    :type font: str
+
+    :param text: Text to fit
+
+    :type text: str
+
+    :param width: Width the text should span
+
+    :type width: int
+
+    :return: The font at the found size and the text's
+    width and height with it
+
+    :rtype: tuple
+    """
+    reference_font = get_font(font, cfg.min_font_size)
+    reference_size = _measure_draw.textsize(text, font=reference_font)
+    if reference_size[0] == 0:
+        return reference_font, reference_size
+
+    font_size = round((width / reference_size[0]) * cfg.min_font_size)
+    font_size = max(min(font_size, cfg.max_font_size), cfg.min_font_size)
+    if font_size == cfg.min_font_size:
+        return reference_font, reference_size
+
+    sized_font = get_font(font, font_size)
+    return sized_font, _measure_draw.textsize(text, font=sized_font)
+
 
 class SpeechBubble(object):
     """
@@ -65,8 +194,18 @@ class SpeechBubble(object):
     is written left to right ot top to bottom
 
     :type text_orientation: str, optional
+
+    :param font_size: Size of the text, a random one between
+    cfg.min_font_size and cfg.max_font_size if None
+
+    :type font_size: int, optional
     """
 
+    __slots__ = ("texts", "language", "text_indices", "font",
+                 "speech_bubble", "writing_areas", "location",
+                 "width", "height", "transform_metadata", "transforms",
+                 "text_orientation", "font_size")
+
     def __init__(self,
                  texts,
                  text_indices,
@@ -79,7 +218,8 @@ class SpeechBubble(object):
                  language=paths.ENGLISH_LANGUAGE,
                  transforms=None,
                  transform_metadata=None,
-                 text_orientation="ltr"):
+                 text_orientation="ltr",
+                 font_size=None):
         """
         Constructor method
         """
@@ -147,11 +287,14 @@ class SpeechBubble(object):
         else:
             self.text_orientation = text_orientation
 
-        min_font_size = cfg.min_font_size
-        max_font_size = cfg.max_font_size
-        self.font_size = np.random.randint(min_font_size,
-                                           max_font_size
-                                           )
+        if font_size is None:
+            min_font_size = cfg.min_font_size
+            max_font_size = cfg.max_font_size
+            self.font_size = np.random.randint(min_font_size,
+                                               max_font_size
+                                               )
+        else:
+            self.font_size = font_size
 
     def dump_data(self):
         """
@@ -181,19 +324,20 @@ class SpeechBubble(object):
 
         return data
 
-    def render(self):
+    def render(self, mode="RGBA"):
         """
         A function to render this speech bubble
 
-        :return: A list of states of the speech bubble,
-        the speech bubble itself, it's mask and it's location
+        :param mode: Mode to render in, "RGBA" or "LA" for
+        black and white pages, defaults to "RGBA"
+
+        :type mode: str, optional
+
+        :return: The rendered speech bubble and it's location
         on the page
         :rtype: tuple
         """
 
-        bubble = Image.open(self.speech_bubble).convert("RGBA")
-        mask = bubble.copy()
-
         # Set variable font size
         # current_font_size = self.font_size
         # font = ImageFont.truetype(self.font, current_font_size)
@@ -203,16 +347,10 @@ class SpeechBubble(object):
         transforms_applied = []
 
         # Pre-rendering transforms
+        inverted = False
         for transform in self.transforms:
             if transform == "invert":
-                if bubble.mode == 'RGBA':
-                    r, g, b, a = bubble.split()
-                    rgb_image = Image.merge('RGB', (r, g, b))
-                    inverted_image = ImageOps.invert(rgb_image)
-                    r2, g2, b2 = inverted_image.split()
-                    bubble = Image.merge('RGBA', (r2, g2, b2, a))
-                else:
-                    bubble = ImageOps.invert(bubble)
+                inverted = not inverted
                 transforms_applied.append("inverted")
 
             # elif transform == "flip vertical":
@@ -303,6 +441,11 @@ class SpeechBubble(object):
             #     self.writing_areas = new_writing_areas
             #     transforms_applied.append("ystretch")
 
+        # The template is shared with other bubbles so
+        # it's only copied once text is written into it
+        bubble = get_speech_bubble_template(self.speech_bubble, mode, inverted)
+        template = bubble
+
         if "inverted" in transforms_applied:
             fill_type = "white"
         else:
@@ -316,7 +459,7 @@ class SpeechBubble(object):
             x1, y1 = area["x"] + padding, area["y"] + padding
 
             if width > 0 and height > 0:
-                empty_image = Image.new(mode="RGBA", size=(width, height))
+                empty_image = Image.new(mode=bubble.mode, size=(width, height))
                 draw = ImageDraw.Draw(empty_image)
 
                 # Get text lines (It splits text into lines)
@@ -329,17 +472,9 @@ class SpeechBubble(object):
                 text = "\n".join(text_segmented)
 
                 # Scale font size horizontally
-                current_font_size = cfg.min_font_size
-                font = ImageFont.truetype(self.font, current_font_size)
-                current_font_size = (
-                    width / draw.textsize(text, font=font)[0]) * current_font_size
-                current_font_size = round(current_font_size)
-                current_font_size = max(
-                    min(current_font_size, cfg.max_font_size), cfg.min_font_size)
-                font = ImageFont.truetype(self.font, current_font_size)
+                font, (w, h) = fit_text(self.font, text, width)
 
                 # Center text
-                w, h = draw.textsize(text, font=font)
                 x = max(round((width - w) / 2), 0)
                 y = max(round((height - h) / 2), 0)
 
@@ -350,11 +485,12 @@ class SpeechBubble(object):
                           font=font,
                           fill=fill_type)
 
+                if bubble is template:
+                    bubble = bubble.copy()
                 bubble.paste(empty_image, (x1, y1), empty_image)
 
         # Resize bubble
         bubble = bubble.resize((self.width, self.height))
-        mask = mask.resize((self.width, self.height))
 
         # Perform rotation if it was in transforms
         if "rotate" in self.transforms:
@@ -362,7 +498,5 @@ class SpeechBubble(object):
             rotation = self.transform_metadata['rotation_amount']
             bubble = bubble.rotate(rotation, Image.NEAREST,
                                    expand=1, center=center)
-            mask = mask.rotate(rotation, Image.NEAREST,
-                               expand=1, center=center)
 
         return bubble, self.location
@@ -0,0 +1,265 @@
+import os
+import threading
+import numpy as np
+from ... import config_file as cfg
+
+
+class OccupancyGrid(object):
+    """
+    Cells of a page covered by its speech bubbles. A bubble
+    marks every cell it touches so bubbles placed on free cells
+    never overlap, not even on their edges
+
+    :param width: Width of the page
+
+    :type width: int
+
+    :param height: Height of the page
+
+    :type height: int
+
+    :param cell_size: Side of a cell in pixels, defaults to
+    cfg.bubble_placement_cell_size
+
+    :type cell_size: int, optional
+    """
+
+    def __init__(self, width, height, cell_size=None):
+        """
+        Constructor method
+        """
+        if cell_size is None:
+            cell_size = cfg.bubble_placement_cell_size
+        self.width = width
+        self.height = height
+        self.cell_size = cell_size
+        # A bubble may reach the page's last pixel and a
+        # position's cell one more cell
+        self.occupied = np.zeros((height//cell_size + 2,
+                                  width//cell_size + 2), dtype=bool)
+
+    def add(self, x, y, w, h):
+        """
+        Mark the cells a rectangle touches as occupied
+
+        :param x: Left of the rectangle
+
+        :type x: int
+
+        :param y: Top of the rectangle
+
+        :type y: int
+
+        :param w: Width of the rectangle
+
+        :type w: int
+
+        :param h: Height of the rectangle
+
+        :type h: int
+        """
+        c = self.cell_size
+        self.occupied[y//c:(y + h)//c + 1, x//c:(x + w)//c + 1] = True
+
+    def get_free_cells(self, x_range, y_range, w, h):
+        """
+        Find the cells a w x h rectangle can start in without
+        touching an occupied cell wherever it starts in the cell
+
+        :param x_range: Lowest and highest left of the rectangle
+
+        :type x_range: tuple
+
+        :param y_range: Lowest and highest top of the rectangle
+
+        :type y_range: tuple
+
+        :return: Mask of the free cells from the ranges' first cells
+
+        :rtype: numpy.ndarray
+        """
+        c = self.cell_size
+        cx0, cx1 = x_range[0]//c, x_range[1]//c
+        cy0, cy1 = y_range[0]//c, y_range[1]//c
+        # Cells covered by a rectangle starting anywhere in a cell
+        kw = (c - 1 + w)//c + 1
+        kh = (c - 1 + h)//c + 1
+
+        window = self.occupied[cy0:cy1 + kh, cx0:cx1 + kw]
+        if not window.any():
+            return np.ones((cy1 - cy0 + 1, cx1 - cx0 + 1), dtype=bool)
+
+        # Sum the occupied cells of every footprint at once
+        sums = np.zeros((window.shape[0] + 1, window.shape[1] + 1),
+                        dtype=np.int32)
+        np.cumsum(window, axis=0, dtype=np.int32, out=sums[1:, 1:])
+        np.cumsum(sums[1:, 1:], axis=1, out=sums[1:, 1:])
+        covered = (sums[kh:, kw:] - sums[:-kh, kw:] -
+                   sums[kh:, :-kw] + sums[:-kh, :-kw])
+        return covered == 0
+
+    def sample(self, x_range, y_range, w, h, random=np.random):
+        """
+        Pick a free position for a w x h rectangle: a free
+        cell uniformly and a position within that cell
+
+        :param x_range: Lowest and highest left of the rectangle
+
+        :type x_range: tuple
+
+        :param y_range: Lowest and highest top of the rectangle
+
+        :type y_range: tuple
+
+        :param random: Random state to sample with,
+        defaults to NumPy's global one
+
+        :return: Left and top of the rectangle or None
+        when no position is free
+
+        :rtype: tuple
+        """
+        x_min, x_max = max(x_range[0], 0), min(x_range[1], self.width - w)
+        y_min, y_max = max(y_range[0], 0), min(y_range[1], self.height - h)
+        if x_min > x_max or y_min > y_max:
+            return None
+
+        free = np.flatnonzero(self.get_free_cells((x_min, x_max),
+                                                  (y_min, y_max), w, h))
+        if not len(free):
+            return None
+
+        c = self.cell_size
+        columns = x_max//c - x_min//c + 1
+        cy, cx = divmod(int(free[random.randint(0, len(free))]), columns)
+        cx += x_min//c
+        cy += y_min//c
+        x = random.randint(max(x_min, cx*c), min(x_max, cx*c + c - 1) + 1)
+        y = random.randint(max(y_min, cy*c), min(y_max, cy*c + c - 1) + 1)
+        return int(x), int(y)
+
+
+def place_speech_bubble(panel, w, h, occupancy):
+    """
+    Scale a speech bubble template to its panel and place it
+    on a free position of the panel's upper left quarter with
+    the whole bubble inside the panel and the page
+
+    :param panel: Panel to place the bubble in
+
+    :type panel: Panel
+
+    :param w: Width of the template
+
+    :type w: int
+
+    :param h: Height of the template
+
+    :type h: int
+
+    :param occupancy: Cells of the page the placed bubbles cover,
+    the bubble's cells are marked once it's placed
+
+    :type occupancy: OccupancyGrid
+
+    :return: Left, top, width and height of the bubble
+    or None when there's no room for it
+
+    :rtype: tuple
+    """
+    # Scale bubble to < 48% of panel area and within the panel's box
+    xy = np.array(panel.coords)
+    x0, y0 = np.min(xy, 0)
+    x1, y1 = np.max(xy, 0)
+    scale = min(np.sqrt(panel.area * cfg.bubble_to_panel_area_max_ratio / (w * h)),
+                (x1 - x0) / w, (y1 - y0) / h)
+    w = int(w * scale)
+    h = int(h * scale)
+    if w <= 0 or h <= 0:
+        return None
+
+    x0, y0 = int(np.ceil(x0)), int(np.ceil(y0))
+    x_range = (x0, min(x0 + int(panel.width) // 2 - 15, int(x1) - w))
+    y_range = (y0, min(y0 + int(panel.height) // 2 - 15, int(y1) - h))
+    location = occupancy.sample(x_range, y_range, w, h)
+    if location is None:
+        return None
+
+    occupancy.add(*location, w, h)
+    return location + (w, h)
+
+
+class PlacementStats(object):
+    """
+    Counters of the speech bubbles a process placed and
+    failed to place, shared by its threads
+    """
+
+    def __init__(self):
+        """
+        Constructor method
+        """
+        self.lock = threading.Lock()
+        self.clear()
+
+    def add(self, placed, seconds):
+        """
+        Count a placement
+
+        :param placed: Whether the bubble was placed
+
+        :type placed: bool
+
+        :param seconds: Time spent placing it
+
+        :type seconds: float
+        """
+        with self.lock:
+            if placed:
+                self.placed += 1
+            else:
+                self.failed += 1
+            self.seconds += seconds
+
+    def clear(self):
+        """
+        Reset the counters
+        """
+        with self.lock:
+            self.placed = 0
+            self.failed = 0
+            self.seconds = 0.0
+
+    def get_stats(self):
+        """
+        Get the counters of this process
+
+        :return: Counters tagged with the process id
+        so they can be merged across workers
+
+        :rtype: dict
+        """
+        return dict(pid=os.getpid(),
+                    bubbles_placed=self.placed,
+                    bubbles_failed=self.failed,
+                    placement_seconds=self.seconds)
+
+
+placement_stats = PlacementStats()
+
+
+def print_placement_stats(stats):
+    """
+    Print how many speech bubbles were placed and how
+    long it took, summed over the workers
+
+    :param stats: Summed counters of the workers
+
+    :type stats: dict
+    """
+    bubbles = stats.get("bubbles_placed", 0) + stats.get("bubbles_failed", 0)
+    if bubbles > 0:
+        print("Speech bubbles: %d placed, %d failed (%.1f%% placed), %.1f us per bubble" % (
+            stats["bubbles_placed"], stats["bubbles_failed"],
+            100*stats["bubbles_placed"]/bubbles,
+            1e6*stats["placement_seconds"]/bubbles))
@@ -1,11 +1,27 @@
 import numpy as np
-import paths
 from .create_speech_bubbles_metadata import create_speech_bubble_metadata
-from .create_page_panels_base import create_page_panels_base
-from .page_panels_transformers import add_transforms
-from .page_panels_shifters import shrink_panels
+from .bubble_placement import (
+    OccupancyGrid,
+    placement_stats,
+    print_placement_stats
+)
+from ..objects.compact_page import CompactPage
+from ..metadata_store import dump_page_metadata, open_metadata_sink
+from .layout_bank import create_page_layout, get_layout_bank
+from .page_plans import plan_pages, get_page_plan
+from .page_seeds import (
+    seed_page_stage,
+    check_seeded_backend,
+    get_run_seed,
+    get_page_name,
+    STAGE_LAYOUT,
+    STAGE_TEXTS,
+    STAGE_SPEECH_BUBBLES
+)
 from ... import config_file as cfg
-from ...multiprocessing import open_pool
+from ...speech_bubble_writing_area import get_speech_bubble_templates
+from ...text_store import as_text_store
+from ...multiprocessing import open_pool, sum_worker_stats
 
 
 def create_single_page_metadata(data):
@@ -48,78 +64,194 @@ def create_single_page_metadata(data):
 
     :type language: str
 
-    :return: Created Page with all the bells and whistles
+    :param remove_number: Number of panels to remove, 0 keeps them
 
-    :rtype: Page
+    :type remove_number: int
+
+    :param page_seed: The run's seed and the page's index
+
+    :type page_seed: tuple
+
+    :return: Created page with all the bells and whistles and
+    its metadata's record if the parent's sink writes it
+
+    :rtype: tuple
     """
 
-    page, panels, background, language = data
-    speech_bubbles_generated = []
+    (compact_page, panels, background, remove_number, language,
+     texts, page_seed) = data
+    seed_page_stage(page_seed, STAGE_SPEECH_BUBBLES)
+    page = compact_page.to_page()
+    occupancy = OccupancyGrid(cfg.page_width, cfg.page_height)
+
+    # The page carries text indices only, its texts are
+    # looked up at once from the text store
+    page_texts = iter(texts.get_texts([index for _, _, bubbles in panels
+                                       for bubble in bubbles
+                                       for index in bubble[2]]))
 
     for panel in panels:
-        child, image, speech_bubbles = panel
+        leaf_index, image, speech_bubbles = panel
+        child = page if leaf_index is None else page.leaf_children[leaf_index]
         child.image = image
-        for speech_bubble in speech_bubbles:
+        for bubble_image, font, text_indices, writing_areas, template in speech_bubbles:
+            bubble_texts = [next(page_texts) for _ in text_indices]
             create_speech_bubble_metadata(child,
-                                          speech_bubble,
-                                          speech_bubbles_generated,
+                                          (bubble_image, font, bubble_texts,
+                                           text_indices, writing_areas,
+                                           template),
+                                          occupancy,
                                           language)
 
     # Remove random panels
-    if np.random.random() < cfg.panel_removal_chance and page.num_panels > cfg.panel_removal_max + 1:
-        remove_number = np.random.choice([1, cfg.panel_removal_max])
+    if remove_number and page.num_panels > cfg.panel_removal_max + 1:
         for _ in range(remove_number):
             page.leaf_children.pop()
 
     page.background = background
-    page.dump_data(paths.GENERATED_METADATA_FOLDER, dry=False)
-    return page
+    record = dump_page_metadata(page)
+    return CompactPage(page), record
 
 
 def create_inital_page_metadata(data):
-    images_len, fonts_len, speech_bubbles_len = data
-    random = np.random
+    """
+    Create a page's layout from its plan, or take one from the
+    layout bank when cfg.use_layout_bank is on, and pick the image
+    and speech bubbles of its panels. Panels past the plan's are
+    picked from the page's layout random state
 
-    # Create page base
-    number_of_panels = random.choice(
-        list(cfg.num_pages_ratios.keys()),
-        p=list(cfg.num_pages_ratios.values())
-    )
-    page_type = random.choice(
-        list(cfg.vertical_horizontal_ratios.keys()),
-        p=list(cfg.vertical_horizontal_ratios.values())
-    )
-    page = create_page_panels_base(number_of_panels, page_type)
-
-    # Get page transforms and effects
-    if random.random() < cfg.panel_transform_chance:
-        page = add_transforms(page)
+    :param data: The page's plan, the number of images, fonts and
+    speech bubbles and the page's seed
 
-    # Select a background_index
-    background_index = None
-    if random.random() < cfg.background_add_chance:
-        background_index = random.randint(0, images_len)
+    :type data: tuple
+
+    :return: The compacted page, its panels as the index of their
+    leaf or None for the page with their picks, its background
+    index, how many panels to remove and its seed
+
+    :rtype: tuple
+    """
+    page_plan, images_len, fonts_len, speech_bubbles_len, page_seed = data
+    seed_page_stage(page_seed, STAGE_LAYOUT)
+    random = np.random
+    num_panels = int(page_plan["num_panels"])
+    page_type = str(page_plan["page_type"])
+    page_name = get_page_name(page_seed)
+
+    # Take a layout from the bank or create the page base,
+    # its transforms and effects
+    layout_bank = get_layout_bank()
+    page = None
+    if layout_bank is not None:
+        page = layout_bank.sample(num_panels, page_type, page_name, random)
+    if page is None:
+        page = CompactPage(create_page_layout(num_panels, page_type,
+                                              bool(page_plan["transform"]),
+                                              page_name))
 
-    page = shrink_panels(page)
+    # Select a background_index
+    background_index = int(page_plan["background"])
+    if background_index < 0:
+        background_index = None
 
     panels = []
+    planned_panels = len(page_plan["images"])
+    leaves = len(page.leaves) if page.num_panels > 1 else 1
 
     # Select panels image and num of speech bubbles
-    for panel in page.leaf_children if page.num_panels > 1 else range(1):
+    for i in range(leaves):
         speech_bubbles = []
-        image_index = random.randint(0, images_len)
-        num_speech_bubbles = random.randint(cfg.min_speech_bubbles_per_panel,
-                                            cfg.max_speech_bubbles_per_panel)
-
-        # Select image, font and text of speech bubble
-        for __ in range(num_speech_bubbles):
-            font_index = random.randint(0, fonts_len)
-            speech_bubble_index = np.random.randint(0, speech_bubbles_len)
-            speech_bubbles.append((font_index, speech_bubble_index))
-        panels.append((panel if page.num_panels > 1 else page,
+        if i < planned_panels:
+            image_index = int(page_plan["images"][i])
+            num_speech_bubbles = int(page_plan["num_speech_bubbles"][i])
+        else:
+            image_index = random.randint(0, images_len)
+            num_speech_bubbles = random.randint(cfg.min_speech_bubbles_per_panel,
+                                                cfg.max_speech_bubbles_per_panel)
+
+        # Select font, template and texts of speech bubble
+        for j in range(num_speech_bubbles):
+            if i < planned_panels:
+                speech_bubbles.append((int(page_plan["fonts"][i, j]),
+                                       int(page_plan["speech_bubbles"][i, j]),
+                                       page_plan["texts"][i, j]))
+            else:
+                speech_bubbles.append((random.randint(0, fonts_len),
+                                       random.randint(0, speech_bubbles_len),
+                                       None))
+        panels.append((i if page.num_panels > 1 else None,
                       image_index, speech_bubbles))
 
-    return (page, panels, background_index)
+    return (page, panels, background_index,
+            int(page_plan["remove"]), page_seed)
+
+
+def preprocess_page_metadata(random_index,
+                             images,
+                             fonts,
+                             texts,
+                             speech_bubbles,
+                             no_empty_writing_areas,
+                             speech_bubble_templates,
+                             language):
+    """
+    Select the image, fonts and text indices of a page from its
+    previously generated indexes. The texts themselves are looked
+    up by the worker which creates the page
+
+    :param random_index: The page with its generated indexes as
+    create_inital_page_metadata returns them
+
+    :type random_index: tuple
+
+    :param texts: Texts of every language
+
+    :type texts: TextStore
+
+    :param speech_bubble_templates: Size of the speech bubble
+    templates by path
+
+    :type speech_bubble_templates: dict
+
+    :return: The page's data as create_single_page_metadata takes it
+
+    :rtype: tuple
+    """
+    page, panels, background_index, remove_number, page_seed = random_index
+    seed_page_stage(page_seed, STAGE_TEXTS)
+
+    new_panels = []
+    for panel, image_index, panel_bubbles in panels:
+        new_speech_bubbles = []
+        for font_index, speech_bubble_index, planned_texts in panel_bubbles:
+            bubble_image = speech_bubbles[speech_bubble_index]
+            writing_areas = no_empty_writing_areas[bubble_image]
+            if planned_texts is None:
+                text_indices = np.random.randint(0, len(texts),
+                                                 len(writing_areas))
+            else:
+                text_indices = planned_texts[:len(writing_areas)]
+            new_speech_bubbles.append((bubble_image, fonts[font_index],
+                                       text_indices.tolist(),
+                                       list(writing_areas),
+                                       speech_bubble_templates[bubble_image]))
+        new_panels.append((panel, images[image_index], new_speech_bubbles))
+    background = images[background_index] if background_index is not None else None
+    return (page, new_panels, background, remove_number, language, texts,
+            page_seed)
+
+
+def create_single_page_metadata_with_stats(data):
+    """
+    Create a page's metadata as create_single_page_metadata
+    does along with the worker's placement counters
+
+    :return: The page, its record and the counters
+
+    :rtype: tuple
+    """
+    page, record = create_single_page_metadata(data)
+    return page, record, placement_stats.get_stats()
 
 
 def preprocess_metadata(random_indexes,
@@ -128,44 +260,31 @@ def preprocess_metadata(random_indexes,
                         texts,
                         speech_bubbles,
                         no_empty_writing_areas,
+                        speech_bubble_templates,
                         language):
 
-    texts_len = len(texts)
-    texts_iloc = texts.iloc
-    preprocessed_metadata = []
-
     # Select image, fonts and texts from previously generated indexes
-    for page, panels, background_index in random_indexes:
-        new_panels = []
-        for panel, image_index, bubbles in panels:
-            new_speech_bubbles = []
-            for font_index, speech_bubble_index in bubbles:
-                texts, text_indices, writing_areas = [], [], []
-                bubble_image = speech_bubbles[speech_bubble_index]
-                font = fonts[font_index]
-                for area in no_empty_writing_areas[bubble_image]:
-                    text_index = np.random.randint(0, texts_len)
-                    text_indices.append(text_index)
-                    texts.append(texts_iloc[text_index])
-                    writing_areas.append(area)
-                new_speech_bubbles.append((bubble_image, font, texts,
-                                           text_indices, writing_areas))
-            new_panels.append((panel, images[image_index], new_speech_bubbles))
-        background = images[background_index] if background_index is not None else None
-        preprocessed_metadata.append((page, new_panels, background, language))
-
-    return preprocessed_metadata
+    texts = as_text_store(texts)
+    return [preprocess_page_metadata(random_index, images, fonts, texts,
+                                     speech_bubbles, no_empty_writing_areas,
+                                     speech_bubble_templates, language)
+            for random_index in random_indexes]
 
 
-def create_pages_metadata(n,
-                          images,
-                          fonts,
-                          texts,
-                          speech_bubbles,
-                          speech_bubbles_writing_areas,
-                          language):
+def get_no_empty_writing_areas(speech_bubbles_writing_areas):
+    """
+    Group the writing areas which fit text by speech bubble
 
-    # Validate speech_bubbles without empty area
+    :param speech_bubbles_writing_areas: Writing areas of
+    every speech bubble
+
+    :type speech_bubbles_writing_areas: list
+
+    :return: Writing areas by speech bubble path, bubbles
+    without any are left out
+
+    :rtype: dict
+    """
     padding = cfg.bubble_content_padding
     no_empty_writing_areas = {}
     for area in speech_bubbles_writing_areas:
@@ -175,18 +294,104 @@ def create_pages_metadata(n,
                 no_empty_writing_areas[path].append(area)
             else:
                 no_empty_writing_areas[path] = [area]
+    return no_empty_writing_areas
+
+
+def get_max_writing_areas(no_empty_writing_areas):
+    """
+    Get the most writing areas a speech bubble has
+
+    :param no_empty_writing_areas: Writing areas by speech bubble path
+
+    :type no_empty_writing_areas: dict
+
+    :return: The number of writing areas
+
+    :rtype: int
+    """
+    return max((len(areas) for areas in no_empty_writing_areas.values()),
+               default=0)
+
+
+def create_pages_metadata(n,
+                          images,
+                          fonts,
+                          texts,
+                          speech_bubbles,
+                          speech_bubbles_writing_areas,
+                          language,
+                          speech_bubble_templates=None,
+                          seed=None,
+                          start=0):
+    """
+    Create the metadata of n pages. Every page only depends on the
+    seed and its index in the run so a run can be split in shards
+    that generate consecutive pages from start
+
+    :param n: Number of pages to create
+
+    :type n: int
+
+    :param texts: Texts with a column per language, the workers
+    share the mapping of a TextStore opened from a file
+
+    :type texts: TextStore or pandas.DataFrame
+
+    :param speech_bubble_templates: Width, height and bounding box
+    of the speech bubble templates by path as the writing areas
+    file stores them, read from their headers if None
+
+    :type speech_bubble_templates: dict, optional
+
+    :param seed: Seed of the run, a random one is drawn if None
+
+    :type seed: int, optional
+
+    :param start: Index in the run of the first page, defaults to 0
+
+    :type start: int, optional
+
+    :return: The compacted pages
+
+    :rtype: list
+    """
+    check_seeded_backend()
+
+    # Validate speech_bubbles without empty area
+    no_empty_writing_areas = get_no_empty_writing_areas(
+        speech_bubbles_writing_areas)
 
     # Set speech_bubble with validated area
     speech_bubbles = list(no_empty_writing_areas.keys())
     speech_bubbles_len = len(speech_bubbles)
+    if speech_bubble_templates is None:
+        speech_bubble_templates = get_speech_bubble_templates(speech_bubbles)
     images_len = len(images)
     fonts_len = len(fonts)
 
-    # Get random indexes for images and fonts
-    metadata_lens = [(images_len, fonts_len, speech_bubbles_len)
-                     for _ in range(n)]
+    texts = as_text_store(texts)
+    texts_len = len(texts)
+    max_writing_areas = get_max_writing_areas(no_empty_writing_areas)
+
+    # Draw the choices of every page at once, only the layouts
+    # are made page by page
+    seed = get_run_seed(seed)
+    plans = plan_pages(seed, start, n, images_len, fonts_len,
+                       speech_bubbles_len, texts_len, max_writing_areas)
+    metadata_lens = [(get_page_plan(plans, i), images_len, fonts_len,
+                      speech_bubbles_len, (seed, start + i))
+                     for i in range(n)]
     random_indexes = open_pool(create_inital_page_metadata, metadata_lens)
 
     preprocessed_metadata = preprocess_metadata(random_indexes, images, fonts, texts,
-                                                speech_bubbles, no_empty_writing_areas, language)
-    return open_pool(create_single_page_metadata, preprocessed_metadata)
+                                                speech_bubbles, no_empty_writing_areas,
+                                                speech_bubble_templates, language)
+
+    placement_stats.clear()
+    pages = open_pool(create_single_page_metadata_with_stats, preprocessed_metadata)
+    sink = open_metadata_sink()
+    for page, record, _ in pages:
+        sink.write(page.name, record)
+    sink.close()
+    print_placement_stats(sum_worker_stats(stats for _, _, stats in pages))
+    return [page for page, _, _ in pages]
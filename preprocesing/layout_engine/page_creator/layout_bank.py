@@ -0,0 +1,338 @@
+import os
+import copy
+import pickle
+import numpy as np
+
+import paths
+from ... import config_file as cfg
+from ...multiprocessing import open_pool
+from ..objects.compact_page import CompactPage
+from .create_page_panels_base import create_page_panels_base
+from .page_panels_transformers import add_transforms
+from .page_panels_shifters import shrink_panels
+from .page_plans import plan_pages
+from .page_seeds import (
+    seed_page_stage,
+    check_seeded_backend,
+    get_run_seed,
+    get_page_name,
+    STAGE_LAYOUT
+)
+
+
+def create_page_layout(num_panels, page_type, transform, page_name):
+    """
+    Create the panels of a page: its base layout, its transforms
+    and the shrinking of its panels. They draw from the global
+    random states so the page's layout stage should be seeded
+
+    :param num_panels: Number of panels of the page
+
+    :type num_panels: int
+
+    :param page_type: One of the keys of cfg.vertical_horizontal_ratios
+
+    :type page_type: str
+
+    :param transform: Whether to transform the panels
+
+    :type transform: bool
+
+    :param page_name: Name of the page
+
+    :type page_name: str
+
+    :return: The page without images or speech bubbles
+
+    :rtype: Page
+    """
+    page = create_page_panels_base(num_panels, page_type,
+                                   page_name=page_name)
+    if transform:
+        page = add_transforms(page)
+    return shrink_panels(page)
+
+
+def create_bank_layout(data):
+    """
+    Create a layout of the bank the way the page of the same
+    seed and index gets its layout
+
+    :param data: Number of panels, page type, whether it's
+    transformed and the layout's seed
+
+    :type data: tuple
+
+    :return: The compacted layout
+
+    :rtype: CompactPage
+    """
+    num_panels, page_type, transform, layout_seed = data
+    seed_page_stage(layout_seed, STAGE_LAYOUT)
+    page = create_page_layout(num_panels, page_type, transform,
+                              get_page_name(layout_seed))
+    return CompactPage(page)
+
+
+def mirror_layout(layout):
+    """
+    Mirror a layout horizontally, its panels stay inside the
+    page and don't overlap so it's a new valid layout
+
+    :param layout: Layout to mirror, it's left untouched
+
+    :type layout: CompactPage
+
+    :return: The mirrored vertices
+
+    :rtype: numpy.ndarray
+    """
+    width = layout.page_size[0]
+    vertices = layout.vertices.copy()
+    vertices[:, 0] = width - vertices[:, 0]
+    # Reverse every polygon so it keeps its winding
+    offsets = layout.offsets.tolist()
+    for start, end in zip(offsets[:-1], offsets[1:]):
+        vertices[start:end] = vertices[start:end][::-1]
+    return vertices
+
+
+class LayoutBank(object):
+    """
+    Page layouts created once and reused by many pages. A page
+    takes one of the layouts with its number of panels and page
+    type instead of creating its own
+
+    :param layouts: The compacted layouts
+
+    :type layouts: list
+
+    :param num_panels: Number of panels of every layout
+
+    :type num_panels: numpy.ndarray
+
+    :param page_types: Page type of every layout
+
+    :type page_types: numpy.ndarray
+
+    :param transforms: Whether every layout was transformed
+
+    :type transforms: numpy.ndarray
+
+    :param seed: Seed the layouts were created with, the i-th
+    layout is the one the i-th page of a run with that seed gets
+    with the same number of panels, page type and transform
+
+    :type seed: int
+    """
+
+    def __init__(self, layouts, num_panels, page_types, transforms, seed):
+        """
+        Constructor method
+        """
+        self.layouts = layouts
+        self.num_panels = num_panels
+        self.page_types = page_types
+        self.transforms = transforms
+        self.seed = seed
+
+        self.groups = {}
+        for i, key in enumerate(zip(num_panels.tolist(), page_types.tolist())):
+            self.groups.setdefault(key, []).append(i)
+        self.groups = {key: np.array(group, dtype=np.int32)
+                       for key, group in self.groups.items()}
+
+    def __len__(self):
+        return len(self.layouts)
+
+    def sample(self, num_panels, page_type, page_name, random=np.random):
+        """
+        Pick a layout for a page, it's mirrored with
+        cfg.layout_bank_mirror_chance
+
+        :param num_panels: Number of panels of the page
+
+        :type num_panels: int
+
+        :param page_type: Page type of the page
+
+        :type page_type: str
+
+        :param page_name: Name the page gets
+
+        :type page_name: str
+
+        :param random: Random state to pick with,
+        defaults to NumPy's global one
+
+        :return: The page's layout or None if the bank
+        has none with its number of panels and type
+
+        :rtype: CompactPage
+        """
+        group = self.groups.get((num_panels, page_type))
+        if group is None:
+            return None
+        layout = self.layouts[group[random.randint(0, len(group))]]
+
+        # The layouts' arrays are shared, only the name's
+        # and the vertices' are replaced
+        page = copy.copy(layout)
+        page.name = page_name
+        page.strings = layout.strings + [page_name]
+        page.names = layout.names.copy()
+        page.names[0] = len(layout.strings)
+        if random.random() < cfg.layout_bank_mirror_chance:
+            page.vertices = mirror_layout(layout)
+        return page
+
+    def get_coverage(self):
+        """
+        Count the layouts of every number of panels and page type
+
+        :return: The number of layouts and of distinct layouts
+        by number of panels and page type
+
+        :rtype: dict
+        """
+        coverage = {}
+        for key, group in sorted(self.groups.items()):
+            distinct = set(self.layouts[i].vertices.tobytes() for i in group)
+            coverage[key] = (len(group), len(distinct))
+        return coverage
+
+    def save(self, filename):
+        """
+        Write the bank to a single file
+
+        :param filename: Where to write the bank
+
+        :type filename: str
+        """
+        with open(filename, "wb") as f:
+            pickle.dump(dict(layouts=self.layouts,
+                             num_panels=self.num_panels,
+                             page_types=self.page_types,
+                             transforms=self.transforms,
+                             seed=self.seed),
+                        f, pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, filename):
+        """
+        Read a bank written by save
+
+        :param filename: Bank file
+
+        :type filename: str
+
+        :return: The loaded bank
+
+        :rtype: LayoutBank
+        """
+        with open(filename, "rb") as f:
+            return cls(**pickle.load(f))
+
+
+def create_layout_bank(m, seed=None, bank_file=None):
+    """
+    Create m layouts in parallel with the number of panels,
+    page types and transforms pages are planned with and store
+    them in a single file
+
+    :param m: Number of layouts
+
+    :type m: int
+
+    :param seed: Seed of the layouts, a random one is drawn if None
+
+    :type seed: int, optional
+
+    :param bank_file: Where to write the bank, defaults
+    to paths.DATASET_LAYOUT_BANK_FILE
+
+    :type bank_file: str, optional
+
+    :return: The created bank
+
+    :rtype: LayoutBank
+    """
+    check_seeded_backend()
+    if bank_file is None:
+        bank_file = paths.DATASET_LAYOUT_BANK_FILE
+    seed = get_run_seed(seed)
+
+    plans = plan_pages(seed, 0, m, 1, 1, 1, 1, 0)
+    data = [(int(num_panels), str(page_type), bool(transform), (seed, i))
+            for i, (num_panels, page_type, transform) in enumerate(zip(
+                plans["num_panels"], plans["page_type"], plans["transform"]))]
+    layouts = open_pool(create_bank_layout, data, ordered=True)
+
+    bank = LayoutBank(layouts, plans["num_panels"], plans["page_type"],
+                      plans["transform"], seed)
+    bank.save(bank_file)
+    return bank
+
+
+def print_layout_bank_coverage(bank):
+    """
+    Print how many layouts the bank has of every number of
+    panels and page type against how many pages get them
+
+    :param bank: The layout bank
+
+    :type bank: LayoutBank
+    """
+    print("panels | type | layouts | distinct | share (%) | planned share (%)")
+    for (num_panels, page_type), (count, distinct) in bank.get_coverage().items():
+        planned = (cfg.num_pages_ratios.get(num_panels, 0) *
+                   cfg.vertical_horizontal_ratios.get(page_type, 0))
+        print("%6d | %4s | %7d | %8d | %9.1f | %17.1f" % (
+            num_panels, page_type, count, distinct,
+            100*count/len(bank), 100*planned))
+
+
+# Loaded once per process by get_layout_bank
+_layout_bank = None
+_layout_bank_loaded = False
+
+
+def load_layout_bank(filename=None):
+    """
+    Load a bank as this process' layout bank
+
+    :param filename: Bank file, defaults to
+    paths.DATASET_LAYOUT_BANK_FILE
+
+    :type filename: str, optional
+
+    :return: The bank
+
+    :rtype: LayoutBank
+    """
+    global _layout_bank, _layout_bank_loaded
+    if filename is None:
+        filename = paths.DATASET_LAYOUT_BANK_FILE
+    if not os.path.isfile(filename):
+        raise Exception("There's no layout bank at " + filename +
+                        ", create it with --build_layout_bank")
+
+    _layout_bank = LayoutBank.load(filename)
+    _layout_bank_loaded = True
+    return _layout_bank
+
+
+def get_layout_bank():
+    """
+    Get the layout bank of this process if pages take their
+    layouts from it, it's loaded from disk the first time
+
+    :return: The bank or None if cfg.use_layout_bank is off
+
+    :rtype: LayoutBank
+    """
+    if not cfg.use_layout_bank:
+        return None
+    if not _layout_bank_loaded:
+        load_layout_bank()
+    return _layout_bank
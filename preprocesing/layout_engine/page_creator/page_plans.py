@@ -0,0 +1,231 @@
+import numpy as np
+from ... import config_file as cfg
+
+# Uniform numbers at the start of every page's block
+# for the choices made once per page
+PAGE_NUM_PANELS = 0
+PAGE_TYPE = 1
+PAGE_TRANSFORM = 2
+PAGE_BACKGROUND = 3
+PAGE_BACKGROUND_INDEX = 4
+PAGE_REMOVAL = 5
+PAGE_REMOVAL_NUMBER = 6
+PAGE_FIELDS = 8
+
+
+def get_plan_layout(max_writing_areas):
+    """
+    Get where the uniform numbers of a page's plan are in its
+    block. Every page draws a block of the same width so a page's
+    numbers only depend on the seed and its index
+
+    :param max_writing_areas: Most writing areas a speech bubble has
+
+    :type max_writing_areas: int
+
+    :return: The offsets and counts of every field and the
+    width of a page's block
+
+    :rtype: dict
+    """
+    panels = cfg.planned_panels_per_page
+    bubbles = panels*cfg.max_speech_bubbles_per_panel
+    texts = bubbles*max_writing_areas
+
+    layout = dict(panels=panels,
+                  bubbles=cfg.max_speech_bubbles_per_panel,
+                  writing_areas=max_writing_areas)
+    offset = PAGE_FIELDS
+    for name, count in (("images", panels),
+                        ("num_speech_bubbles", panels),
+                        ("fonts", bubbles),
+                        ("speech_bubbles", bubbles),
+                        ("texts", texts)):
+        layout[name] = offset
+        offset += count
+
+    # Philox draws four 64 bit numbers per counter
+    # step so blocks start at a step
+    layout["width"] = -(-offset//4)*4
+    return layout
+
+
+def get_plan_generator(seed, start, width):
+    """
+    Get a generator positioned at a page's block. Philox is counter
+    based so any page can be reached without drawing the ones before
+
+    :param seed: Seed of the run
+
+    :type seed: int
+
+    :param start: Index of the page in the run
+
+    :type start: int
+
+    :param width: Number of uniform numbers of every page
+
+    :type width: int
+
+    :return: The generator
+
+    :rtype: numpy.random.Generator
+    """
+    key = np.random.SeedSequence(seed).generate_state(2, np.uint64)
+    bit_generator = np.random.Philox(key=key)
+    bit_generator.advance(start*width//4)
+    return np.random.Generator(bit_generator)
+
+
+def to_indices(uniform, high):
+    """
+    Turn uniform numbers in [0, 1) into indices in [0, high)
+
+    :param uniform: The uniform numbers
+
+    :type uniform: numpy.ndarray
+
+    :param high: Number of indices
+
+    :type high: int
+
+    :return: The indices
+
+    :rtype: numpy.ndarray
+    """
+    indices = (uniform*high).astype(np.int32)
+    return np.minimum(indices, max(high - 1, 0), out=indices)
+
+
+def to_choices(uniform, ratios):
+    """
+    Pick keys of a dictionary of ratios with uniform numbers
+
+    :param uniform: The uniform numbers
+
+    :type uniform: numpy.ndarray
+
+    :param ratios: Probabilities by key
+
+    :type ratios: dict
+
+    :return: The picked keys
+
+    :rtype: numpy.ndarray
+    """
+    keys = np.array(list(ratios.keys()))
+    cumulative = np.cumsum(list(ratios.values()))
+    indices = np.searchsorted(cumulative/cumulative[-1], uniform,
+                              side="right")
+    return keys[np.minimum(indices, len(keys) - 1)]
+
+
+def plan_pages(seed,
+               start,
+               n,
+               images_len,
+               fonts_len,
+               speech_bubbles_len,
+               texts_len,
+               max_writing_areas):
+    """
+    Draw every random choice of n pages which doesn't depend on their
+    layout's geometry at once: panel counts, layout types, whether
+    they're transformed, their background, panel removal and the image,
+    speech bubble counts, fonts, templates and texts of their first
+    cfg.planned_panels_per_page panels
+
+    :param seed: Seed of the run
+
+    :type seed: int
+
+    :param start: Index in the run of the first page
+
+    :type start: int
+
+    :param n: Number of pages
+
+    :type n: int
+
+    :param max_writing_areas: Most writing areas a speech bubble has
+
+    :type max_writing_areas: int
+
+    :return: Arrays of the choices with the pages along
+    the first axis
+
+    :rtype: dict
+    """
+    layout = get_plan_layout(max_writing_areas)
+    panels = layout["panels"]
+    bubbles = (panels, layout["bubbles"])
+    texts = bubbles + (layout["writing_areas"],)
+
+    plans = dict(num_panels=[], page_type=[], transform=[], background=[],
+                 remove=[], images=[], num_speech_bubbles=[], fonts=[],
+                 speech_bubbles=[], texts=[])
+
+    # Pages are drawn in batches to bound the uniform numbers held
+    batch_size = cfg.page_plan_batch_size
+    for batch_start in range(0, n, batch_size):
+        batch_n = min(batch_size, n - batch_start)
+        rng = get_plan_generator(seed, start + batch_start, layout["width"])
+        uniform = rng.random((batch_n, layout["width"]))
+
+        def field(name, shape):
+            offset = layout[name]
+            count = int(np.prod(shape))
+            return uniform[:, offset:offset + count].reshape((batch_n,) + shape)
+
+        plans["num_panels"].append(
+            to_choices(uniform[:, PAGE_NUM_PANELS], cfg.num_pages_ratios))
+        plans["page_type"].append(
+            to_choices(uniform[:, PAGE_TYPE], cfg.vertical_horizontal_ratios))
+        plans["transform"].append(
+            uniform[:, PAGE_TRANSFORM] < cfg.panel_transform_chance)
+
+        background = to_indices(uniform[:, PAGE_BACKGROUND_INDEX], images_len)
+        background[uniform[:, PAGE_BACKGROUND] >= cfg.background_add_chance] = -1
+        plans["background"].append(background)
+
+        remove = np.where(uniform[:, PAGE_REMOVAL_NUMBER] < 0.5,
+                          1, cfg.panel_removal_max)
+        remove[uniform[:, PAGE_REMOVAL] >= cfg.panel_removal_chance] = 0
+        plans["remove"].append(remove)
+
+        # Like randint the highest speech bubble count is exclusive
+        plans["images"].append(
+            to_indices(field("images", (panels,)), images_len))
+        plans["num_speech_bubbles"].append(
+            cfg.min_speech_bubbles_per_panel + to_indices(
+                field("num_speech_bubbles", (panels,)),
+                cfg.max_speech_bubbles_per_panel -
+                cfg.min_speech_bubbles_per_panel))
+        plans["fonts"].append(
+            to_indices(field("fonts", bubbles), fonts_len))
+        plans["speech_bubbles"].append(
+            to_indices(field("speech_bubbles", bubbles), speech_bubbles_len))
+        plans["texts"].append(
+            to_indices(field("texts", texts), texts_len))
+
+    return {name: np.concatenate(arrays) if arrays else np.empty(0)
+            for name, arrays in plans.items()}
+
+
+def get_page_plan(plans, i):
+    """
+    Get the choices of one of the planned pages
+
+    :param plans: Plans as plan_pages returns them
+
+    :type plans: dict
+
+    :param i: Position of the page in the plans
+
+    :type i: int
+
+    :return: The page's choices
+
+    :rtype: dict
+    """
+    return {name: array[i] for name, array in plans.items()}
@@ -0,0 +1,169 @@
+import uuid
+import random
+import numpy as np
+from ... import config_file as cfg
+from ...multiprocessing import EXECUTOR_THREAD
+
+# Stages of a page's metadata generation which draw random
+# numbers, each gets its own stream
+STAGE_LAYOUT = 0
+STAGE_TEXTS = 1
+STAGE_SPEECH_BUBBLES = 2
+
+
+def get_page_seed_sequence(seed, index, stage=None):
+    """
+    Get the seed sequence of a page or of one of its stages.
+    It's the same sequence SeedSequence(seed).spawn gives the page
+    (and the page's sequence spawns for the stage) but it doesn't
+    depend on how many pages are generated so a page is the same
+    whether it's generated alone, in a batch or in a shard
+
+    :param seed: Seed of the run
+
+    :type seed: int
+
+    :param index: Index of the page in the run
+
+    :type index: int
+
+    :param stage: One of the STAGE constants, defaults to None
+    for the page's own sequence
+
+    :type stage: int, optional
+
+    :return: The seed sequence
+
+    :rtype: numpy.random.SeedSequence
+    """
+    spawn_key = (index,) if stage is None else (index, stage)
+    return np.random.SeedSequence(seed, spawn_key=spawn_key)
+
+
+def get_run_seed(seed=None):
+    """
+    Get the seed of a run, a random one is drawn and printed
+    if it isn't given so the run can be reproduced
+
+    :param seed: Seed given for the run, defaults to None
+
+    :type seed: int, optional
+
+    :return: The seed
+
+    :rtype: int
+    """
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+        print("Seed: " + str(seed))
+    return seed
+
+
+def check_seeded_backend(backend=None):
+    """
+    Check that pages can be seeded with a pool backend. The page
+    creators draw from the global numpy and random states which
+    threads share so threads would race on them and pages wouldn't
+    depend on their seed anymore
+
+    :param backend: Backend creating the pages,
+    defaults to cfg.pool_backend
+
+    :type backend: str, optional
+    """
+    if backend is None:
+        backend = cfg.pool_backend
+    if backend == EXECUTOR_THREAD:
+        raise Exception("Pages can't be created with the thread backend " +
+                        "since threads share the random states, use " +
+                        "processes or inline")
+
+
+def seed_page_stage(page_seed, stage):
+    """
+    Seed the global numpy and random states for a stage of
+    a page's generation since the page creators draw from them
+
+    :param page_seed: The run's seed and the page's index or None
+    to leave the global states as they are
+
+    :type page_seed: tuple
+
+    :param stage: One of the STAGE constants
+
+    :type stage: int
+    """
+    if page_seed is None:
+        return
+    seed, index = page_seed
+    state = get_page_seed_sequence(seed, index, stage).generate_state(4)
+    np.random.seed(state)
+    random.seed(int.from_bytes(state.tobytes(), "little"))
+
+
+def get_page_name(page_seed):
+    """
+    Get the name of a page, it's derived from the page's seed
+    so the same page always gets the same name
+
+    :param page_seed: The run's seed and the page's index or None
+    for a unique random name
+
+    :type page_seed: tuple
+
+    :return: The page's name
+
+    :rtype: str
+    """
+    if page_seed is None:
+        return str(uuid.uuid1())
+    seed, index = page_seed
+    state = get_page_seed_sequence(seed, index).generate_state(4)
+    return str(uuid.UUID(bytes=state.tobytes(), version=4))
+
+
+def parse_shard(shard):
+    """
+    Parse a shard given as "i/N"
+
+    :param shard: The shard
+
+    :type shard: str
+
+    :return: The shard's index and the number of shards
+
+    :rtype: tuple
+    """
+    try:
+        index, count = (int(part) for part in shard.split("/"))
+    except ValueError:
+        raise Exception("Shards are given as i/N, e.g. 0/4, not " + shard)
+    if count < 1 or not 0 <= index < count:
+        raise Exception("Shard index must be in [0, N) with N >= 1, not " + shard)
+    return index, count
+
+
+def get_shard_range(n, shard_index, shard_count):
+    """
+    Get the contiguous slice of a run's page indices a shard
+    generates. The shards of a run are disjoint and cover it
+
+    :param n: Number of pages of the whole run
+
+    :type n: int
+
+    :param shard_index: Index of the shard
+
+    :type shard_index: int
+
+    :param shard_count: Number of shards
+
+    :type shard_count: int
+
+    :return: The first page index and the number of pages
+
+    :rtype: tuple
+    """
+    start = n*shard_index//shard_count
+    end = n*(shard_index + 1)//shard_count
+    return start, end - start
@@ -3,10 +3,8 @@ import numpy as np
 import paths
 import os
 import json
-from tqdm import tqdm
 from .. import config_file as cfg
-from ..multiprocessing import POOL_PROCESSES
-import multiprocessing as mp
+from ..multiprocessing import imap_pool
 
 
 ANNOTATIONS_SPEECH_BUBBLES_CATEGORY_NAME = "speech_bubbles"
@@ -54,51 +52,62 @@ def contour_annotation_to_coco_annotation(annotation, annotation_id, image_id, c
     }
 
 
-def generate_single_annotations(filename, image_counter, annotations_counter):
+def generate_single_annotations(filename):
+    """
+    Create the COCO image and annotations of a segmented page.
+    The ids are local to the page, the image's is 0 and its
+    annotations' count from 0, so pages can be annotated in any
+    worker and numbered afterwards
+
+    :param filename: Name of the page's segmentation folder
+
+    :type filename: str
+
+    :return: The image and its annotations or None if the page
+    isn't segmented or rendered
+
+    :rtype: tuple
+    """
     segmented_folder = paths.GENERATED_SEGMENTED_FOLDER
-    images, annotations = [], []
     folder = segmented_folder + filename
-    if os.path.isdir(folder):
-        annotations_file = os.path.join(
-            folder, paths.GENERATED_ANNOTATIONS_FILENAME)
-        image_file_name = filename + "_BW" + cfg.output_format
-        image_file = os.path.join(
-            paths.GENERATED_IMAGES_FOLDER, image_file_name)
-        if os.path.exists(annotations_file) and os.path.exists(image_file):
-            def append_annotation(contours, category_id, annotation_id):
-                annotations_counter = annotation_id
-                for contour in contours:
-                    annotations.append(
-                        contour_annotation_to_coco_annotation(
-                            contour,
-                            image_id=image_counter,
-                            annotation_id=annotations_counter,
-                            category_id=category_id,
-                        ))
-                    annotations_counter += 1
-                return annotations_counter
-
-            annotation = open_json(annotations_file)
-            annotations_counter = append_annotation(
-                annotation[ANNOTATIONS_PANELS_CATEGORY_NAME],
-                ANNOTATIONS_PANELS_CATEGORY_INDEX,
-                annotations_counter)
-            annotations_counter = append_annotation(
-                annotation[ANNOTATIONS_SPEECH_BUBBLES_CATEGORY_NAME],
-                ANNOTATIONS_SPEECH_BUBBLES_CATEGORY_INDEX,
-                annotations_counter)
-            images.append({
-                "id": image_counter,
-                "width": annotation[ANNOTATIONS_IMAGE_WIDTH],
-                "height": annotation[ANNOTATIONS_IMAGE_HEIGHT],
-                "file_name": image_file_name,
-                "license": 0,
-                "flickr_url": "",
-                "coco_url": "",
-                "date_captured": 0
-            })
-            image_counter += 1
-    return (images, annotations, image_counter, annotations_counter)
+    if not os.path.isdir(folder):
+        return None
+    annotations_file = os.path.join(
+        folder, paths.GENERATED_ANNOTATIONS_FILENAME)
+    image_file_name = filename + "_BW" + cfg.output_format
+    image_file = os.path.join(
+        paths.GENERATED_IMAGES_FOLDER, image_file_name)
+    if not (os.path.exists(annotations_file) and os.path.exists(image_file)):
+        return None
+
+    annotations = []
+
+    def append_annotation(contours, category_id):
+        for contour in contours:
+            annotations.append(
+                contour_annotation_to_coco_annotation(
+                    contour,
+                    image_id=0,
+                    annotation_id=len(annotations),
+                    category_id=category_id,
+                ))
+
+    annotation = open_json(annotations_file)
+    append_annotation(annotation[ANNOTATIONS_PANELS_CATEGORY_NAME],
+                      ANNOTATIONS_PANELS_CATEGORY_INDEX)
+    append_annotation(annotation[ANNOTATIONS_SPEECH_BUBBLES_CATEGORY_NAME],
+                      ANNOTATIONS_SPEECH_BUBBLES_CATEGORY_INDEX)
+    image = {
+        "id": 0,
+        "width": annotation[ANNOTATIONS_IMAGE_WIDTH],
+        "height": annotation[ANNOTATIONS_IMAGE_HEIGHT],
+        "file_name": image_file_name,
+        "license": 0,
+        "flickr_url": "",
+        "coco_url": "",
+        "date_captured": 0
+    }
+    return (image, annotations)
 
 
 def remove_unused_images(coco_json):
@@ -128,15 +137,21 @@ def create_coco_annotations_from_segmentations():
     images = []
     annotations = []
 
-    pool = mp.Pool(processes=POOL_PROCESSES)
-    for filename in tqdm(folders):
-        data = pool.apply(generate_single_annotations,
-                          args=(filename, image_counter, annotations_counter))
-        images += data[0]
-        annotations += data[1]
-        image_counter = data[2]
-        annotations_counter = data[3]
-    pool.close()
+    # Pages come back in the folders' order so they're
+    # numbered the same as when they're annotated one by one
+    for data in imap_pool(generate_single_annotations, folders,
+                          ordered=True):
+        if data is None:
+            continue
+        image, page_annotations = data
+        image["id"] = image_counter
+        for annotation in page_annotations:
+            annotation["id"] += annotations_counter
+            annotation["image_id"] = image_counter
+        images.append(image)
+        annotations += page_annotations
+        image_counter += 1
+        annotations_counter += len(page_annotations)
 
     coco_json = {
         "licenses": [
@@ -0,0 +1,225 @@
+import traceback
+
+from .. import config_file as cfg
+from ..multiprocessing import imap_pool, keep_worker_stats, sum_latest_stats
+from ..speech_bubble_writing_area import get_speech_bubble_templates
+from ..text_store import as_text_store
+from .page_creator.page_plans import plan_pages, get_page_plan
+from .page_creator.page_seeds import get_run_seed, check_seeded_backend
+from .page_creator.create_page_metadata import (
+    create_inital_page_metadata,
+    preprocess_page_metadata,
+    create_single_page_metadata,
+    get_no_empty_writing_areas,
+    get_max_writing_areas
+)
+from .page_creator.bubble_placement import placement_stats, print_placement_stats
+from .pages_renderer import (
+    get_speech_bubble_modes,
+    save_page_outputs,
+    print_illustration_cache_stats
+)
+from .illustration_cache import illustration_cache
+from .metadata_store import open_metadata_sink
+from .shared_assets import create_shared_assets, init_shared_assets
+
+# Assets of the run every worker gets once when it starts
+_pipeline = None
+
+
+def init_page_pipeline(pipeline):
+    """
+    Keep the run's assets in the worker so the tasks
+    only need to carry the page's index
+
+    :param pipeline: Assets and options of the run
+
+    :type pipeline: dict
+    """
+    global _pipeline
+    _pipeline = pipeline
+    init_shared_assets(pipeline["shared_assets"])
+
+
+def create_page(index):
+    """
+    Take a single page through every step: generate its metadata,
+    dump it, render it and segment it. Only a small status record
+    goes back to the parent
+
+    :param index: Index of the page in the run
+
+    :type index: int
+
+    :return: The page's status with its name, whether it was
+    created, the error if it wasn't, its metadata's record if
+    the parent's sink writes it and the counters of the
+    worker's illustration cache
+
+    :rtype: dict
+    """
+    p = _pipeline
+    status = dict(index=index, name=None, ok=True, error=None,
+                  metadata=None)
+    try:
+        page_plan = get_page_plan(plan_pages(p["seed"], index, 1,
+                                             p["images_len"],
+                                             p["fonts_len"],
+                                             p["speech_bubbles_len"],
+                                             p["texts_len"],
+                                             p["max_writing_areas"]), 0)
+        random_index = create_inital_page_metadata((page_plan,
+                                                    p["images_len"],
+                                                    p["fonts_len"],
+                                                    p["speech_bubbles_len"],
+                                                    (p["seed"], index)))
+        status["name"] = random_index[0].name
+
+        data = preprocess_page_metadata(random_index,
+                                        p["images"],
+                                        p["fonts"],
+                                        p["texts"],
+                                        p["speech_bubbles"],
+                                        p["no_empty_writing_areas"],
+                                        p["speech_bubble_templates"],
+                                        p["language"])
+        page, status["metadata"] = create_single_page_metadata(data)
+
+        save_page_outputs(page, p["outputs"], p["segmented"], p["dry"])
+    except Exception:
+        status["ok"] = False
+        status["error"] = traceback.format_exc(limit=1)
+
+    status["stats"] = dict(illustration_cache.get_stats(),
+                           **placement_stats.get_stats())
+    return status
+
+
+def create_pages(n,
+                 images,
+                 fonts,
+                 texts,
+                 speech_bubbles,
+                 speech_bubbles_writing_areas,
+                 language,
+                 outputs,
+                 speech_bubble_templates=None,
+                 segmented=False,
+                 dry=False,
+                 seed=None,
+                 start=0):
+    """
+    Generate, render and segment pages as a stream where each
+    worker takes a page through every step. The parent only keeps
+    counters so its memory doesn't grow with n. Pages are the same
+    as the ones create_pages_metadata creates with the same seed
+
+    :param n: Number of pages to create
+
+    :type n: int
+
+    :param outputs: RENDER_BW and/or RENDER_COLORED
+
+    :type outputs: list
+
+    :param speech_bubble_templates: Size of the speech bubble
+    templates by path, read from their headers if None
+
+    :type speech_bubble_templates: dict, optional
+
+    :param segmented: Whether to also segment the black
+    and white pages
+
+    :type segmented: bool, optional
+
+    :param dry: Whether to skip rendering, defaults to False
+
+    :type dry: bool, optional
+
+    :param seed: Seed of the run, a random one is drawn if None
+    since the forked workers would share their random states
+
+    :type seed: int, optional
+
+    :param start: Index in the run of the first page, defaults to 0
+
+    :type start: int, optional
+
+    :return: The number of pages created and failed
+
+    :rtype: tuple
+    """
+    check_seeded_backend()
+    seed = get_run_seed(seed)
+    # Workers only get the filename of a memory-mapped store
+    texts = as_text_store(texts)
+
+    no_empty_writing_areas = get_no_empty_writing_areas(
+        speech_bubbles_writing_areas)
+    speech_bubbles = list(no_empty_writing_areas.keys())
+    if speech_bubble_templates is None:
+        speech_bubble_templates = get_speech_bubble_templates(speech_bubbles)
+    max_writing_areas = get_max_writing_areas(no_empty_writing_areas)
+
+    # Workers map the writing areas and the decoded templates
+    # instead of holding a copy each
+    shared_assets = None
+    if cfg.use_shared_assets:
+        modes = [] if dry else get_speech_bubble_modes(outputs, segmented)
+        shared_assets = create_shared_assets(speech_bubbles,
+                                             speech_bubble_templates,
+                                             modes,
+                                             no_empty_writing_areas)
+        no_empty_writing_areas = shared_assets.writing_areas
+
+    pipeline = dict(images=images,
+                    fonts=fonts,
+                    texts=texts,
+                    speech_bubbles=speech_bubbles,
+                    no_empty_writing_areas=no_empty_writing_areas,
+                    speech_bubble_templates=speech_bubble_templates,
+                    shared_assets=shared_assets,
+                    images_len=len(images),
+                    fonts_len=len(fonts),
+                    speech_bubbles_len=len(speech_bubbles),
+                    texts_len=len(texts),
+                    max_writing_areas=max_writing_areas,
+                    language=language,
+                    outputs=outputs,
+                    segmented=segmented,
+                    dry=dry,
+                    seed=seed)
+
+    placement_stats.clear()
+    illustration_cache.clear_stats()
+    created = 0
+    failed = 0
+    latest_stats = {}
+    sink = open_metadata_sink()
+    try:
+        for status in imap_pool(create_page, range(start, start + n), total=n,
+                                initializer=init_page_pipeline,
+                                initargs=(pipeline,)):
+            # Pages which failed once their metadata was made keep
+            # it as they do when workers write the JSON files
+            if status["metadata"] is not None:
+                sink.write(status["name"], status["metadata"])
+            if status["ok"]:
+                created += 1
+            else:
+                failed += 1
+                print("We couldn't create page " + str(status["index"]) +
+                      ": " + status["error"])
+
+            # Only the latest counters of every worker are kept
+            keep_worker_stats(latest_stats, status["stats"])
+    finally:
+        # The pages written so far stay readable if the pool fails
+        sink.close()
+        if shared_assets is not None:
+            shared_assets.close()
+
+    stats = sum_latest_stats(latest_stats)
+    print_illustration_cache_stats(stats)
+    print_placement_stats(stats)
+    return created, failed
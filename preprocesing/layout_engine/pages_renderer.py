@@ -2,52 +2,210 @@ import os
 import paths
 
 from .. import config_file as cfg
-from ..multiprocessing import open_pool
+from ..multiprocessing import open_pool, sum_worker_stats
+from ..speech_bubble_writing_area import get_speech_bubble_templates
+from .render_engine import (
+    RENDER_BW,
+    RENDER_COLORED,
+    get_speech_bubble_mode
+)
+from .shared_assets import create_shared_assets, init_shared_assets
+from .pages_segmenter import (
+    SEGMENTATION_MODE,
+    segment_page,
+    create_segmented_page
+)
+from .illustration_cache import illustration_cache
+from .objects.compact_page import CompactPage
 
 
-def create_page_bw(data):
+def get_page_filename(name, output):
     """
-    This function is used to render a single page from a metadata json file
-    to a target location in black and white.
+    Get the path a rendered page is saved to
 
-    :param data:  a tuple of the page metadata and output path
-    as well as whether or not to save the rendered file i.e. dry run or
-    wet run
+    :param name: Name of the page
 
-    :type paths: tuple
+    :type name: str
+
+    :param output: RENDER_BW or RENDER_COLORED
+
+    :type output: str
+
+    :return: Path of the rendered page
+
+    :rtype: str
+    """
+    suffix = "_BW" if output == RENDER_BW else "_Colored"
+    return paths.GENERATED_IMAGES_FOLDER + name + suffix + cfg.output_format
+
+
+def get_speech_bubble_modes(outputs, segmented=False):
     """
+    Get the modes speech bubble templates are decoded in
+    to render the outputs and segment the pages
+
+    :param outputs: Outputs of the pages
+
+    :type outputs: list
+
+    :param segmented: Whether the pages are segmented
+
+    :type segmented: bool, optional
+
+    :rtype: list
+    """
+    modes = [get_speech_bubble_mode(outputs)]
+    if segmented and RENDER_BW in outputs:
+        modes.append(SEGMENTATION_MODE)
+    return modes
+
+
+def save_page_outputs(page, outputs, segmented=False, dry=False):
+    """
+    Render a single page in black and white, with colors or both
+    in one pass and optionally segment it from the rendered black
+    and white page without reading it back. Outputs which were
+    saved by an earlier run are skipped
+
+    :param page: The page
+
+    :type page: Page or CompactPage
+
+    :param outputs: RENDER_BW and/or RENDER_COLORED
+
+    :type outputs: list
+
+    :param segmented: Whether to also segment the black
+    and white page
+
+    :type segmented: bool, optional
+
+    :param dry: Whether to skip rendering, defaults to False
+
+    :type dry: bool, optional
+    """
+    filenames = {output: get_page_filename(page.name, output)
+                 for output in outputs}
+    outputs = [output for output in outputs
+               if not os.path.isfile(filenames[output])]
+    if dry:
+        return
+
+    images = page.render_outputs(outputs) if outputs else {}
+
+    if RENDER_BW in images:
+        if images[RENDER_BW].mode != "L":
+            images[RENDER_BW] = images[RENDER_BW].convert("L")
+        images[RENDER_BW].save(filenames[RENDER_BW], cfg.pil_compression,
+                               optimize=True, quality=cfg.compression_quality)
+
+    if RENDER_COLORED in images:
+        images[RENDER_COLORED].save(
+            filenames[RENDER_COLORED], cfg.pil_compression,
+            optimize=True, quality=cfg.compression_quality)
+
+    if segmented and RENDER_BW in images:
+        segment_page(page.name, page.get_metadata(), images)
+    elif segmented and RENDER_BW in filenames:
+        # The page was rendered by an earlier run
+        create_segmented_page(page.name, page.get_metadata())
+
+
+def create_page_outputs(data):
+    """
+    This function is used to render a single page in black and white,
+    with colors or both in one pass and optionally segment it
+    from the rendered black and white page without reading it back.
+
+    :param data:  a tuple of the page, the outputs to render,
+    whether to segment the page and whether or not to save the
+    rendered files i.e. dry run or wet run
+
+    :type data: tuple
+
+    :return: Whether the page was rendered and the counters
+    of the worker's illustration cache
+
+    :rtype: tuple
+    """
+    page, outputs, segmented, dry = data
+    ok = True
     try:
-        page, dry = data
-        filenameBW = paths.GENERATED_IMAGES_FOLDER + page.name + "_BW" + cfg.output_format
-        if not os.path.isfile(filenameBW) and not dry:
-            img = page.render(show=False)
-            img.convert("L").save(filenameBW, cfg.pil_compression,
-                                  optimize=True, quality=cfg.compression_quality)
+        save_page_outputs(page, outputs, segmented, dry)
     except:
-        print("We couldn't render " + filenameBW)
+        ok = False
+        print("We couldn't render " + page.name)
 
+    return ok, illustration_cache.get_stats()
 
-def create_page_colored(data):
+
+def render_pages(pages, outputs, segmented=False, dry=False,
+                 speech_bubbles=None, speech_bubble_templates=None):
     """
-    This function is used to render a single page from a metadata json file
-    to a target location with colors.
+    Takes pages and renders every requested output of each
+    page within a single pool run
+
+    :param pages: A list of Page or CompactPage objects, pages
+    are compacted before they're sent to the workers
+
+    :param outputs: A list of render outputs, RENDER_BW
+    and/or RENDER_COLORED
 
-    :param data:  a tuple of the page metadata and output path
-    as well as whether or not to save the rendered file i.e. dry run or
-    wet run
+    :param segmented: Whether to also segment the black
+    and white pages
 
-    :type paths: tuple
+    :param speech_bubbles: Paths of the speech bubble templates
+    the pages use, they're decoded once into shared memory for
+    the workers if cfg.use_shared_assets is on
+
+    :type speech_bubbles: list, optional
+
+    :param speech_bubble_templates: Size of the speech bubble
+    templates by path, read from their headers if None
+
+    :type speech_bubble_templates: dict, optional
+
+    :return: The number of pages which couldn't be rendered
+
+    :rtype: int
     """
+    data = [(page if isinstance(page, CompactPage) else CompactPage(page),
+             outputs, segmented, dry) for page in pages]
+
+    illustration_cache.clear_stats()
+    shared_assets = None
+    if speech_bubbles and cfg.use_shared_assets and not dry:
+        if speech_bubble_templates is None:
+            speech_bubble_templates = get_speech_bubble_templates(
+                speech_bubbles)
+        shared_assets = create_shared_assets(
+            speech_bubbles, speech_bubble_templates,
+            get_speech_bubble_modes(outputs, segmented))
     try:
-        page, dry = data
-        filenameColored = paths.GENERATED_IMAGES_FOLDER + page.name + "_Colored" + cfg.output_format
-        if not os.path.isfile(filenameColored) and not dry:
-            img = page.renderColored(show=False)
-            img.convert("RGB").save(filenameColored, cfg.pil_compression,
-                                    optimize=True, quality=cfg.compression_quality)
-    except:
-        print("We couldn't render " + filenameColored)
-                                  
+        results = open_pool(create_page_outputs, data,
+                            initializer=init_shared_assets,
+                            initargs=(shared_assets,))
+    finally:
+        if shared_assets is not None:
+            shared_assets.close()
+    print_illustration_cache_stats(sum_worker_stats(
+        stats for _, stats in results))
+    return sum(1 for ok, _ in results if not ok)
+
+
+def print_illustration_cache_stats(stats):
+    """
+    Print the illustration cache counters summed over the workers
+
+    :param stats: Summed counters of the workers' caches
+
+    :type stats: dict
+    """
+    lookups = stats.get("hits", 0) + stats.get("misses", 0)
+    if lookups > 0:
+        print("Illustration cache: %d hits, %d misses (%.1f%% hit rate), %d evictions" % (
+            stats["hits"], stats["misses"], 100*stats["hits"]/lookups,
+            stats["evictions"]))
 
 
 def render_pages_bw(pages, dry=False):
@@ -56,9 +214,7 @@ def render_pages_bw(pages, dry=False):
 
     :param pages: A list of Page object
     """
-    filenames = [(page, dry) for page in pages]
-    open_pool(create_page_bw, filenames)
-                                  
+    render_pages(pages, [RENDER_BW], dry=dry)
 
 
 def render_pages_colored(pages, dry=False):
@@ -67,5 +223,4 @@ def render_pages_colored(pages, dry=False):
 
     :param pages: A list of Page object
     """
-    filenames = [(page, dry) for page in pages]
-    open_pool(create_page_colored, filenames)
\ No newline at end of file
+    render_pages(pages, [RENDER_COLORED], dry=dry)
@@ -2,13 +2,21 @@
 import cv2
 import paths
 import numpy as np
-from scipy import ndimage
+from PIL import Image
 
 from tqdm import tqdm
 from .. import config_file as cfg
 from ..convert_images import find_contours
 from . import pages_annotator as annotator
 from ..multiprocessing import open_pool
+from .metadata_store import read_page_metadata
+from .render_engine import RENDER_BW
+from .objects.speech_bubble import get_speech_bubble_template
+
+cv2_compression = [int(cv2.IMWRITE_JPEG_QUALITY), cfg.compression_quality]
+
+# Mode speech bubble templates are decoded in to find their outline
+SEGMENTATION_MODE = "L"
 
 
 def move_contours(contours, xy: list):
@@ -49,20 +57,18 @@ def get_panels_and_speech_bubbles(children, panels=[], speech_bubbles=[]):
                 w, h = int(bubble["width"]), int(bubble["height"])
                 x1, y1 = bubble["location"]
 
-                # Read image
-                image = cv2.imread(
-                    bubble["speech_bubble"], cv2.IMREAD_GRAYSCALE)
-                image = cv2.resize(image, (w, h))
-
-                # Rotate image
-                try:
+                # Resize and rotate the decoded template
+                # the way the speech bubble is rendered
+                image = get_speech_bubble_template(bubble["speech_bubble"],
+                                                   SEGMENTATION_MODE)
+                image = image.resize((w, h))
+                if "rotate" in bubble.get("transforms", []):
                     rotation = bubble["transform_metadata"]["rotation_amount"]
-                    image = ndimage.rotate(image, rotation)
-                except:
-                    pass
+                    image = image.rotate(rotation, Image.NEAREST, expand=1,
+                                         center=(w / 2, h / 2))
 
                 # Find contours of rotated rectangle
-                contours = find_contours(image)
+                contours = find_contours(np.asarray(image))
                 contours = sorted(contours, reverse=True,
                                   key=lambda cnt: cv2.contourArea(cnt))
 
@@ -77,28 +83,83 @@ def get_panels_and_speech_bubbles(children, panels=[], speech_bubbles=[]):
                 panel_children, panels, speech_bubbles)
 
 
-def create_mask(img, shape, empty, contour, color, filename):
-    empty = empty.copy()
+def draw_contour(img, shape, contour, color):
     cv2.drawContours(img, [contour], -1, color, 4)
-    cv2.drawContours(empty, [contour], -1, (255), cv2.FILLED)
     cv2.drawContours(shape, [contour], -1, (255), cv2.FILLED)
-    cv2.imwrite(filename, empty, cfg.cv2_compression)
 
 
-def create_segmented_page(name: str):
+def create_mask(mask, contour, filename):
+    """
+    Write the mask of a single contour, the mask is
+    cleared again so it can be reused for the next one
+
+    :param mask: Black single channel image of the page
+
+    :type mask: numpy.ndarray
+
+    :param contour: The contour's points
+
+    :type contour: numpy.ndarray
+
+    :param filename: Where to write the mask
+
+    :type filename: str
+    """
+    cv2.drawContours(mask, [contour], -1, (255), cv2.FILLED)
+    cv2.imwrite(filename, mask, cv2_compression)
+    x, y, w, h = cv2.boundingRect(contour)
+    mask[max(y, 0):y + h, max(x, 0):x + w] = 0
+
+
+def create_segmented_page(name: str, metadata: dict = None):
+    """
+    This function is used to segment a single rendered page
+    from its black and white image and its metadata, read from
+    the metadata store if it isn't given.
+
+    :param name: a str of page.name
+
+    :type name: srt
+
+    :param metadata: The page's metadata as dumped by the Page
+
+    :type metadata: dict, optional
+    """
+
+    image_file = paths.GENERATED_IMAGES_FOLDER + name + "_BW" + cfg.output_format
+    if metadata is None:
+        metadata = read_page_metadata(name)
+    img = cv2.imread(image_file)
+    segment_page(name, metadata, img=img)
+
+
+def segment_page(name: str, metadata: dict, images: dict = None, img=None):
     """
-    This function is used to render a single page from a metadata json file
-    to a target location.
+    This function is used to write the segmentation masks, preview and
+    annotations of a single page to a target location.
 
     :param name: a str of page.name
 
     :type name: srt
+
+    :param metadata: The page's metadata as dumped by the Page
+
+    :type metadata: dict
+
+    :param images: Images of the page by render output as created by
+    the render engine, it needs the black and white page
+
+    :type images: dict, optional
+
+    :param img: BGR image of the black and white page if images
+    aren't given
+
+    :type img: numpy.ndarray, optional
     """
 
     output = cfg.output_format
     image_name = name + "_BW" + output
     image_file = paths.GENERATED_IMAGES_FOLDER + image_name
-    metadata_file = paths.GENERATED_METADATA_FOLDER + name + cfg.metadata_format
 
     panels_category = annotator.ANNOTATIONS_PANELS_CATEGORY_NAME
     speech_bubbles_cateogy = annotator.ANNOTATIONS_SPEECH_BUBBLES_CATEGORY_NAME
@@ -108,12 +169,12 @@ def create_segmented_page(name: str):
 
     paths.makeFolders([panels_masks_folder, speech_bubble_masks_folder])
 
-    metadata = annotator.open_json(metadata_file)
-    img = cv2.imread(image_file)
+    if images is not None:
+        img = cv2.cvtColor(np.asarray(images[RENDER_BW]), cv2.COLOR_GRAY2BGR)
     img_shape = img.shape
-    empty = np.zeros((img_shape[0], img_shape[1]), np.uint8)
-    panels_shape = empty.copy()
-    speech_bubbles_shape = empty.copy()
+    mask = np.zeros((img_shape[0], img_shape[1]), np.uint8)
+    panels_shape = mask.copy()
+    speech_bubbles_shape = mask.copy()
 
     panels = []
     speech_bubbles = []
@@ -131,23 +192,22 @@ def create_segmented_page(name: str):
         anotation = annotator.contour_to_annotation(contour)
         annotations[panels_category].append(
             anotation)
-        create_mask(img, panels_shape, empty, contour,
-                    color=(0, 255, 0),
-                    filename=panels_masks_folder + str(i) + output)
+        draw_contour(img, panels_shape, contour, color=(0, 255, 0))
+        create_mask(mask, contour, panels_masks_folder + str(i) + output)
     for i, speech_bubble in enumerate(speech_bubbles):
         contour, _ = speech_bubble
         anotation = annotator.contour_to_annotation(contour)
         annotations[speech_bubbles_cateogy].append(
             anotation)
-        create_mask(img, speech_bubbles_shape, empty, contour,
-                    color=(255, 0, 0),
-                    filename=speech_bubble_masks_folder + str(i) + output)
+        draw_contour(img, speech_bubbles_shape, contour, color=(255, 0, 0))
+        create_mask(mask, contour,
+                    speech_bubble_masks_folder + str(i) + output)
 
-    cv2.imwrite(folder + "preview" + output, img, cfg.cv2_compression)
+    cv2.imwrite(folder + "preview" + output, img, cv2_compression)
     cv2.imwrite(folder + panels_category +
-                "_mask" + output, panels_shape, cfg.cv2_compression)
+                "_mask" + output, panels_shape, cv2_compression)
     cv2.imwrite(folder + speech_bubbles_cateogy + "_mask" + output,
-                speech_bubbles_shape, cfg.cv2_compression)
+                speech_bubbles_shape, cv2_compression)
 
     annotator.save_json(annotations,
                         folder + paths.GENERATED_ANNOTATIONS_FILENAME)
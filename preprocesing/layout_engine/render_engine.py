@@ -0,0 +1,388 @@
+import os
+import math
+import numpy as np
+from PIL import Image
+from .helpers import (
+    crop_image_only_outside_rows_columns,
+    crop_image_only_outside
+)
+from .compositors import get_compositor
+from .illustration_cache import illustration_cache, get_image_nbytes
+from ..crop_bounds_index import get_crop_bounds_index
+from .. import config_file as cfg
+
+# Outputs the render engine can create for a page
+RENDER_BW = "bw"
+RENDER_COLORED = "colored"
+RENDER_PANELS_MASK = "panels_mask"
+RENDER_SPEECH_BUBBLES_MASK = "speech_bubbles_mask"
+
+RENDER_ILLUSTRATED_OUTPUTS = [RENDER_BW, RENDER_COLORED]
+RENDER_MASK_OUTPUTS = [RENDER_PANELS_MASK, RENDER_SPEECH_BUBBLES_MASK]
+RENDER_OUTPUTS = RENDER_ILLUSTRATED_OUTPUTS + RENDER_MASK_OUTPUTS
+
+
+def get_colored_image(image):
+    """
+    Get the path of the colored twin of a black and
+    white illustration
+
+    :param image: Path of the black and white illustration
+
+    :type image: str
+
+    :return: Path of the colored illustration
+
+    :rtype: str
+    """
+    return image.replace(f"{os.sep}bw{os.sep}", f"{os.sep}colored{os.sep}")
+
+
+def get_page_mode(output):
+    """
+    Get the mode an output is rendered in. Black and white pages
+    are rendered in grayscale unless cfg.grayscale_bw_pages is off
+
+    :param output: One of RENDER_OUTPUTS
+
+    :type output: str
+
+    :return: "L" or "RGB"
+
+    :rtype: str
+    """
+    if output == RENDER_COLORED:
+        return "RGB"
+    if output == RENDER_BW and not cfg.grayscale_bw_pages:
+        return "RGB"
+    return "L"
+
+
+def get_speech_bubble_mode(outputs):
+    """
+    Get the mode speech bubbles are rendered in, they're
+    only rendered in color for colored pages
+
+    :param outputs: Outputs of the page
+
+    :type outputs: list
+
+    :return: "RGBA" or "LA"
+
+    :rtype: str
+    """
+    if any(get_page_mode(output) == "RGB" for output in outputs):
+        return "RGBA"
+    return "LA"
+
+
+def get_crop_box(image):
+    """
+    Get the box which crops out an illustration's black
+    borders from the crop bounds index
+
+    :param image: Path of the black and white illustration
+
+    :type image: str
+
+    :return: Crop box as (left, upper, right, lower) or None
+    if the illustration isn't indexed
+
+    :rtype: tuple
+    """
+    index = get_crop_bounds_index()
+    if index is None:
+        return None
+    row = index.get(image)
+    if row is None:
+        return None
+    _, _, col_start, col_end, row_start, row_end = row
+    return (col_start, row_start, col_end, row_end)
+
+
+def open_reduced(image, mode, box):
+    """
+    Open an illustration and ask the decoder for the smallest
+    reduced size decode (1/2, 1/4 or 1/8 for JPEGs) whose crop still
+    covers the page's size since the crop is stretched to it
+
+    :param image: Path of the illustration
+
+    :type image: str
+
+    :param mode: Mode to decode the illustration in
+
+    :type mode: str
+
+    :param box: Crop box of the illustration at full size,
+    nothing is reduced if it's None
+
+    :type box: tuple
+
+    :return: A tuple of the lazily decoded image and the crop
+    box scaled to the decoded size
+
+    :rtype: tuple
+    """
+    img = Image.open(image)
+    if box is None or not cfg.reduced_decode:
+        return img, box
+
+    width, height = img.size
+    col_start, row_start, col_end, row_end = box
+    crop_width = max(col_end - col_start, 1)
+    crop_height = max(row_end - row_start, 1)
+
+    # Size of the whole image at which its crop
+    # has the page's size
+    min_scale = cfg.reduced_decode_min_scale
+    requested = (math.ceil(width*cfg.page_width/crop_width*min_scale),
+                 math.ceil(height*cfg.page_height/crop_height*min_scale))
+    img.draft(mode, requested)
+
+    if img.size != (width, height):
+        w_ratio = img.size[0]/width
+        h_ratio = img.size[1]/height
+        box = (round(col_start*w_ratio), round(row_start*h_ratio),
+               round(col_end*w_ratio), round(row_end*h_ratio))
+    return img, box
+
+
+def get_decode_key(box):
+    """
+    Get what decoding an illustration at a reduced size depends
+    on besides its path and the page's size, it's part of the keys
+    decoded illustrations are cached with so an illustration decoded
+    at a reduced size isn't used where it's decoded at full size
+
+    :param box: Crop box of the illustration at full size
+
+    :type box: tuple
+
+    :return: The crop box and the scale it's decoded at
+    or None if it's decoded at full size
+
+    :rtype: tuple
+    """
+    if box is None or not cfg.reduced_decode:
+        return None
+    return box, cfg.reduced_decode_min_scale
+
+
+def load_cropped_illustration(image, box=None):
+    """
+    Open an illustration and clean it up by cropping the black areas
+
+    :param image: Path of the black and white illustration
+
+    :type image: str
+
+    :param box: Crop box of the illustration, it's found
+    by scanning the image if None
+
+    :type box: tuple, optional
+
+    :return: A tuple of the cropped image with the box it was cropped
+    to at full size and the image's size in bytes
+
+    :rtype: tuple
+    """
+    img, decoded_box = open_reduced(image, "L", box)
+    if box is None:
+        img_array = np.asarray(img)
+        col_start, col_end, row_start, row_end = crop_image_only_outside_rows_columns(img_array)
+        box = decoded_box = (col_start, row_start, col_end, row_end)
+    img = img.crop(decoded_box)
+    return (img, box), get_image_nbytes(img)
+
+
+def open_illustrations(image, outputs):
+    """
+    Open a panel's illustration once for all the requested outputs
+    and clean it up by cropping the black areas. The colored
+    illustration is cropped with the black and white one's bounds
+    which come from the crop bounds index if it was created.
+    Cropped illustrations are kept in the worker's cache
+
+    :param image: Path of the black and white illustration
+
+    :type image: str
+
+    :param outputs: Requested outputs
+
+    :type outputs: list
+
+    :return: Cropped illustrations by output
+
+    :rtype: dict
+    """
+    illustrations = {}
+    box = get_crop_box(image)
+
+    # The black and white illustration is only decoded for
+    # colored pages when its bounds aren't indexed
+    if RENDER_BW in outputs or box is None:
+        img, box = illustration_cache.get(
+            ("illustration", image, cfg.page_size, get_decode_key(box)),
+            lambda: load_cropped_illustration(image, box))
+        if RENDER_BW in outputs:
+            illustrations[RENDER_BW] = img
+
+    if RENDER_COLORED in outputs:
+        colored_image = get_colored_image(image)
+
+        def load_colored():
+            colored, decoded_box = open_reduced(colored_image, "RGB", box)
+            colored = colored.crop(decoded_box)
+            return colored, get_image_nbytes(colored)
+
+        illustrations[RENDER_COLORED] = illustration_cache.get(
+            ("illustration", colored_image, cfg.page_size,
+             get_decode_key(box)), load_colored)
+    return illustrations
+
+
+def load_background(background, box=None):
+    """
+    Open, crop and stretch a page's background to the page's size
+
+    :param background: Path of the background illustration
+
+    :type background: str
+
+    :param box: Crop box of the background, it's found
+    by scanning the image if None
+
+    :type box: tuple, optional
+
+    :return: A tuple of the background image and its size in bytes
+
+    :rtype: tuple
+    """
+    bg, box = open_reduced(background, "L", box)
+    bg = bg.convert("L")
+    if box is None:
+        img_array = np.asarray(bg)
+        crop_array = crop_image_only_outside(img_array)
+        bg = Image.fromarray(crop_array)
+    else:
+        bg = bg.crop(box)
+    bg = bg.resize(cfg.page_size)
+    return bg, get_image_nbytes(bg)
+
+
+def open_background(background):
+    """
+    Get a page's background from the worker's cache or load it
+
+    :param background: Path of the background illustration
+
+    :type background: str
+
+    :return: Background image
+
+    :rtype: PIL.Image
+    """
+    box = get_crop_box(background)
+    return illustration_cache.get(("background", background, cfg.page_size,
+                                   get_decode_key(box)),
+                                  lambda: load_background(background, box))
+
+
+def render_page(panels, speech_bubbles, background=None, outputs=[RENDER_BW]):
+    """
+    Render a page to every requested output in a single traversal.
+    The panel polygons are rasterized, the illustrations are opened
+    and the speech bubbles are rendered once and then shared by all
+    the outputs, only the illustration layer differs between them.
+    Pages are drawn by the compositor chosen in cfg.compositor
+
+    :param panels: Panels to render in order as tuples of their
+    polygon and black and white illustration path or None
+
+    :type panels: list
+
+    :param speech_bubbles: SpeechBubble objects to render
+
+    :type speech_bubbles: list
+
+    :param background: Path of the page's background, defaults to None
+
+    :type background: str, optional
+
+    :param outputs: Which of RENDER_OUTPUTS to create,
+    defaults to [RENDER_BW]
+
+    :type outputs: list, optional
+
+    :return: Rendered images by output in the mode
+    get_page_mode gives them
+
+    :rtype: dict
+    """
+    for output in outputs:
+        if output not in RENDER_OUTPUTS:
+            raise Exception("That render output is not available. Available " +
+                            str(RENDER_OUTPUTS))
+
+    illustrated = [output for output in RENDER_ILLUSTRATED_OUTPUTS
+                   if output in outputs]
+    compositor = get_compositor()
+
+    # Create a new blank page for every output
+    pages = {}
+    for output in outputs:
+        if output in illustrated:
+            pages[output] = compositor.new_page(output,
+                                                get_page_mode(output),
+                                                "white")
+        else:
+            pages[output] = compositor.new_page(output, "L", "black")
+
+    # Set background if needed
+    if background is not None and illustrated:
+        bg = open_background(background)
+        for output in illustrated:
+            compositor.paste_background(pages[output], bg)
+
+    # Render panels, their polygons are rasterized and their
+    # illustrations are opened once for every output
+    for rect, image in panels:
+        raster = None
+        if image is not None:
+            raster = compositor.rasterize(rect)
+
+        illustrations = {}
+        if raster is not None and illustrated:
+            illustrations = open_illustrations(image, illustrated)
+
+        for output in illustrated:
+
+            # Draw outline
+            compositor.draw_outline(pages[output], rect)
+
+            # Paste illustration onto the page
+            if raster is not None:
+                box, mask = raster
+                compositor.paste_illustration(pages[output],
+                                              illustrations[output],
+                                              box, mask)
+
+        if raster is not None and RENDER_PANELS_MASK in outputs:
+            box, mask = raster
+            compositor.paste_mask(pages[RENDER_PANELS_MASK], box, mask)
+
+    # Render bubbles
+    bubble_mode = get_speech_bubble_mode(illustrated)
+
+    if illustrated or RENDER_SPEECH_BUBBLES_MASK in outputs:
+        for speech_bubble in speech_bubbles:
+            bubble, location = speech_bubble.render(bubble_mode)
+            for output in illustrated:
+                compositor.paste_bubble(pages[output], bubble, location)
+            if RENDER_SPEECH_BUBBLES_MASK in outputs:
+                compositor.paste_bubble_mask(pages[RENDER_SPEECH_BUBBLES_MASK],
+                                             bubble, location)
+
+    return {output: compositor.to_image(page)
+            for output, page in pages.items()}
@@ -0,0 +1,344 @@
+import numpy as np
+from multiprocessing import shared_memory
+from PIL import Image
+from .. import config_file as cfg
+from ..multiprocessing import open_pool
+
+# Assets of the run the worker attached to when it started
+_shared_assets = None
+
+# Modes templates are stored in as they're decoded, other
+# modes are stored band by band and merged when they're used
+SHARED_MAPPED_MODES = ["RGBA", "L"]
+
+
+def get_template_nbytes(template, mode):
+    """
+    Get the bytes a decoded template takes
+
+    :param template: Width and height of the template
+
+    :type template: dict
+
+    :param mode: Mode the template is decoded in
+
+    :type mode: str
+
+    :rtype: int
+    """
+    return template["width"]*template["height"]*Image.getmodebands(mode)
+
+
+def write_shared_template(data):
+    """
+    Decode a speech bubble template into its place in
+    the shared memory block of the run
+
+    :param data: Name of the block, path of the template, mode
+    to decode it in, its offset in the block and its width and height
+
+    :type data: tuple
+
+    :return: Whether the template was written
+
+    :rtype: bool
+    """
+    name, path, mode, offset, w, h = data
+    try:
+        img = Image.open(path).convert(mode)
+    except Exception:
+        print("We couldn't share " + path)
+        return False
+    if img.size != (w, h):
+        return False
+
+    if mode in SHARED_MAPPED_MODES:
+        bands = [img.tobytes()]
+    else:
+        bands = [band.tobytes() for band in img.split()]
+    memory = shared_memory.SharedMemory(name=name)
+    for band in bands:
+        memory.buf[offset:offset + len(band)] = band
+        offset += len(band)
+    memory.close()
+    return True
+
+
+class SharedWritingAreas(object):
+    """
+    Writing areas by speech bubble path read from the shared
+    table, made as load_speech_bubbles_writing_areas makes them
+
+    :param assets: Shared assets holding the table
+
+    :type assets: SharedAssets
+    """
+
+    def __init__(self, assets):
+        """
+        Constructor method
+        """
+        self.assets = assets
+
+    def __getitem__(self, path):
+        return self.assets.get_writing_areas(path)
+
+    def __len__(self):
+        return len(self.assets.speech_bubbles)
+
+    def __iter__(self):
+        return iter(self.assets.speech_bubbles)
+
+
+class SharedAssets(object):
+    """
+    Decoded speech bubble templates and the writing areas of the
+    speech bubbles placed in a shared memory block by the parent
+    so workers map them instead of holding a copy each. Pickles
+    as the name of the block, workers attach to it read-only
+
+    :param memory: The block
+
+    :type memory: multiprocessing.shared_memory.SharedMemory
+
+    :param templates: Offset, width and height of the
+    templates in the block by path and mode
+
+    :type templates: dict
+
+    :param speech_bubbles: Paths of the speech bubbles whose
+    writing areas are in the table
+
+    :type speech_bubbles: list
+
+    :param table_offset: Offset of the writing areas table
+
+    :type table_offset: int
+
+    :param table_len: Number of writing areas in the table
+
+    :type table_len: int
+
+    :param owner: Whether this process created the block
+    and removes it once it's closed
+
+    :type owner: bool, optional
+    """
+
+    def __init__(self, memory, templates, speech_bubbles, table_offset,
+                 table_len, owner=False):
+        """
+        Constructor method
+        """
+        self.memory = memory
+        self.templates = templates
+        self.speech_bubbles = speech_bubbles
+        self.table_offset = table_offset
+        self.table_len = table_len
+        self.owner = owner
+
+        self.buffer = memory.buf.toreadonly()
+        # Rows of x, y, width and height of the writing areas
+        # followed by where the areas of every speech bubble start
+        self.table = np.frombuffer(self.buffer, np.int32, table_len*4,
+                                   table_offset).reshape(-1, 4)
+        self.starts = np.frombuffer(self.buffer, np.int64,
+                                    len(speech_bubbles) + 1,
+                                    table_offset + self.table.nbytes)
+        self.speech_bubble_index = {path: i for i, path
+                                    in enumerate(speech_bubbles)}
+        self.writing_areas = SharedWritingAreas(self)
+
+    def __reduce__(self):
+        return (attach_shared_assets, (self.memory.name, self.templates,
+                                       self.speech_bubbles,
+                                       self.table_offset, self.table_len))
+
+    def get_template(self, path, mode):
+        """
+        Get a decoded speech bubble template. Templates of
+        SHARED_MAPPED_MODES are read-only images of the block
+
+        :param path: Path of the template
+
+        :type path: str
+
+        :param mode: Mode of the template
+
+        :type mode: str
+
+        :return: The template or None if it isn't shared
+
+        :rtype: PIL.Image
+        """
+        if (path, mode) not in self.templates:
+            return None
+        offset, w, h = self.templates[(path, mode)]
+        if mode in SHARED_MAPPED_MODES:
+            nbytes = w*h*Image.getmodebands(mode)
+            return Image.frombuffer(mode, (w, h),
+                                    self.buffer[offset:offset + nbytes],
+                                    "raw", mode, 0, 1)
+        bands = []
+        for _ in range(Image.getmodebands(mode)):
+            bands.append(Image.frombuffer("L", (w, h),
+                                          self.buffer[offset:offset + w*h],
+                                          "raw", "L", 0, 1))
+            offset += w*h
+        return Image.merge(mode, bands)
+
+    def get_writing_areas(self, path):
+        """
+        Get the writing areas of a speech bubble
+
+        :param path: Path of the speech bubble
+
+        :type path: str
+
+        :return: The writing areas
+
+        :rtype: list
+        """
+        i = self.speech_bubble_index[path]
+        rows = self.table[self.starts[i]:self.starts[i + 1]].tolist()
+        return [{"path": path, "width": w, "height": h, "x": x, "y": y}
+                for x, y, w, h in rows]
+
+    def close(self):
+        """
+        Detach from the block, the process which
+        created it also removes it
+        """
+        global _shared_assets
+        if _shared_assets is self:
+            _shared_assets = None
+        if self.owner:
+            self.memory.unlink()
+        self.table = self.starts = self.buffer = None
+        try:
+            self.memory.close()
+        except BufferError:
+            # Templates still in use keep the block mapped
+            # until they're freed
+            pass
+
+
+def attach_shared_assets(name, templates, speech_bubbles, table_offset,
+                         table_len):
+    """
+    Attach to shared assets another process created
+
+    :return: The shared assets
+
+    :rtype: SharedAssets
+    """
+    return SharedAssets(shared_memory.SharedMemory(name=name), templates,
+                        speech_bubbles, table_offset, table_len)
+
+
+def create_shared_assets(speech_bubbles, speech_bubble_templates, modes,
+                         writing_areas=None, max_bytes=None):
+    """
+    Place the speech bubble templates decoded in every mode and
+    the writing areas of the speech bubbles in a shared memory
+    block. The templates are decoded by the pool's workers, the
+    ones which don't fit in max_bytes or couldn't be decoded are
+    left for the workers to decode themselves
+
+    :param speech_bubbles: Paths of the speech bubbles
+
+    :type speech_bubbles: list
+
+    :param speech_bubble_templates: Width and height of the
+    templates by path
+
+    :type speech_bubble_templates: dict
+
+    :param modes: Modes the templates are rendered in
+
+    :type modes: list
+
+    :param writing_areas: Writing areas by speech bubble path
+
+    :type writing_areas: dict, optional
+
+    :param max_bytes: Byte budget of the decoded templates,
+    defaults to cfg.shared_speech_bubble_templates_max_bytes
+
+    :type max_bytes: int, optional
+
+    :return: The shared assets, close them once the workers are done
+
+    :rtype: SharedAssets
+    """
+    if max_bytes is None:
+        max_bytes = cfg.shared_speech_bubble_templates_max_bytes
+
+    templates = {}
+    nbytes = 0
+    for path in speech_bubbles:
+        if path not in speech_bubble_templates:
+            continue
+        for mode in modes:
+            template_nbytes = get_template_nbytes(
+                speech_bubble_templates[path], mode)
+            if nbytes + template_nbytes > max_bytes:
+                continue
+            templates[(path, mode)] = (nbytes,
+                                       speech_bubble_templates[path]["width"],
+                                       speech_bubble_templates[path]["height"])
+            nbytes += template_nbytes
+
+    if writing_areas is None:
+        writing_areas = {}
+    table_speech_bubbles = list(writing_areas.keys())
+    table = np.array([[area["x"], area["y"], area["width"], area["height"]]
+                      for path in table_speech_bubbles
+                      for area in writing_areas[path]],
+                     dtype=np.int32).reshape(-1, 4)
+    starts = np.cumsum([0] + [len(writing_areas[path])
+                              for path in table_speech_bubbles],
+                       dtype=np.int64)
+
+    # The table starts aligned for its integers
+    table_offset = -(-nbytes // 8)*8
+    size = table_offset + table.nbytes + starts.nbytes
+    memory = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    memory.buf[table_offset:table_offset + table.nbytes] = table.tobytes()
+    memory.buf[table_offset + table.nbytes:size] = starts.tobytes()
+
+    if templates:
+        keys = list(templates.keys())
+        written = open_pool(write_shared_template,
+                            [(memory.name, path, mode) + templates[(path, mode)]
+                             for path, mode in keys],
+                            ordered=True)
+        for key, ok in zip(keys, written):
+            if not ok:
+                del templates[key]
+
+    return SharedAssets(memory, templates, table_speech_bubbles,
+                        table_offset, len(table), owner=True)
+
+
+def init_shared_assets(assets):
+    """
+    Keep the run's shared assets in the worker
+
+    :param assets: The shared assets or None to not use them
+
+    :type assets: SharedAssets
+    """
+    global _shared_assets
+    _shared_assets = assets
+
+
+def get_shared_assets():
+    """
+    Get the shared assets the worker attached to
+
+    :return: The shared assets or None
+
+    :rtype: SharedAssets
+    """
+    return _shared_assets
@@ -1,12 +1,284 @@
+import os
 import multiprocessing as mp
+from multiprocessing.pool import ThreadPool
 from tqdm import tqdm
+from . import config_file as cfg
 
-POOL_PROCESSES = 8
+EXECUTOR_PROCESS = "process"
+EXECUTOR_THREAD = "thread"
+EXECUTOR_INLINE = "inline"
+EXECUTORS_AVAILABLE = [EXECUTOR_PROCESS, EXECUTOR_THREAD, EXECUTOR_INLINE]
 
 
-def open_pool(func, iterable):
-    elements = []
-    with mp.Pool(processes=POOL_PROCESSES) as pool:
-        for e in tqdm(pool.imap_unordered(func, iterable), total=len(iterable)):
-            elements.append(e)
-    return elements
+def get_chunksize(total, workers):
+    """
+    Get how many elements to send to a worker at once. Like
+    Pool.map it aims for about four chunks per worker so tasks
+    don't go through IPC one at a time but the last chunks
+    still balance between the workers
+
+    :param total: Number of elements or None if it isn't known
+
+    :type total: int
+
+    :param workers: Number of workers
+
+    :type workers: int
+
+    :return: The chunksize
+
+    :rtype: int
+    """
+    if not total:
+        return 1
+    return max(1, total//(workers*4))
+
+
+class Executor(object):
+    """
+    Runs a function over elements in process or thread workers
+    or inline in the calling process for debugging and profiling
+
+    :param backend: One of EXECUTORS_AVAILABLE,
+    defaults to cfg.pool_backend
+
+    :type backend: str, optional
+
+    :param workers: Number of workers, defaults to cfg.pool_workers
+    or the number of cores if that is None
+
+    :type workers: int, optional
+
+    :param chunksize: Elements sent to a worker at once, defaults
+    to cfg.pool_chunksize or one chosen from the number of elements
+    if that is None
+
+    :type chunksize: int, optional
+
+    :param maxtasksperchild: Chunks a process worker runs before it's
+    replaced, defaults to cfg.pool_maxtasksperchild. None keeps the
+    workers for the whole run
+
+    :type maxtasksperchild: int, optional
+
+    :param initializer: Function every worker runs once
+    when it starts e.g. to load the run's assets, defaults to None
+
+    :type initializer: function, optional
+
+    :param initargs: Arguments of the initializer
+
+    :type initargs: tuple, optional
+    """
+
+    def __init__(self,
+                 backend=None,
+                 workers=None,
+                 chunksize=None,
+                 maxtasksperchild=None,
+                 initializer=None,
+                 initargs=()):
+        """
+        Constructor method
+        """
+        if backend is None:
+            backend = cfg.pool_backend
+        if backend not in EXECUTORS_AVAILABLE:
+            raise Exception("That executor is not available. Available " +
+                            str(EXECUTORS_AVAILABLE))
+        if workers is None:
+            workers = cfg.pool_workers
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if workers < 1:
+            raise Exception("An executor needs at least one worker")
+
+        self.backend = backend
+        self.workers = workers
+        self.chunksize = cfg.pool_chunksize if chunksize is None else chunksize
+        self.maxtasksperchild = (cfg.pool_maxtasksperchild
+                                 if maxtasksperchild is None
+                                 else maxtasksperchild)
+        self.initializer = initializer
+        self.initargs = initargs
+
+    def open(self):
+        """
+        Start the workers of the process or thread backends
+
+        :return: The pool
+        """
+        if self.backend == EXECUTOR_PROCESS:
+            return mp.Pool(processes=self.workers,
+                           initializer=self.initializer,
+                           initargs=self.initargs,
+                           maxtasksperchild=self.maxtasksperchild)
+        # Threads share the process so they can't be recycled
+        return ThreadPool(processes=self.workers,
+                          initializer=self.initializer,
+                          initargs=self.initargs)
+
+    def imap(self, func, iterable, total=None, ordered=False):
+        """
+        Run a function over elements and yield the results
+        as they finish so they don't have to be kept
+
+        :param func: Function to run on every element
+
+        :type func: function
+
+        :param iterable: Elements to run the function on
+
+        :type iterable: iterable
+
+        :param total: Number of elements for the progress bar and
+        the chunksize, defaults to len(iterable) if it has one
+
+        :type total: int, optional
+
+        :param ordered: Whether to yield the results in the order of
+        the elements instead of as they finish, defaults to False
+
+        :type ordered: bool, optional
+        """
+        if total is None and hasattr(iterable, "__len__"):
+            total = len(iterable)
+
+        if self.backend == EXECUTOR_INLINE:
+            if self.initializer is not None:
+                self.initializer(*self.initargs)
+            for e in tqdm(iterable, total=total):
+                yield func(e)
+            return
+
+        chunksize = self.chunksize
+        if chunksize is None:
+            chunksize = get_chunksize(total, self.workers)
+        with self.open() as pool:
+            imap = pool.imap if ordered else pool.imap_unordered
+            for e in tqdm(imap(func, iterable, chunksize), total=total):
+                yield e
+
+    def map(self, func, iterable, total=None, ordered=False):
+        """
+        Run a function over elements and get every result
+
+        :param func: Function to run on every element
+
+        :type func: function
+
+        :param iterable: Elements to run the function on
+
+        :type iterable: iterable
+
+        :return: The results
+
+        :rtype: list
+        """
+        return list(self.imap(func, iterable, total=total, ordered=ordered))
+
+
+def imap_pool(func, iterable, total=None, initializer=None, initargs=(),
+              ordered=False):
+    """
+    Run a function over elements with the configured executor and
+    yield the results as they finish so they don't have to be kept
+
+    :param func: Function to run on every element
+
+    :type func: function
+
+    :param iterable: Elements to run the function on
+
+    :type iterable: iterable
+
+    :param total: Number of elements for the progress bar,
+    defaults to len(iterable)
+
+    :type total: int, optional
+
+    :param initializer: Function every worker runs once
+    when it starts, defaults to None
+
+    :type initializer: function, optional
+
+    :param initargs: Arguments of the initializer
+
+    :type initargs: tuple, optional
+
+    :param ordered: Whether to yield the results in the order of
+    the elements, defaults to False
+
+    :type ordered: bool, optional
+    """
+    executor = Executor(initializer=initializer, initargs=initargs)
+    return executor.imap(func, iterable, total=total, ordered=ordered)
+
+
+def open_pool(func, iterable, initializer=None, initargs=(), ordered=False):
+    return list(imap_pool(func, iterable, initializer=initializer,
+                          initargs=initargs, ordered=ordered))
+
+
+def keep_worker_stats(latest, record):
+    """
+    Keep the counters a worker reported in the latest counters
+    of the workers. Counters only grow so the highest value of
+    every counter is kept, records of threads sharing a pid
+    may arrive out of order
+
+    :param latest: Counters of every worker by pid
+
+    :type latest: dict
+
+    :param record: Counters of a worker with a pid key,
+    None records are skipped
+
+    :type record: dict
+    """
+    if record is None:
+        return
+    kept = latest.setdefault(record["pid"], {})
+    for key, value in record.items():
+        if key != "pid":
+            kept[key] = max(kept.get(key, value), value)
+
+
+def sum_worker_stats(records):
+    """
+    Merge cumulative counters reported by pool workers. Each
+    worker reports its running totals tagged with its pid so only
+    the highest counters of every worker are summed
+
+    :param records: Dictionaries of counters with a pid key,
+    None records are skipped
+
+    :type records: list
+
+    :return: Summed counters
+
+    :rtype: dict
+    """
+    latest = {}
+    for record in records:
+        keep_worker_stats(latest, record)
+    return sum_latest_stats(latest)
+
+
+def sum_latest_stats(latest):
+    """
+    Sum the counters keep_worker_stats kept for every worker
+
+    :param latest: Counters of every worker by pid
+
+    :type latest: dict
+
+    :return: Summed counters
+
+    :rtype: dict
+    """
+    totals = {}
+    for record in latest.values():
+        for key, value in record.items():
+            totals[key] = totals.get(key, 0) + value
+    return totals
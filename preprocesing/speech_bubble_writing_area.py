@@ -1,6 +1,7 @@
-import cv2
 import paths
 import os
+import numpy as np
+from PIL import Image
 from tqdm import tqdm
 
 
@@ -10,6 +11,8 @@ def get_largest_rectangle_inside_contours(img):
 
     return: list of ((x1, y1), (x2, y2)) or None
     """
+    import cv2
+
     # Color it in gray
     gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
 
@@ -81,7 +84,33 @@ def get_largest_rectangle_inside_contours(img):
             return [((x1, y1), (x2, y2))]
 
 
+def get_template_bbox(img):
+    """
+    Get the bounding box of a speech bubble template's visible
+    pixels, the whole template when it has no alpha channel
+
+    :param img: Template read with its alpha channel
+
+    :type img: numpy.ndarray
+
+    :return: x, y, width and height of the box
+
+    :rtype: tuple
+    """
+    h, w = img.shape[:2]
+    if img.ndim < 3 or img.shape[2] < 4:
+        return 0, 0, w, h
+    ys, xs = np.nonzero(img[:, :, 3])
+    if not len(xs):
+        return 0, 0, w, h
+    x, y = int(xs.min()), int(ys.min())
+    return x, y, int(xs.max()) - x + 1, int(ys.max()) - y + 1
+
+
 def create_speech_bubbles_writing_areas(save=True):
+    # Imported here since generation only loads the writing areas
+    import cv2
+
     file = paths.DATASET_IMAGES_SPEECH_BUBBLES_WRITING_AREAS_FILE
     folder = paths.DATASET_IMAGES_SPEECH_BUBBLES_FOLDER
     rects_folder = paths.DATASET_IMAGES_SPEECH_BUBBLES_SEGMENTED_FOLDER
@@ -94,7 +123,15 @@ def create_speech_bubbles_writing_areas(save=True):
         for bubble in tqdm(speech_bubbles):
             if ".png" in bubble:
                 file = folder + bubble
-                img = cv2.imread(file)
+                # Read once with alpha so the template's size and
+                # visible box are stored with its writing areas
+                template = cv2.imread(file, cv2.IMREAD_UNCHANGED)
+                if template.ndim < 3:
+                    img = cv2.cvtColor(template, cv2.COLOR_GRAY2BGR)
+                else:
+                    img = np.ascontiguousarray(template[:, :, :3])
+                h, w = img.shape[:2]
+                bbox = get_template_bbox(template)
                 rects = get_largest_rectangle_inside_contours(img)
                 if rects:
                     for pts in rects:
@@ -102,10 +139,82 @@ def create_speech_bubbles_writing_areas(save=True):
                         x, y = p1
                         items = [file,
                                  str(x), str(y),
-                                 str(p2[0] - x), str(p2[1] - y)]
+                                 str(p2[0] - x), str(p2[1] - y),
+                                 str(w), str(h)] + [str(v) for v in bbox]
                         if save:
                             cv2.rectangle(img, p1, p2, (255, 0, 0))
                         f.write(",".join(items) + "\n")
                     if save:
                         cv2.imwrite(rects_folder + bubble, img)
         f.close()
+
+
+def get_speech_bubble_template(path):
+    """
+    Get a template's size from its header without decoding
+    it, for writing areas files written without them
+
+    :param path: Path of the speech bubble template
+
+    :type path: str
+
+    :return: The template's width, height and bounding box
+
+    :rtype: dict
+    """
+    with Image.open(path) as img:
+        w, h = img.size
+    return dict(width=w, height=h, bbox=(0, 0, w, h))
+
+
+def get_speech_bubble_templates(speech_bubbles):
+    """
+    Get the size of every template from their headers
+
+    :param speech_bubbles: Paths of the speech bubble templates
+
+    :type speech_bubbles: list
+
+    :return: Width, height and bounding box by path
+
+    :rtype: dict
+    """
+    return {path: get_speech_bubble_template(path) for path in speech_bubbles}
+
+
+def load_speech_bubbles_writing_areas(file):
+    """
+    Load the writing areas of the speech bubbles and the size of
+    their templates. Files written before the sizes were stored
+    get them from the templates' headers
+
+    :param file: Path of the writing areas file
+
+    :type file: str
+
+    :return: The writing areas and the templates by path
+
+    :rtype: tuple
+    """
+    writing_areas = []
+    templates = {}
+    with open(file) as f:
+        for line in f.readlines():
+            items = line.strip().split(",")
+            path, x, y, w, h = items[:5]
+            writing_areas.append({
+                "path": path,
+                "width": int(w),
+                "height": int(h),
+                "x": int(x),
+                "y": int(y),
+            })
+            if path in templates:
+                continue
+            if len(items) >= 11:
+                size = [int(v) for v in items[5:11]]
+                templates[path] = dict(width=size[0], height=size[1],
+                                       bbox=tuple(size[2:]))
+            else:
+                templates[path] = get_speech_bubble_template(path)
+    return writing_areas, templates
@@ -0,0 +1,212 @@
+import os
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import paths
+
+
+class TextStore(object):
+    """
+    The texts speech bubbles are filled with, a column per language.
+    Stores opened from a file memory-map it so every process reads
+    the same pages of the file instead of its own copy and only
+    the filename is pickled when the store is sent to a worker
+
+    :param table: Texts with a column per language
+
+    :type table: pyarrow.Table
+
+    :param filename: Arrow file the table is mapped from
+
+    :type filename: str, optional
+    """
+
+    def __init__(self, table, filename=None):
+        """
+        Constructor method
+        """
+        self.table = table
+        self.filename = filename
+        self.languages = table.column_names
+
+        # Strings are sliced from the arrays' offsets and data
+        # without going through Arrow for every text
+        self.buffers = []
+        for language in self.languages:
+            column = table.column(language)
+            # Mapped files have a single chunk which is used as is
+            if column.num_chunks == 1:
+                column = column.chunk(0)
+            else:
+                column = column.combine_chunks()
+            if column.type != pa.large_string():
+                column = column.cast(pa.large_string())
+            if column.null_count:
+                column = pc.fill_null(column, "")
+            _, offsets, data = column.buffers()
+            offsets = np.frombuffer(offsets, dtype=np.int64)
+            offsets = offsets[column.offset:column.offset + len(column) + 1]
+            data = memoryview(data) if data is not None else memoryview(b"")
+            self.buffers.append((offsets, data))
+
+    def __len__(self):
+        return self.table.num_rows
+
+    def __reduce__(self):
+        if self.filename is None:
+            return (TextStore, (self.table,))
+        return (open_text_store, (self.filename,))
+
+    @classmethod
+    def from_dataframe(cls, texts):
+        """
+        Get a store of texts held in memory
+
+        :param texts: Texts with a column per language
+
+        :type texts: pandas.DataFrame
+
+        :return: The store
+
+        :rtype: TextStore
+        """
+        return cls(pa.Table.from_pandas(texts, preserve_index=False))
+
+    def get_texts(self, text_indices):
+        """
+        Pick texts in every language, only the picked
+        strings are copied out of the store
+
+        :param text_indices: Indices of the texts
+
+        :type text_indices: list
+
+        :return: The texts as dictionaries by language
+
+        :rtype: list
+        """
+        texts = [{} for _ in text_indices]
+        for language, (offsets, data) in zip(self.languages, self.buffers):
+            for text, index in zip(texts, text_indices):
+                text[language] = str(data[offsets[index]:offsets[index + 1]],
+                                     "utf-8")
+        return texts
+
+
+def create_text_store(source=None, filename=None):
+    """
+    Write the texts of the text dataset to an uncompressed Arrow
+    file which can be memory-mapped. Every language is a single
+    array of large strings so the file's size isn't bounded
+
+    :param source: Parquet file or folder of the texts, defaults
+    to paths.DATASET_TEXT_JESC_DIALOGUES_FOLDER
+
+    :type source: str, optional
+
+    :param filename: Where to write the store, defaults
+    to paths.DATASET_TEXT_STORE_FILE
+
+    :type filename: str, optional
+    """
+    if source is None:
+        source = paths.DATASET_TEXT_JESC_DIALOGUES_FOLDER
+    if filename is None:
+        filename = paths.DATASET_TEXT_STORE_FILE
+
+    # Imported here since pyarrow.dataset imports pandas which
+    # takes longer than everything generation reads the store for
+    import pyarrow.dataset as ds
+
+    dataset = ds.dataset(source, format="parquet")
+    languages = [language for language in paths.LANGUAGES_SUPPORTED
+                 if language in dataset.schema.names]
+    table = dataset.to_table(columns=languages)
+    schema = pa.schema([(language, pa.large_string())
+                        for language in languages])
+    table = table.cast(schema).combine_chunks()
+
+    with pa.OSFile(filename, "wb") as sink:
+        with pa.ipc.new_file(sink, schema) as writer:
+            writer.write_table(table, max_chunksize=max(table.num_rows, 1))
+
+
+# Stores opened by this process by filename
+_text_stores = {}
+
+
+def open_text_store(filename=None):
+    """
+    Memory-map a store written by create_text_store, every
+    file is only mapped once per process
+
+    :param filename: Store file, defaults to
+    paths.DATASET_TEXT_STORE_FILE
+
+    :type filename: str, optional
+
+    :return: The store
+
+    :rtype: TextStore
+    """
+    if filename is None:
+        filename = paths.DATASET_TEXT_STORE_FILE
+    if filename not in _text_stores:
+        if not os.path.isfile(filename):
+            raise Exception("There's no text store at " + filename)
+        source = pa.memory_map(filename, "r")
+        table = pa.ipc.open_file(source).read_all()
+        _text_stores[filename] = TextStore(table, filename)
+    return _text_stores[filename]
+
+
+def load_text_store(source=None, filename=None):
+    """
+    Open the text store, it's created from the text dataset
+    first if it doesn't exist or is older than the dataset
+
+    :param source: Parquet file or folder of the texts, defaults
+    to paths.DATASET_TEXT_JESC_DIALOGUES_FOLDER
+
+    :type source: str, optional
+
+    :param filename: Store file, defaults to
+    paths.DATASET_TEXT_STORE_FILE
+
+    :type filename: str, optional
+
+    :return: The store
+
+    :rtype: TextStore
+    """
+    if source is None:
+        source = paths.DATASET_TEXT_JESC_DIALOGUES_FOLDER
+    if filename is None:
+        filename = paths.DATASET_TEXT_STORE_FILE
+
+    if os.path.isdir(source):
+        sources = [os.path.join(source, name) for name in os.listdir(source)]
+    else:
+        sources = [source]
+    modified = max([os.path.getmtime(path) for path in sources] + [0])
+    if not os.path.isfile(filename) or os.path.getmtime(filename) < modified:
+        _text_stores.pop(filename, None)
+        create_text_store(source, filename)
+    return open_text_store(filename)
+
+
+def as_text_store(texts):
+    """
+    Get the store of texts given as a store or a DataFrame
+
+    :param texts: Texts with a column per language
+
+    :type texts: TextStore or pandas.DataFrame
+
+    :return: The store
+
+    :rtype: TextStore
+    """
+    if isinstance(texts, TextStore):
+        return texts
+    return TextStore.from_dataframe(texts)
@@ -0,0 +1,399 @@
+import os
+import json
+import time
+import socket
+import sqlite3
+import threading
+import traceback
+import paths
+from . import config_file as cfg
+
+TASK_PENDING = "pending"
+TASK_LEASED = "leased"
+TASK_DONE = "done"
+TASK_FAILED = "failed"
+TASK_STATES = [TASK_PENDING, TASK_LEASED, TASK_DONE, TASK_FAILED]
+
+
+def get_worker_name():
+    """
+    Get a name for this process which tells it
+    apart from the workers of every host
+
+    :rtype: str
+    """
+    return socket.gethostname() + ":" + str(os.getpid())
+
+
+class WorkQueue(object):
+    """
+    A queue of page ranges in an SQLite database which workers
+    on any host that sees the file lease, generate and mark as
+    done. A leased range which isn't renewed before its lease
+    ends, because its worker crashed, is leased again. Every
+    range is claimed within a transaction so a range is only
+    leased by one worker at a time
+
+    :param filename: Database file, defaults to
+    paths.GENERATED_WORK_QUEUE_FILE. It must be on storage
+    with working file locks, e.g. a local disk for the workers
+    of a single machine
+
+    :type filename: str, optional
+    """
+
+    def __init__(self, filename=None):
+        """
+        Constructor method
+        """
+        if filename is None:
+            filename = paths.GENERATED_WORK_QUEUE_FILE
+        self.filename = filename
+        # Transactions are started explicitly
+        self.connection = sqlite3.connect(
+            filename, timeout=cfg.work_queue_busy_timeout,
+            isolation_level=None)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS run (config TEXT)")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS tasks ("
+            "id INTEGER PRIMARY KEY, start INTEGER, n INTEGER, "
+            "state TEXT, worker TEXT, lease_until REAL, "
+            "attempts INTEGER DEFAULT 0, created INTEGER, "
+            "failed INTEGER, error TEXT)")
+
+    def close(self):
+        self.connection.close()
+
+    def enqueue(self, run, n, task_size=None):
+        """
+        Split a run of pages into ranges of task_size pages
+
+        :param run: Options of the run every worker generates
+        the pages with, they must include its seed so workers
+        create the same pages
+
+        :type run: dict
+
+        :param n: Number of pages
+
+        :type n: int
+
+        :param task_size: Pages per range, defaults
+        to cfg.work_queue_task_size
+
+        :type task_size: int, optional
+
+        :return: Number of ranges
+
+        :rtype: int
+        """
+        if task_size is None:
+            task_size = cfg.work_queue_task_size
+        if run.get("seed") is None:
+            raise Exception("The workers of a queue need a seed "
+                            "to create the same pages")
+        with self.connection:
+            self.connection.execute("BEGIN IMMEDIATE")
+            if self.connection.execute(
+                    "SELECT COUNT(*) FROM run").fetchone()[0]:
+                raise Exception("The queue at " + self.filename +
+                                " already has a run, remove it first")
+            self.connection.execute("INSERT INTO run VALUES (?)",
+                                    (json.dumps(run),))
+            self.connection.executemany(
+                "INSERT INTO tasks (start, n, state) VALUES (?, ?, ?)",
+                [(start, min(task_size, n - start), TASK_PENDING)
+                 for start in range(0, n, task_size)])
+        return -(-n // task_size)
+
+    def get_run(self):
+        """
+        Get the options of the queue's run
+
+        :return: The options or None if nothing was enqueued
+
+        :rtype: dict
+        """
+        row = self.connection.execute("SELECT config FROM run").fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0])
+
+    def claim(self, worker, lease_seconds=None):
+        """
+        Lease the first range which is pending or whose lease ended.
+        Ranges which were leased cfg.work_queue_max_attempts times
+        without being done are marked as failed instead
+
+        :param worker: Name of the worker
+
+        :type worker: str
+
+        :param lease_seconds: Length of the lease, defaults
+        to cfg.work_queue_lease_seconds
+
+        :type lease_seconds: float, optional
+
+        :return: Id, first page and number of pages of
+        the range or None if there's none to lease
+
+        :rtype: tuple
+        """
+        if lease_seconds is None:
+            lease_seconds = cfg.work_queue_lease_seconds
+        now = time.time()
+        with self.connection:
+            self.connection.execute("BEGIN IMMEDIATE")
+            self.connection.execute(
+                "UPDATE tasks SET state = ?, error = ? WHERE state = ? "
+                "AND lease_until < ? AND attempts >= ?",
+                (TASK_FAILED, "The lease ended too many times",
+                 TASK_LEASED, now, cfg.work_queue_max_attempts))
+            task = self.connection.execute(
+                "SELECT id, start, n FROM tasks WHERE state = ? "
+                "OR (state = ? AND lease_until < ?) ORDER BY id LIMIT 1",
+                (TASK_PENDING, TASK_LEASED, now)).fetchone()
+            if task is not None:
+                self.connection.execute(
+                    "UPDATE tasks SET state = ?, worker = ?, lease_until = ?, "
+                    "attempts = attempts + 1 WHERE id = ?",
+                    (TASK_LEASED, worker, now + lease_seconds, task[0]))
+        return task
+
+    def renew(self, task_id, worker, lease_seconds=None):
+        """
+        Extend the lease of a range
+
+        :return: Whether the worker still holds the lease
+
+        :rtype: bool
+        """
+        if lease_seconds is None:
+            lease_seconds = cfg.work_queue_lease_seconds
+        cursor = self.connection.execute(
+            "UPDATE tasks SET lease_until = ? WHERE id = ? "
+            "AND worker = ? AND state = ?",
+            (time.time() + lease_seconds, task_id, worker, TASK_LEASED))
+        return cursor.rowcount == 1
+
+    def complete(self, task_id, worker, created, failed):
+        """
+        Mark a range as done with the number of pages
+        created and failed if the worker still holds it
+
+        :return: Whether the range was marked
+
+        :rtype: bool
+        """
+        cursor = self.connection.execute(
+            "UPDATE tasks SET state = ?, created = ?, failed = ? "
+            "WHERE id = ? AND worker = ? AND state = ?",
+            (TASK_DONE, created, failed, task_id, worker, TASK_LEASED))
+        return cursor.rowcount == 1
+
+    def release(self, task_id, worker, error):
+        """
+        Give up a range which raised, it's leased again until
+        it was leased cfg.work_queue_max_attempts times
+        """
+        self.connection.execute(
+            "UPDATE tasks SET state = CASE WHEN attempts < ? "
+            "THEN ? ELSE ? END, error = ? WHERE id = ? AND worker = ? "
+            "AND state = ?",
+            (cfg.work_queue_max_attempts, TASK_PENDING, TASK_FAILED,
+             error, task_id, worker, TASK_LEASED))
+
+    def get_counts(self):
+        """
+        Count the ranges in every state and the pages
+        created and failed by the done ones
+
+        :return: Counts by state, "pages_created" and "pages_failed"
+
+        :rtype: dict
+        """
+        counts = {state: 0 for state in TASK_STATES}
+        counts.update(self.connection.execute(
+            "SELECT state, COUNT(*) FROM tasks GROUP BY state").fetchall())
+        created, failed = self.connection.execute(
+            "SELECT TOTAL(created), TOTAL(failed) FROM tasks").fetchone()
+        counts["pages_created"] = int(created)
+        counts["pages_failed"] = int(failed)
+        return counts
+
+
+def keep_lease(filename, task_id, worker, stop):
+    """
+    Renew a lease until stop is set or the lease was lost,
+    runs in a thread next to the range's generation
+
+    :param stop: Set once the range is done
+
+    :type stop: threading.Event
+    """
+    queue = WorkQueue(filename)
+    while not stop.wait(cfg.work_queue_lease_seconds/3):
+        if not queue.renew(task_id, worker):
+            print("The lease of range " + str(task_id) + " ended, " +
+                  "it's generated again by another worker")
+            break
+    queue.close()
+
+
+def generate_range(run, assets, start, n):
+    """
+    Generate, render and segment a range of the run's pages,
+    streamed or metadata first the way the run was started
+
+    :param run: Options of the run as enqueued
+
+    :type run: dict
+
+    :param assets: Assets pages are generated from
+
+    :type assets: GenerationAssets
+
+    :param start: Index in the run of the range's first page
+
+    :type start: int
+
+    :param n: Number of pages of the range
+
+    :type n: int
+
+    :return: Number of pages created and failed
+
+    :rtype: tuple
+    """
+    from .layout_engine.pages_pipeline import create_pages
+    from .layout_engine.page_creator.create_page_metadata import (
+        create_pages_metadata, get_no_empty_writing_areas)
+    from .layout_engine.pages_renderer import render_pages
+
+    if run["stream"]:
+        return create_pages(n,
+                            assets.images,
+                            assets.fonts,
+                            assets.texts,
+                            assets.speech_bubbles,
+                            assets.speech_bubbles_writing_areas,
+                            run["language"],
+                            run["outputs"],
+                            speech_bubble_templates=assets.speech_bubble_templates,
+                            segmented=run["segmented"],
+                            dry=run["dry"],
+                            seed=run["seed"],
+                            start=start)
+
+    pages = create_pages_metadata(n,
+                                  assets.images,
+                                  assets.fonts,
+                                  assets.texts,
+                                  assets.speech_bubbles,
+                                  assets.speech_bubbles_writing_areas,
+                                  run["language"],
+                                  speech_bubble_templates=assets.speech_bubble_templates,
+                                  seed=run["seed"],
+                                  start=start)
+    speech_bubbles = list(get_no_empty_writing_areas(
+        assets.speech_bubbles_writing_areas))
+    failed = render_pages(pages, run["outputs"], segmented=run["segmented"],
+                          dry=run["dry"], speech_bubbles=speech_bubbles,
+                          speech_bubble_templates=assets.speech_bubble_templates)
+    return len(pages) - failed, n - len(pages) + failed
+
+
+def run_worker(filename=None, assets=None, worker=None):
+    """
+    Lease ranges of pages from the queue and generate, render and
+    segment them until every range is done or failed. Ranges
+    leased by other workers are waited for since their lease
+    may end. Pages of a range leased again are the same pages,
+    rendered files which exist are skipped
+
+    :param filename: Database file, defaults to
+    paths.GENERATED_WORK_QUEUE_FILE
+
+    :type filename: str, optional
+
+    :param assets: Assets pages are generated from, loaded
+    in the run's language if None
+
+    :type assets: GenerationAssets, optional
+
+    :param worker: Name of the worker, defaults to get_worker_name()
+
+    :type worker: str, optional
+
+    :return: Number of ranges this worker did
+
+    :rtype: int
+    """
+    # Imported here since the queue itself doesn't need the renderer
+    from .generation_assets import GenerationAssets
+
+    queue = WorkQueue(filename)
+    filename = queue.filename
+    if worker is None:
+        worker = get_worker_name()
+    run = queue.get_run()
+    if run is None:
+        raise Exception("There's no run in the queue at " + filename +
+                        ", enqueue one with --enqueue")
+    if assets is None:
+        assets = GenerationAssets(run["language"])
+    cfg.metadata_sink = run["metadata_sink"]
+    cfg.compositor = run["compositor"]
+    cfg.use_layout_bank = run["use_layout_bank"]
+    paths.makeFolders(paths.GENERATED_FOLDER_PATHS)
+
+    done = 0
+    while True:
+        task = queue.claim(worker)
+        if task is None:
+            counts = queue.get_counts()
+            if counts[TASK_PENDING] == 0 and counts[TASK_LEASED] == 0:
+                break
+            time.sleep(cfg.work_queue_poll_seconds)
+            continue
+
+        task_id, start, n = task
+        print("Generating pages " + str(start) + " to " + str(start + n) +
+              " of " + str(run["n"]) + "...")
+        stop = threading.Event()
+        lease = threading.Thread(target=keep_lease,
+                                 args=(filename, task_id, worker, stop),
+                                 daemon=True)
+        lease.start()
+        error = None
+        try:
+            created, failed = generate_range(run, assets, start, n)
+        except Exception:
+            error = traceback.format_exc(limit=1)
+        finally:
+            stop.set()
+            lease.join()
+
+        if error is not None:
+            print("We couldn't generate pages " + str(start) + " to " +
+                  str(start + n) + ": " + error)
+            queue.release(task_id, worker, error)
+        elif queue.complete(task_id, worker, created, failed):
+            done += 1
+    queue.close()
+    return done
+
+
+def print_work_queue_counts(counts):
+    """
+    Print how many ranges of the work queue are in every state
+
+    :param counts: Counts WorkQueue.get_counts returns
+
+    :type counts: dict
+    """
+    print("Ranges: " + ", ".join(str(counts[state]) + " " + state
+                                 for state in TASK_STATES))
+    print("Pages: " + str(counts["pages_created"]) + " created, " +
+          str(counts["pages_failed"]) + " failed")
@@ -0,0 +1,250 @@
+import os
+import random
+import numpy as np
+import pandas as pd
+import paths
+from preprocesing import config_file as cfg
+from PIL import Image, ImageDraw
+from fontTools.fontBuilder import FontBuilder
+from fontTools.pens.ttGlyphPen import TTGlyphPen
+
+from preprocesing.layout_engine.page_creator.create_page_panels_base import create_page_panels_base
+from preprocesing.layout_engine.page_creator.page_panels_transformers import add_transforms
+from preprocesing.layout_engine.page_creator.page_panels_shifters import shrink_panels
+from preprocesing.layout_engine.page_creator.create_speech_bubbles_metadata import create_speech_bubble_metadata
+from preprocesing.layout_engine.page_creator.bubble_placement import OccupancyGrid
+from preprocesing.speech_bubble_writing_area import get_speech_bubble_templates
+from preprocesing.layout_engine.helpers import get_leaf_panels
+
+
+def make_illustrations(folder, count=8, seed=0, min_size=400, max_size=1000):
+    """
+    Write synthetic black and white illustrations and their
+    colored twins with black borders to crop, mirroring the
+    bw/ and colored/ trees of the illustration dataset
+
+    :param folder: Folder to create the bw/ and colored/ trees in
+
+    :type folder: str
+
+    :param count: Number of illustrations to write
+
+    :type count: int, optional
+
+    :param min_size: Minimum width and height of the illustrations
+
+    :type min_size: int, optional
+
+    :param max_size: Maximum width and height of the illustrations
+
+    :type max_size: int, optional
+
+    :return: Paths of the black and white illustrations
+
+    :rtype: list
+    """
+    rng = np.random.RandomState(seed)
+    images = []
+    for tree in ["bw", "colored"]:
+        os.makedirs(os.path.join(folder, tree, "0"), exist_ok=True)
+
+    for i in range(count):
+        w = rng.randint(min_size, max_size)
+        h = rng.randint(min_size, max_size)
+
+        # Smooth noise compresses and resizes like a real picture
+        small = rng.randint(0, 255, (h // 16, w // 16, 3), dtype=np.uint8)
+        colored = Image.fromarray(small).resize((w, h), Image.BICUBIC)
+        array = np.array(colored)
+        array[:rng.randint(1, 30)] = 0
+        array[:, -rng.randint(1, 30):] = 0
+        colored = Image.fromarray(array)
+
+        path = os.path.join(folder, "bw", "0", str(i) + ".jpg")
+        colored.convert("L").save(path, "JPEG")
+        colored.save(path.replace(os.sep + "bw" + os.sep,
+                                  os.sep + "colored" + os.sep), "JPEG")
+        images.append(path)
+
+    return images
+
+
+def make_pages(n, images, num_panels=None, seed=0):
+    """
+    Create pages with transformed and shrunk panels which are
+    filled with the given illustrations but have no speech bubbles
+
+    :param n: Number of pages
+
+    :type n: int
+
+    :param images: Paths to pick the panel illustrations from
+
+    :type images: list
+
+    :param num_panels: Number of panels per page, random if None
+
+    :type num_panels: int, optional
+
+    :return: List of Page objects
+
+    :rtype: list
+    """
+    np.random.seed(seed)
+    random.seed(seed)
+    pages = []
+    for i in range(n):
+        panels = num_panels or np.random.randint(2, 9)
+        page = create_page_panels_base(panels, "vh")
+        page = add_transforms(page)
+        page = shrink_panels(page)
+        leaves = []
+        get_leaf_panels(page, leaves)
+        for j, panel in enumerate(leaves):
+            panel.image = images[(i + j) % len(images)]
+        pages.append(page)
+    return pages
+
+
+def make_texts(folder, rows, seed=0):
+    """
+    Write a Parquet text dataset like the JESC dialogues with
+    an English and a Japanese column
+
+    :param folder: Folder to write the dataset's folder in
+
+    :type folder: str
+
+    :param rows: Number of texts
+
+    :type rows: int
+
+    :return: Folder of the dataset
+
+    :rtype: str
+    """
+    rng = np.random.RandomState(seed)
+    words = np.array(["hello", "there", "what", "is", "going", "on", "no",
+                      "way", "we", "need", "to", "leave", "right", "now"])
+    lengths = rng.randint(2, 12, rows)
+    english = [" ".join(words[rng.randint(0, len(words), length)])
+               for length in lengths]
+    japanese = ["こんにちは" * (length // 2 + 1) for length in lengths]
+    source = os.path.join(folder, "jesc_dialogues")
+    os.makedirs(source)
+    pd.DataFrame({paths.ENGLISH_LANGUAGE: english,
+                  paths.JAPANASE_LANGUAGE: japanese}).to_parquet(
+        os.path.join(source, "part.0.parquet"))
+    return source
+
+
+def make_font(path):
+    """
+    Write a TrueType font whose printable ASCII glyphs are boxes
+    so text can be rendered without any font files installed
+
+    :param path: Where to write the font
+
+    :type path: str
+
+    :return: The font's path
+
+    :rtype: str
+    """
+    glyph_order = [".notdef"] + ["glyph%d" % code for code in range(32, 127)]
+    cmap = {code: "glyph%d" % code for code in range(32, 127)}
+
+    glyphs = {}
+    for name in glyph_order:
+        pen = TTGlyphPen(None)
+        if name != "glyph32":
+            pen.moveTo((50, 0))
+            pen.lineTo((50, 700))
+            pen.lineTo((450, 700))
+            pen.lineTo((450, 0))
+            pen.closePath()
+        glyphs[name] = pen.glyph()
+
+    builder = FontBuilder(1000, isTTF=True)
+    builder.setupGlyphOrder(glyph_order)
+    builder.setupCharacterMap(cmap)
+    builder.setupGlyf(glyphs)
+    builder.setupHorizontalMetrics({name: (500, 50) for name in glyph_order})
+    builder.setupHorizontalHeader(ascent=800, descent=-200)
+    builder.setupNameTable({"familyName": "Boxes", "styleName": "Regular"})
+    builder.setupOS2(sTypoAscender=800, usWinAscent=800, usWinDescent=200)
+    builder.setupPost()
+    builder.save(path)
+    return path
+
+
+def make_speech_bubbles(folder, count=4):
+    """
+    Write speech bubble templates with a writing area each
+
+    :param folder: Folder to write the templates to
+
+    :type folder: str
+
+    :param count: Number of templates
+
+    :type count: int, optional
+
+    :return: Writing areas of the templates in the format
+    main.py loads them in
+
+    :rtype: list
+    """
+    writing_areas = []
+    os.makedirs(folder, exist_ok=True)
+    for i in range(count):
+        w, h = 300 + 40*i, 200 + 30*i
+        img = Image.new("RGBA", (w, h), (0, 0, 0, 0))
+        draw = ImageDraw.Draw(img)
+        draw.ellipse((4, 4, w - 5, h - 5), fill=(255, 255, 255, 255),
+                     outline=(0, 0, 0, 255), width=4)
+        path = os.path.join(folder, "bubble%d.png" % i)
+        img.save(path)
+        writing_areas.append(dict(path=path, width=3*w//5, height=h//2,
+                                  x=w//5, y=h//4))
+    return writing_areas
+
+
+def add_speech_bubbles(pages, writing_areas, font, seed=0, per_panel=2):
+    """
+    Add speech bubbles with English and Japanese text to every
+    rendered panel of the pages
+
+    :param pages: Pages to add the bubbles to
+
+    :type pages: list
+
+    :param writing_areas: Writing areas of the bubble templates
+
+    :type writing_areas: list
+
+    :param font: Path of the font to write with
+
+    :type font: str
+
+    :param per_panel: Number of bubbles to try to place per panel
+
+    :type per_panel: int, optional
+    """
+    rng = np.random.RandomState(seed)
+    templates = get_speech_bubble_templates(
+        set(area["path"] for area in writing_areas))
+    words = ["hello there", "what is going on", "no way",
+             "we need to leave right now", "I can't believe it"]
+    for page in pages:
+        occupancy = OccupancyGrid(cfg.page_width, cfg.page_height)
+        panels = page.leaf_children if page.num_panels > 1 else [page]
+        for panel in panels:
+            for _ in range(per_panel):
+                area = writing_areas[rng.randint(len(writing_areas))]
+                text = {paths.ENGLISH_LANGUAGE: words[rng.randint(len(words))],
+                        paths.JAPANASE_LANGUAGE: "こんにちは"}
+                create_speech_bubble_metadata(
+                    panel, (area["path"], font, [pd.Series(text)], [0], [area],
+                            templates[area["path"]]),
+                    occupancy, paths.ENGLISH_LANGUAGE)
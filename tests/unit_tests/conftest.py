@@ -0,0 +1,30 @@
+import pytest
+from tests.factories import make_illustrations, make_speech_bubbles, make_font
+
+
+@pytest.fixture(scope="module")
+def illustrations(tmp_path_factory):
+    """
+    Synthetic black and white illustrations with colored twins
+
+    :return: Paths of the black and white illustrations
+
+    :rtype: list
+    """
+    folder = tmp_path_factory.mktemp("illustrations")
+    return make_illustrations(str(folder))
+
+
+@pytest.fixture(scope="module")
+def speech_bubble_files(tmp_path_factory):
+    """
+    Synthetic speech bubble templates and a font to write with
+
+    :return: Writing areas of the templates and the font's path
+
+    :rtype: tuple
+    """
+    folder = tmp_path_factory.mktemp("speech_bubbles")
+    writing_areas = make_speech_bubbles(str(folder))
+    font = make_font(str(folder / "font.ttf"))
+    return writing_areas, font
@@ -0,0 +1,76 @@
+import os
+from PIL import Image
+
+import paths
+from tests.factories import make_illustrations, make_speech_bubbles
+from preprocesing import generation_assets
+from preprocesing.asset_manifest import build_manifest, load_asset_manifest
+from preprocesing.generation_assets import GenerationAssets, list_images
+
+
+def make_dataset():
+    """
+    Write illustrations, speech bubbles with their writing
+    areas and viable fonts where the manifest indexes them
+
+    :return: Paths of the black and white illustrations
+
+    :rtype: list
+    """
+    images = make_illustrations(paths.DATASET_IMAGES_DANBOORU_IMAGES_FOLDER,
+                                count=3, min_size=64, max_size=128)
+    os.remove(images[1].replace(os.sep + "bw" + os.sep,
+                                os.sep + "colored" + os.sep))
+    with open(os.path.join(os.path.dirname(images[0]), "broken.jpg"), "w") as f:
+        f.write("not an image")
+
+    writing_areas = make_speech_bubbles(paths.DATASET_IMAGES_SPEECH_BUBBLES_FOLDER,
+                                        count=2)
+    with open(paths.DATASET_IMAGES_SPEECH_BUBBLES_WRITING_AREAS_FILE, "w") as f:
+        for area in writing_areas:
+            f.write("%s,%d,%d,%d,%d\n" % (area["path"], area["x"], area["y"],
+                                          area["width"], area["height"]))
+
+    os.makedirs(paths.DATASET_FONTS_FOLDER)
+    with open(paths.DATASET_FONTS_VIABLE_FONTS_FILE, "w") as f:
+        f.write("a.ttf,True,True\nb.ttf,False,True\nc.ttf,True,False\n")
+    return images
+
+
+def test_asset_manifest(tmp_path, monkeypatch):
+    """
+    The manifest should index the assets, only index changed
+    illustrations again and be what generation loads
+    """
+    monkeypatch.chdir(tmp_path)
+    images = make_dataset()
+
+    manifest, indexed = build_manifest()
+    assert indexed == 4
+    # The broken illustration is left out
+    assert manifest.images == sorted(images)
+    assert len(list_images()) == 4
+    for image, size in zip(manifest.images, manifest.image_sizes.tolist()):
+        assert tuple(size) == Image.open(image).size
+    assert manifest.image_colored.tolist() == [True, False, True]
+    assert len(manifest.writing_areas) == 2
+    assert sorted(manifest.speech_bubble_templates) == manifest.speech_bubbles
+    assert manifest.get_fonts(paths.ENGLISH_LANGUAGE) == ["a.ttf", "b.ttf"]
+    assert manifest.get_fonts(paths.JAPANASE_LANGUAGE) == ["a.ttf", "c.ttf"]
+    assert manifest.get_fonts(paths.ALL_LANGUAGE) == ["a.ttf"]
+
+    # Only the broken and the changed illustrations are read again
+    assert build_manifest()[1] == 1
+    Image.new("L", (40, 30)).save(images[2], "JPEG")
+    os.utime(images[2], ns=(0, 0))
+    manifest, indexed = build_manifest()
+    assert indexed == 2
+    assert manifest.image_sizes[2].tolist() == [40, 30]
+
+    def list_images_walking():
+        raise Exception("The manifest's illustrations should be used")
+    monkeypatch.setattr(generation_assets, "list_images", list_images_walking)
+    assets = GenerationAssets(paths.ENGLISH_LANGUAGE)
+    assert assets.images == load_asset_manifest().images
+    assert assets.fonts == ["a.ttf", "b.ttf"]
+    assert assets.speech_bubbles_writing_areas == manifest.writing_areas
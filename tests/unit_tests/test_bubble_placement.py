@@ -0,0 +1,62 @@
+import numpy as np
+
+from tests.factories import make_pages, add_speech_bubbles
+from preprocesing.layout_engine.page_creator.bubble_placement import (
+    OccupancyGrid,
+    placement_stats
+)
+
+
+def overlap(r1, r2):
+    return (r1[0] + r1[2] >= r2[0] and r1[0] <= r2[0] + r2[2] and
+            r1[1] + r1[3] >= r2[1] and r1[1] <= r2[1] + r2[3])
+
+
+def test_occupancy_grid():
+    """
+    Positions drawn from the grid should be in range and never
+    overlap, and the grid should only run out once no room is left
+    """
+    random = np.random.RandomState(0)
+    grid = OccupancyGrid(400, 300, cell_size=8)
+    placed = []
+    for _ in range(200):
+        w, h = random.randint(10, 80, 2)
+        x_range = (random.randint(-20, 200), random.randint(200, 420))
+        location = grid.sample(x_range, (0, 300), w, h, random)
+        if location is None:
+            continue
+        x, y = location
+        assert x_range[0] <= x <= x_range[1]
+        assert x >= 0 and y >= 0 and x + w <= 400 and y + h <= 300
+        rect = (x, y, w, h)
+        assert not any(overlap(rect, other) for other in placed)
+        grid.add(*rect)
+        placed.append(rect)
+    assert len(placed) > 10
+
+    # Only the right quarter of the page is free
+    grid = OccupancyGrid(400, 300, cell_size=8)
+    grid.add(0, 0, 299, 299)
+    assert grid.sample((0, 400), (0, 300), 120, 50, random) is None
+    for _ in range(20):
+        x, y = grid.sample((0, 400), (0, 300), 80, 50, random)
+        assert x > 299 and x + 80 <= 400
+
+
+def test_placement_stats(illustrations, speech_bubble_files):
+    """
+    Every bubble tried should be counted as placed or failed
+    """
+    writing_areas, font = speech_bubble_files
+    pages = make_pages(10, illustrations, num_panels=3, seed=5)
+    placement_stats.clear()
+    add_speech_bubbles(pages, writing_areas, font, seed=5, per_panel=2)
+
+    stats = placement_stats.get_stats()
+    placed = sum(len(panel.speech_bubbles) for page in pages
+                 for panel in page.leaf_children)
+    tried = sum(len(page.leaf_children) for page in pages)*2
+    assert stats["bubbles_placed"] == placed > 0
+    assert stats["bubbles_placed"] + stats["bubbles_failed"] == tried
+    assert stats["placement_seconds"] > 0
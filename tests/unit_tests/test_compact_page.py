@@ -0,0 +1,131 @@
+import os
+import json
+import pickle
+import numpy as np
+
+import paths
+from preprocesing.layout_engine.render_engine import RENDER_BW, RENDER_COLORED
+from preprocesing.layout_engine.objects.compact_page import CompactPage
+from tests.factories import make_pages, add_speech_bubbles
+from test_page_seeds import get_assets
+from preprocesing.layout_engine.page_creator.create_page_metadata import create_pages_metadata
+
+
+def to_float32(data):
+    """
+    Round the coordinates of a page's metadata like
+    the compact page's vertices are
+
+    :param data: Metadata of a page or of a panel
+
+    :type data: dict
+
+    :return: The metadata
+    :rtype: dict
+    """
+    if "coordinates" in data:
+        data["coordinates"] = np.float32(data["coordinates"]).tolist()
+    for child in data["children"]:
+        to_float32(child)
+    return json.loads(json.dumps(data))
+
+
+def test_compact_page(illustrations, speech_bubble_files):
+    """
+    A compacted page should have the page's metadata, rebuild
+    the same page and render the same images
+
+    :param illustrations: Paths of the illustrations
+
+    :type illustrations: list
+
+    :param speech_bubble_files: Writing areas and font of the bubbles
+
+    :type speech_bubble_files: tuple
+    """
+    writing_areas, font = speech_bubble_files
+    pages = make_pages(6, illustrations, seed=3)
+    add_speech_bubbles(pages, writing_areas, font, seed=3)
+
+    pickled = compact_pickled = 0
+    for page in pages:
+        compact = CompactPage(page)
+        metadata = to_float32(page.get_metadata())
+        assert to_float32(compact.get_metadata()) == metadata
+        assert to_float32(compact.to_page().get_metadata()) == metadata
+
+        # The rebuilt page is compacted into the same arrays
+        again = CompactPage(compact.to_page())
+        for name, value in vars(compact).items():
+            if isinstance(value, np.ndarray):
+                assert np.array_equal(getattr(again, name), value,
+                                      equal_nan=value.dtype.kind == "f")
+            else:
+                assert getattr(again, name) == value
+
+        images = page.render_outputs([RENDER_BW, RENDER_COLORED])
+        compact_images = compact.render_outputs([RENDER_BW, RENDER_COLORED])
+        for output, image in images.items():
+            assert (np.asarray(compact_images[output]) ==
+                    np.asarray(image)).mean() > 0.999
+
+        pickled += len(pickle.dumps(page, pickle.HIGHEST_PROTOCOL))
+        compact_pickled += len(pickle.dumps(compact, pickle.HIGHEST_PROTOCOL))
+
+    assert compact_pickled < pickled/1.5
+
+
+def test_compact_pages_metadata(illustrations, speech_bubble_files,
+                                tmp_path, monkeypatch):
+    """
+    The compacted pages create_pages_metadata gives should have
+    the same metadata as the files it dumped
+
+    :param illustrations: Paths of the illustrations
+
+    :type illustrations: list
+
+    :param speech_bubble_files: Writing areas and font of the bubbles
+
+    :type speech_bubble_files: tuple
+    """
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(paths.GENERATED_METADATA_FOLDER)
+
+    pages = create_pages_metadata(4, *get_assets(illustrations,
+                                                 speech_bubble_files),
+                                  seed=2)
+    for page in pages:
+        assert isinstance(page, CompactPage)
+        filename = paths.GENERATED_METADATA_FOLDER + page.name + ".json"
+        with open(filename) as f:
+            assert json.loads(page.dump_data(None)) == json.load(f)
+
+
+def test_slotted_objects(illustrations, speech_bubble_files):
+    """
+    Pages, panels and speech bubbles shouldn't have a __dict__
+    and should still pickle with every attribute
+
+    :param illustrations: Paths of the illustrations
+
+    :type illustrations: list
+
+    :param speech_bubble_files: Writing areas and font of the bubbles
+
+    :type speech_bubble_files: tuple
+    """
+    writing_areas, font = speech_bubble_files
+    page, = make_pages(1, illustrations, num_panels=4, seed=1)
+    add_speech_bubbles([page], writing_areas, font, seed=1)
+    panel = page.leaf_children[0]
+    speech_bubble = next(bubble for child in page.leaf_children
+                         for bubble in child.speech_bubbles)
+
+    for obj in (page, panel, speech_bubble):
+        assert not hasattr(obj, "__dict__")
+    assert panel.lines[1] == (panel.x2y2, panel.x3y3)
+
+    loaded = pickle.loads(pickle.dumps(page))
+    assert loaded.get_metadata() == page.get_metadata()
+    assert len(loaded.leaf_children) == len(page.leaf_children)
@@ -0,0 +1,171 @@
+import os
+import pytest
+import numpy as np
+
+import paths
+from preprocesing import config_file as cfg
+from preprocesing.multiprocessing import (
+    EXECUTORS_AVAILABLE,
+    EXECUTOR_INLINE,
+    EXECUTOR_THREAD,
+    Executor,
+    get_chunksize,
+    sum_worker_stats
+)
+from preprocesing.layout_engine.render_engine import RENDER_BW
+from preprocesing.layout_engine.compositors import COMPOSITOR_NUMPY
+from tests.factories import make_pages
+from preprocesing.layout_engine.page_creator.layout_bank import create_layout_bank
+from preprocesing.layout_engine.pages_pipeline import create_pages
+from preprocesing.layout_engine.pages_renderer import render_pages
+from preprocesing.layout_engine.illustration_cache import illustration_cache
+from test_page_seeds import create_metadata, get_assets
+
+# Set by the workers' initializer
+_offset = None
+
+
+def init_offset(offset):
+    global _offset
+    _offset = offset
+
+
+def add_offset(x):
+    return x + _offset
+
+
+def render_bw(page):
+    return np.array(page.render_outputs([RENDER_BW])[RENDER_BW])
+
+
+@pytest.mark.parametrize("backend", EXECUTORS_AVAILABLE)
+@pytest.mark.parametrize("chunksize", [None, 1, 3])
+def test_executor_backends(backend, chunksize):
+    """
+    Every backend should run the initializer in its workers
+    and give the same results
+
+    :param backend: Backend of the executor
+
+    :type backend: str
+
+    :param chunksize: Elements sent to a worker at once
+
+    :type chunksize: int
+    """
+    executor = Executor(backend=backend, workers=2, chunksize=chunksize,
+                        initializer=init_offset, initargs=(10,))
+    assert sorted(executor.map(add_offset, range(20))) == list(range(10, 30))
+
+    results = executor.map(add_offset, range(20), ordered=True)
+    assert results == list(range(10, 30))
+
+
+def test_executor_settings(monkeypatch):
+    """
+    Executors should take their settings from the config
+    and refuse unknown backends
+    """
+    monkeypatch.setattr(cfg, "pool_workers", None)
+    monkeypatch.setattr(cfg, "pool_maxtasksperchild", 5)
+    executor = Executor()
+    assert executor.workers == os.cpu_count()
+    assert executor.maxtasksperchild == 5
+
+    with pytest.raises(Exception):
+        Executor(backend="cluster")
+    with pytest.raises(Exception):
+        Executor(workers=0)
+
+    assert get_chunksize(None, 4) == 1
+    assert get_chunksize(10, 4) == 1
+    assert get_chunksize(1000, 4) == 62
+
+
+def test_seeded_pages_inline(illustrations, speech_bubble_files,
+                             tmp_path, monkeypatch):
+    """
+    Seeded pages generated inline should be the same
+    as the ones generated by worker processes
+
+    :param illustrations: Paths of the illustrations
+
+    :type illustrations: list
+
+    :param speech_bubble_files: Writing areas and font of the bubbles
+
+    :type speech_bubble_files: tuple
+    """
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(paths.GENERATED_METADATA_FOLDER)
+    processes = create_metadata(4, 5, 0, illustrations, speech_bubble_files)
+
+    monkeypatch.setattr(cfg, "pool_backend", EXECUTOR_INLINE)
+    assert create_metadata(4, 5, 0, illustrations,
+                           speech_bubble_files) == processes
+
+
+def test_threaded_rendering(illustrations, monkeypatch):
+    """
+    Threads rendering with the NumPy compositor should
+    each draw into their own buffers
+
+    :param illustrations: Paths of the illustrations
+
+    :type illustrations: list
+    """
+    monkeypatch.setattr(cfg, "compositor", COMPOSITOR_NUMPY)
+    pages = make_pages(8, illustrations, num_panels=4)
+
+    inline = Executor(backend=EXECUTOR_INLINE).map(render_bw, pages,
+                                                   ordered=True)
+    threads = Executor(backend=EXECUTOR_THREAD, workers=4,
+                       chunksize=1).map(render_bw, pages, ordered=True)
+    for a, b in zip(inline, threads):
+        assert (a == b).all()
+
+
+def test_threaded_pages(illustrations, speech_bubble_files, tmp_path,
+                        monkeypatch):
+    """
+    Pages and layouts shouldn't be created with threads since
+    they share the random states pages are seeded with
+
+    :param illustrations: Paths of the illustrations
+
+    :type illustrations: list
+
+    :param speech_bubble_files: Writing areas and font of the bubbles
+
+    :type speech_bubble_files: tuple
+    """
+    monkeypatch.setattr(cfg, "pool_backend", EXECUTOR_THREAD)
+    with pytest.raises(Exception, match="thread backend"):
+        create_metadata(2, 3, 0, illustrations, speech_bubble_files)
+    with pytest.raises(Exception, match="thread backend"):
+        create_pages(2, *get_assets(illustrations, speech_bubble_files),
+                     [RENDER_BW], dry=True, seed=3)
+    with pytest.raises(Exception, match="thread backend"):
+        create_layout_bank(2, seed=3, bank_file=str(tmp_path / "bank"))
+
+
+def test_worker_stats(illustrations, monkeypatch):
+    """
+    Counters of workers should be summed from the highest counters
+    of every worker, also when threads sharing a pid report them
+    out of order, and count from 0 for every run
+
+    :param illustrations: Paths of the illustrations
+
+    :type illustrations: list
+    """
+    records = [dict(pid=1, hits=2, misses=1), dict(pid=2, hits=1, misses=0),
+               dict(pid=1, hits=5, misses=1), None,
+               dict(pid=1, hits=4, misses=2)]
+    assert sum_worker_stats(records) == dict(hits=6, misses=2)
+
+    monkeypatch.setattr(cfg, "pool_backend", EXECUTOR_INLINE)
+    monkeypatch.setattr(illustration_cache, "hits", 10)
+    monkeypatch.setattr(illustration_cache, "misses", 10)
+    render_pages(make_pages(2, illustrations), [RENDER_BW], dry=True)
+    assert (illustration_cache.hits, illustration_cache.misses) == (0, 0)
@@ -0,0 +1,67 @@
+import os
+import pytest
+from glob2 import glob
+
+import paths
+from preprocesing import generation_assets
+from preprocesing.generation_assets import (
+    GenerationAssets,
+    list_images,
+    load_viable_fonts
+)
+
+
+def test_list_images(tmp_path, monkeypatch):
+    """
+    The kept listing should be the sorted glob of the illustrations
+    and only be made again once their folders change
+    """
+    folder = str(tmp_path / "bw") + "/"
+    for subfolder, names in (("1", ["b.jpg", "a.jpg", "c.png"]),
+                             ("0", ["z.jpg"])):
+        os.makedirs(folder + subfolder)
+        for name in names:
+            open(os.path.join(folder, subfolder, name), "w").close()
+    list_file = str(tmp_path / "bw_images.txt")
+
+    images = list_images(folder, list_file)
+    assert images == sorted(glob(os.path.join(folder, "**", "*.jpg")))
+    assert len(images) == 3
+
+    def walk(folder):
+        raise Exception("The listing should be read from its file")
+    monkeypatch.setattr(generation_assets.os, "walk", walk)
+    assert list_images(folder, list_file) == images
+    monkeypatch.undo()
+
+    open(os.path.join(folder, "0", "y.jpg"), "w").close()
+    os.utime(list_file, (0, 0))
+    images = list_images(folder, list_file)
+    assert len(images) == 4 and images[0].endswith("y.jpg")
+    assert list_images(str(tmp_path / "missing"), list_file) == []
+
+
+def test_generation_assets(tmp_path, monkeypatch):
+    """
+    Assets should only be loaded once they're used and missing
+    files should be reported instead of giving no assets
+    """
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(paths.DATASET_FONTS_FOLDER)
+    with open(paths.DATASET_FONTS_VIABLE_FONTS_FILE, "w") as f:
+        f.write("a.ttf,True,True\nb.ttf,False,True\n")
+
+    def load_text_store():
+        raise Exception("The texts shouldn't be loaded")
+    monkeypatch.setattr(generation_assets, "load_text_store", load_text_store)
+
+    assets = GenerationAssets(paths.JAPANASE_LANGUAGE)
+    assert assets.manifest is None
+    assert assets.images == []
+    assert assets.fonts == ["a.ttf"]
+    assert load_viable_fonts(paths.ENGLISH_LANGUAGE) == ["a.ttf", "b.ttf"]
+    with pytest.raises(Exception, match="calculate_writing_areas"):
+        assets.speech_bubbles_writing_areas
+    os.remove(paths.DATASET_FONTS_VIABLE_FONTS_FILE)
+    with pytest.raises(Exception, match="verify_fonts"):
+        GenerationAssets(paths.ENGLISH_LANGUAGE).fonts
@@ -0,0 +1,95 @@
+import os
+import numpy as np
+
+import paths
+from preprocesing import config_file as cfg
+from preprocesing.layout_engine.page_creator.page_plans import plan_pages, get_page_plan
+from preprocesing.layout_engine.page_creator.create_page_metadata import (
+    create_inital_page_metadata,
+    create_pages_metadata
+)
+from preprocesing.layout_engine.page_creator.layout_bank import (
+    LayoutBank,
+    create_layout_bank,
+    load_layout_bank,
+    mirror_layout
+)
+from test_page_seeds import get_assets, read_metadata
+
+
+def get_signed_area(coords):
+    x, y = np.array(coords, dtype=np.float64).T
+    return (x*np.roll(y, -1) - np.roll(x, -1)*y).sum()/2
+
+
+def test_layout_bank(tmp_path, monkeypatch):
+    """
+    The i-th layout of a bank should be the layout the i-th page
+    of a run with the bank's seed gets and should load back
+    """
+    bank_file = str(tmp_path / "layout_bank.pkl")
+    bank = create_layout_bank(40, seed=6, bank_file=bank_file)
+    assert sum(count for count, _ in bank.get_coverage().values()) == 40
+
+    plans = plan_pages(6, 0, 40, 10, 10, 10, 10, 3)
+    for i in range(0, 40, 7):
+        page_plan = dict(get_page_plan(plans, i),
+                         num_panels=bank.num_panels[i],
+                         page_type=bank.page_types[i],
+                         transform=bank.transforms[i])
+        page = create_inital_page_metadata((page_plan, 10, 10, 10, (6, i)))[0]
+        assert np.array_equal(page.vertices, bank.layouts[i].vertices)
+        assert page.get_metadata() == bank.layouts[i].get_metadata()
+
+    loaded = LayoutBank.load(bank_file)
+    assert loaded.get_coverage() == bank.get_coverage()
+    assert np.array_equal(loaded.page_types, bank.page_types)
+
+    # Mirrored layouts stay in the page with their panels' winding
+    mirrored = set()
+    for layout in bank.layouts:
+        vertices = mirror_layout(layout)
+        assert (vertices[:, 0] >= 0).all()
+        assert (vertices[:, 0] <= cfg.page_width).all()
+        offsets = layout.offsets
+        for i in range(len(offsets) - 1):
+            coords = layout.vertices[offsets[i]:offsets[i + 1]]
+            assert np.sign(get_signed_area(coords)) == np.sign(
+                get_signed_area(vertices[offsets[i]:offsets[i + 1]]))
+        mirrored.add(vertices.tobytes())
+
+    monkeypatch.setattr(cfg, "layout_bank_mirror_chance", 1.0)
+    for num_panels, page_type in bank.groups:
+        page = bank.sample(num_panels, page_type, "mirrored")
+        assert page.get_panel_names()[0] == "mirrored"
+        assert page.vertices.tobytes() in mirrored
+    assert bank.sample(9, "v", "missing") is None
+
+
+def test_pages_from_layout_bank(illustrations, speech_bubble_files,
+                                tmp_path, monkeypatch):
+    """
+    Pages taking their layouts from a bank should only use its
+    layouts and be the same every time they're generated
+    """
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(os.path.dirname(paths.DATASET_LAYOUT_BANK_FILE))
+    bank = create_layout_bank(30, seed=2)
+    load_layout_bank()
+    monkeypatch.setattr(cfg, "use_layout_bank", True)
+    monkeypatch.setattr(cfg, "layout_bank_mirror_chance", 0.0)
+
+    layouts = set(layout.vertices.tobytes() for layout in bank.layouts)
+    assets = get_assets(illustrations, speech_bubble_files)
+    metadata = []
+    for run in ("first", "second"):
+        os.makedirs(os.path.join(run, paths.GENERATED_METADATA_FOLDER))
+        monkeypatch.chdir(run)
+        pages = create_pages_metadata(8, *assets, seed=5)
+        metadata.append(read_metadata())
+        monkeypatch.chdir("..")
+
+    assert metadata[0] == metadata[1]
+    for page in pages:
+        if len(bank.groups.get((page.num_panels, page.page_type), ())):
+            assert page.vertices.tobytes() in layouts
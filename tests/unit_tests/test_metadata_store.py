@@ -0,0 +1,148 @@
+import os
+import json
+import shutil
+import pytest
+
+import paths
+from preprocesing import config_file as cfg
+from preprocesing.layout_engine import metadata_store, pages_pipeline
+from preprocesing.layout_engine.metadata_store import (
+    MetadataStore,
+    convert_metadata,
+    read_page_metadata,
+    METADATA_SINK_JSON,
+    METADATA_SINK_PARQUET
+)
+from preprocesing.layout_engine.objects.page import Page
+from preprocesing.layout_engine.page_creator.create_page_metadata import create_pages_metadata
+from preprocesing.layout_engine.pages_pipeline import create_pages
+from preprocesing.layout_engine.render_engine import RENDER_BW
+from test_page_seeds import get_assets, read_metadata
+
+
+def test_parquet_metadata_sink(illustrations, speech_bubble_files,
+                               tmp_path, monkeypatch):
+    """
+    Pages stored in Parquet shards should have the metadata of the
+    JSON files, whether they're created in stages or streamed, and
+    convert back to the same files
+    """
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(metadata_store, "_metadata_store", None)
+    os.makedirs(paths.GENERATED_METADATA_FOLDER)
+    assets = get_assets(illustrations, speech_bubble_files)
+
+    pages = create_pages_metadata(7, *assets, seed=4)
+    files = read_metadata()
+    shutil.rmtree(paths.GENERATED_METADATA_FOLDER)
+    os.makedirs(paths.GENERATED_METADATA_FOLDER)
+
+    # Small shards and row groups so pages span several of each
+    monkeypatch.setattr(cfg, "metadata_sink", METADATA_SINK_PARQUET)
+    monkeypatch.setattr(cfg, "metadata_shard_size", 4)
+    monkeypatch.setattr(cfg, "metadata_row_group_size", 2)
+    create_pages_metadata(7, *assets, seed=4)
+    shards = os.listdir(paths.GENERATED_METADATA_FOLDER)
+    assert len(shards) == 2
+    assert all(shard.endswith(".parquet") for shard in shards)
+
+    store = MetadataStore()
+    assert len(store) == 7
+    streamed = dict(store)
+    for page in pages:
+        filename = page.name + cfg.metadata_format
+        assert streamed[page.name] == json.loads(files[filename])
+        assert store.get(page.name) == streamed[page.name]
+        assert read_page_metadata(page.name) == streamed[page.name]
+    assert store.get("missing") is None
+
+    assert convert_metadata(METADATA_SINK_JSON) == 7
+    assert read_metadata() == files
+
+    # Pages streamed through the pipeline are written by the parent
+    shutil.rmtree(paths.GENERATED_METADATA_FOLDER)
+    os.makedirs(paths.GENERATED_METADATA_FOLDER)
+    assert create_pages(7, *assets, [RENDER_BW], dry=True, seed=4) == (7, 0)
+    assert dict(MetadataStore()) == streamed
+
+
+def test_interrupted_parquet_sink(illustrations, speech_bubble_files,
+                                  tmp_path, monkeypatch):
+    """
+    Pages streamed before the pool failed should be
+    left in readable Parquet shards
+    """
+    def imap_pool(*args, **kwargs):
+        for i, status in enumerate(real_imap_pool(*args, **kwargs)):
+            if i == 3:
+                raise KeyboardInterrupt
+            yield status
+
+    real_imap_pool = pages_pipeline.imap_pool
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(metadata_store, "_metadata_store", None)
+    monkeypatch.setattr(cfg, "metadata_sink", METADATA_SINK_PARQUET)
+    monkeypatch.setattr(cfg, "metadata_row_group_size", 2)
+    monkeypatch.setattr(pages_pipeline, "imap_pool", imap_pool)
+    os.makedirs(paths.GENERATED_METADATA_FOLDER)
+    assets = get_assets(illustrations, speech_bubble_files)
+
+    with pytest.raises(KeyboardInterrupt):
+        create_pages(6, *assets, [RENDER_BW], dry=True, seed=4)
+    assert len(MetadataStore()) == 3
+
+
+def test_metadata_store_listing(illustrations, speech_bubble_files,
+                                tmp_path, monkeypatch):
+    """
+    Pages in JSON files should be read without listing the folder
+    and pages stored twice in shards should be streamed once
+    """
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(metadata_store, "_metadata_store", None)
+    os.makedirs(paths.GENERATED_METADATA_FOLDER)
+    assets = get_assets(illustrations, speech_bubble_files)
+    pages = create_pages_metadata(3, *assets, seed=5)
+    names = sorted(page.name for page in pages)
+
+    def listdir(folder):
+        raise Exception("The folder was listed")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(os, "listdir", listdir)
+        for name in names:
+            assert read_page_metadata(name)["name"] == name
+
+    # A range of the work queue generated again writes its pages
+    # to another shard
+    assert convert_metadata(METADATA_SINK_PARQUET) == 3
+    shard, = os.listdir(paths.GENERATED_METADATA_FOLDER)
+    shutil.copy(paths.GENERATED_METADATA_FOLDER + shard,
+                paths.GENERATED_METADATA_FOLDER + "metadata_again_00000.parquet")
+    store = MetadataStore()
+    assert len(store) == 3
+    assert sorted(name for name, _ in store) == names
+    assert convert_metadata(METADATA_SINK_JSON) == 3
+    assert sorted(os.listdir(paths.GENERATED_METADATA_FOLDER)) == \
+        [name + cfg.metadata_format for name in names]
+
+
+def test_load_metadata(illustrations, speech_bubble_files,
+                       tmp_path, monkeypatch):
+    """
+    A page loaded from its dumped metadata should dump
+    the same metadata
+    """
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(paths.GENERATED_METADATA_FOLDER)
+    pages = create_pages_metadata(4, *get_assets(illustrations,
+                                                 speech_bubble_files),
+                                  seed=8)
+    for page in pages:
+        filename = paths.GENERATED_METADATA_FOLDER + page.name + cfg.metadata_format
+        loaded = Page()
+        loaded.load_data(filename)
+        with open(filename) as f:
+            data = json.load(f)
+        assert loaded.name == page.name
+        assert json.loads(json.dumps(loaded.get_metadata())) == data
@@ -0,0 +1,186 @@
+import os
+import shutil
+import pytest
+import numpy as np
+import pandas as pd
+
+import paths
+from preprocesing.layout_engine.page_creator.create_page_metadata import create_pages_metadata
+from preprocesing.layout_engine.pages_pipeline import create_pages
+from preprocesing.layout_engine.render_engine import RENDER_BW
+from preprocesing import config_file as cfg
+from preprocesing.layout_engine.page_creator.page_plans import plan_pages
+from preprocesing.layout_engine.page_creator.page_seeds import (
+    get_page_seed_sequence,
+    get_shard_range,
+    parse_shard
+)
+
+
+def get_assets(illustrations, speech_bubble_files):
+    """
+    Get the assets pages are generated from
+
+    :return: Images, fonts, texts, speech bubbles, writing areas
+    and language in the order create_pages_metadata takes them
+
+    :rtype: tuple
+    """
+    writing_areas, font = speech_bubble_files
+    texts = pd.DataFrame({paths.ENGLISH_LANGUAGE: ["hello there", "no way"],
+                          paths.JAPANASE_LANGUAGE: ["こんにちは", "いいえ"]})
+    speech_bubbles = sorted(set(area["path"] for area in writing_areas))
+    return (illustrations, [font], texts, speech_bubbles, writing_areas,
+            paths.ENGLISH_LANGUAGE)
+
+
+def read_metadata():
+    """
+    Read back the dumped metadata files
+
+    :return: Contents of the metadata files by file name
+
+    :rtype: dict
+    """
+    metadata = {}
+    for filename in os.listdir(paths.GENERATED_METADATA_FOLDER):
+        with open(paths.GENERATED_METADATA_FOLDER + filename) as f:
+            metadata[filename] = f.read()
+    return metadata
+
+
+def create_metadata(n, seed, start, illustrations, speech_bubble_files):
+    """
+    Create the metadata of pages and read back their files
+
+    :return: Contents of the metadata files by page name
+
+    :rtype: dict
+    """
+    pages = create_pages_metadata(n, *get_assets(illustrations,
+                                                 speech_bubble_files),
+                                  seed=seed, start=start)
+    metadata = {}
+    for page in pages:
+        filename = paths.GENERATED_METADATA_FOLDER + page.name + ".json"
+        with open(filename) as f:
+            metadata[page.name] = f.read()
+    return metadata
+
+
+def test_page_seed_sequence():
+    """
+    A page's seed sequence should be the one spawned for it
+    no matter how many pages are spawned
+    """
+    spawned = np.random.SeedSequence(42).spawn(8)
+    for index in [0, 3, 7]:
+        sequence = get_page_seed_sequence(42, index)
+        assert (sequence.generate_state(4) ==
+                spawned[index].generate_state(4)).all()
+
+
+@pytest.mark.parametrize("n", [1, 7, 10])
+@pytest.mark.parametrize("shard_count", [1, 3, 4])
+def test_shard_range(n, shard_count):
+    """
+    The shards of a run should be disjoint and cover it
+    """
+    indices = []
+    for shard_index in range(shard_count):
+        start, count = get_shard_range(n, shard_index, shard_count)
+        indices.extend(range(start, start + count))
+    assert indices == list(range(n))
+
+
+def test_parse_shard():
+    """
+    Shards should be given as i/N with i in [0, N)
+    """
+    assert parse_shard("2/4") == (2, 4)
+    for shard in ["4/4", "-1/4", "1/0", "1", "a/b"]:
+        with pytest.raises(Exception):
+            parse_shard(shard)
+
+
+def test_page_plans(monkeypatch):
+    """
+    A page's plan should only depend on the seed and its index,
+    not on the batch it's drawn in, and stay within the assets
+    """
+    lens = (50, 7, 11, 13, 3)
+    plans = plan_pages(4, 0, 300, *lens)
+    shard = plan_pages(4, 120, 80, *lens)
+    monkeypatch.setattr(cfg, "page_plan_batch_size", 7)
+    batched = plan_pages(4, 0, 300, *lens)
+    for name, array in plans.items():
+        assert (array[120:200] == shard[name]).all()
+        assert (array == batched[name]).all()
+
+    assert set(plans["num_panels"]) <= set(cfg.num_pages_ratios)
+    assert set(plans["page_type"]) <= set(cfg.vertical_horizontal_ratios)
+    assert plans["images"].shape == (300, cfg.planned_panels_per_page)
+    assert plans["texts"].shape == (300, cfg.planned_panels_per_page,
+                                    cfg.max_speech_bubbles_per_panel, 3)
+    for name, high in (("images", 50), ("fonts", 7),
+                       ("speech_bubbles", 11), ("texts", 13)):
+        assert 0 <= plans[name].min() and plans[name].max() < high
+    assert (plans["num_speech_bubbles"] <
+            cfg.max_speech_bubbles_per_panel).all()
+
+    other = plan_pages(5, 0, 300, *lens)
+    assert not (other["texts"] == plans["texts"]).all()
+
+
+def test_seeded_pages(illustrations, speech_bubble_files, tmp_path,
+                      monkeypatch):
+    """
+    Seeded pages should be byte identical whether they're
+    generated in a batch or in shards
+
+    :param illustrations: Paths of the illustrations
+
+    :type illustrations: list
+
+    :param speech_bubble_files: Writing areas and font of the bubbles
+
+    :type speech_bubble_files: tuple
+    """
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(paths.GENERATED_METADATA_FOLDER)
+
+    batch = create_metadata(5, 7, 0, illustrations, speech_bubble_files)
+    first = create_metadata(2, 7, 0, illustrations, speech_bubble_files)
+    second = create_metadata(3, 7, 2, illustrations, speech_bubble_files)
+    assert batch == {**first, **second}
+
+    other = create_metadata(5, 8, 0, illustrations, speech_bubble_files)
+    assert not set(other) & set(batch)
+
+
+def test_streamed_pages(illustrations, speech_bubble_files, tmp_path,
+                        monkeypatch):
+    """
+    Pages streamed through the workers one at a time should be
+    the same as pages created in stages with the same seed
+
+    :param illustrations: Paths of the illustrations
+
+    :type illustrations: list
+
+    :param speech_bubble_files: Writing areas and font of the bubbles
+
+    :type speech_bubble_files: tuple
+    """
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(paths.GENERATED_METADATA_FOLDER)
+    assets = get_assets(illustrations, speech_bubble_files)
+
+    create_pages_metadata(6, *assets, seed=3)
+    staged = read_metadata()
+    shutil.rmtree(paths.GENERATED_METADATA_FOLDER)
+    os.makedirs(paths.GENERATED_METADATA_FOLDER)
+
+    created, failed = create_pages(6, *assets, [RENDER_BW], dry=True, seed=3)
+    assert (created, failed) == (6, 0)
+    assert read_metadata() == staged
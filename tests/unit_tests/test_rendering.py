@@ -0,0 +1,465 @@
+import os
+import json
+import pytest
+import numpy as np
+from PIL import Image
+
+import paths
+
+from preprocesing import config_file as cfg
+from preprocesing import crop_bounds_index
+from preprocesing.crop_bounds_index import create_crop_bounds_index
+from preprocesing.layout_engine.render_engine import (
+    RENDER_OUTPUTS,
+    RENDER_BW,
+    RENDER_COLORED,
+    RENDER_PANELS_MASK,
+    get_crop_box,
+    open_reduced
+)
+from preprocesing.layout_engine.illustration_cache import (
+    IllustrationCache,
+    illustration_cache
+)
+from preprocesing.layout_engine.compositors import (
+    COMPOSITOR_PIL,
+    COMPOSITOR_NUMPY
+)
+from preprocesing.layout_engine.pages_renderer import save_page_outputs
+from preprocesing.layout_engine.objects.compact_page import CompactPage
+from preprocesing.layout_engine.objects.speech_bubble import (
+    get_font,
+    fit_text,
+    get_speech_bubble_template,
+    speech_bubble_templates
+)
+from tests.factories import make_illustrations, make_pages, add_speech_bubbles
+
+# Resizing only a panel's box rounds the filter
+# weights slightly differently than a full resize
+PANEL_LOCAL_TOLERANCE = 2
+
+# The NumPy compositor's outlines have round joints and its
+# polygon edges are rasterized slightly differently
+COMPOSITOR_MAX_DIFFERING_PIXELS = 0.01
+
+
+@pytest.mark.parametrize("num_panels", [2, 3, 4, 5, 6, 7, 8])
+@pytest.mark.parametrize("colored", [False, True])
+def test_panel_local_compositing(num_panels, colored, illustrations,
+                                 monkeypatch):
+    """
+    Compositing within each panel's bounding box should match
+    compositing with full page masks within a tolerance
+
+    :param num_panels: Number of panels of the page
+
+    :type num_panels: int
+
+    :param colored: Whether to render the colored page
+
+    :type colored: bool
+
+    :param illustrations: Paths of the illustrations
+
+    :type illustrations: list
+    """
+    page = make_pages(1, illustrations, num_panels=num_panels)[0]
+    render = page.renderColored if colored else page.render
+
+    monkeypatch.setattr(cfg, "panel_local_compositing", False)
+    full = np.asarray(render(), dtype=int)
+
+    monkeypatch.setattr(cfg, "panel_local_compositing", True)
+    local = np.asarray(render(), dtype=int)
+
+    assert full.shape == local.shape
+    assert np.abs(full - local).max() <= PANEL_LOCAL_TOLERANCE
+
+
+def test_single_pass_outputs(illustrations):
+    """
+    Rendering every output in a single pass should
+    give the same pages as rendering them one by one
+
+    :param illustrations: Paths of the illustrations
+
+    :type illustrations: list
+    """
+    page = make_pages(1, illustrations, num_panels=6)[0]
+
+    images = page.render_outputs(RENDER_OUTPUTS)
+
+    assert set(images.keys()) == set(RENDER_OUTPUTS)
+    assert np.array_equal(np.asarray(images[RENDER_BW]),
+                          np.asarray(page.render()))
+    assert np.array_equal(np.asarray(images[RENDER_COLORED]),
+                          np.asarray(page.renderColored()))
+
+    panels_mask = np.asarray(images[RENDER_PANELS_MASK])
+    assert panels_mask.shape == (cfg.page_height, cfg.page_width)
+    assert panels_mask.max() == 255
+
+
+def test_segmented_masks(illustrations, speech_bubble_files, tmp_path,
+                         monkeypatch):
+    """
+    The masks of every category should be the union of its masks
+    of single panels and speech bubbles, which are one per annotation
+
+    :param illustrations: Paths of the illustrations
+
+    :type illustrations: list
+
+    :param speech_bubble_files: Writing areas and font of the bubbles
+
+    :type speech_bubble_files: tuple
+    """
+    monkeypatch.chdir(tmp_path)
+    paths.makeFolders(paths.GENERATED_FOLDER_PATHS)
+    page = make_pages(1, illustrations, num_panels=4)[0]
+    add_speech_bubbles([page], *speech_bubble_files)
+    save_page_outputs(CompactPage(page), [RENDER_BW], segmented=True)
+
+    folder = paths.GENERATED_SEGMENTED_FOLDER + page.name + "/"
+    with open(folder + paths.GENERATED_ANNOTATIONS_FILENAME) as f:
+        annotations = json.load(f)
+    for category in ["panels", "speech_bubbles"]:
+        masks = os.listdir(folder + category)
+        assert len(masks) == len(annotations[category]) > 0
+        union = np.zeros((cfg.page_height, cfg.page_width), bool)
+        for mask in masks:
+            union |= np.asarray(Image.open(folder + category + "/" + mask)) > 127
+        mask = np.asarray(Image.open(folder + category + "_mask" +
+                                     cfg.output_format)) > 127
+        assert np.array_equal(mask, union)
+
+
+def test_illustration_cache_eviction():
+    """
+    The cache should count hits and misses and evict the
+    least recently used entries once it's over its budget
+    """
+    cache = IllustrationCache(max_bytes=20)
+
+    assert cache.get("a", lambda: ("a", 10)) == "a"
+    assert cache.get("b", lambda: ("b", 10)) == "b"
+    assert cache.get("a", lambda: ("other", 10)) == "a"
+
+    # Evicts b which is the least recently used
+    cache.get("c", lambda: ("c", 10))
+    assert list(cache.entries.keys()) == ["a", "c"]
+
+    # Entries over the budget aren't stored
+    cache.get("d", lambda: ("d", 30))
+    assert "d" not in cache.entries
+
+    stats = cache.get_stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 4
+    assert stats["evictions"] == 1
+    assert stats["nbytes"] == 20
+
+
+def test_cached_rendering(illustrations, monkeypatch):
+    """
+    Rendering with a warm illustration cache should give
+    the same page as rendering without it
+
+    :param illustrations: Paths of the illustrations
+
+    :type illustrations: list
+    """
+    page = make_pages(1, illustrations, num_panels=8)[0]
+    page.background = illustrations[0]
+
+    monkeypatch.setattr(illustration_cache, "max_bytes", 0)
+    uncached = page.render_outputs(RENDER_OUTPUTS)
+
+    monkeypatch.setattr(illustration_cache, "max_bytes", 1024**3)
+    page.render_outputs(RENDER_OUTPUTS)
+    hits = illustration_cache.hits
+    cached = page.render_outputs(RENDER_OUTPUTS)
+
+    assert illustration_cache.hits > hits
+    for output in RENDER_OUTPUTS:
+        assert np.array_equal(np.asarray(uncached[output]),
+                              np.asarray(cached[output]))
+    illustration_cache.clear()
+
+
+def test_crop_bounds_index(illustrations, tmp_path, monkeypatch):
+    """
+    Rendering with crop bounds from the index should give the
+    same page as scanning the illustrations for their borders
+
+    :param illustrations: Paths of the illustrations
+
+    :type illustrations: list
+    """
+    monkeypatch.setattr(illustration_cache, "max_bytes", 0)
+    page = make_pages(1, illustrations, num_panels=5)[0]
+    page.background = illustrations[1]
+    scanned = page.render_outputs([RENDER_BW, RENDER_COLORED])
+
+    folder = os.path.dirname(os.path.dirname(os.path.dirname(illustrations[0])))
+    index = create_crop_bounds_index(
+        folders=[os.path.join(folder, "bw"), os.path.join(folder, "colored")],
+        index_file=str(tmp_path / "crop_bounds.npz"))
+    assert len(index) == 2*len(illustrations)
+
+    monkeypatch.setattr(crop_bounds_index, "_crop_bounds_index", index)
+    monkeypatch.setattr(crop_bounds_index, "_crop_bounds_index_loaded", True)
+    indexed = page.render_outputs([RENDER_BW, RENDER_COLORED])
+
+    for output in [RENDER_BW, RENDER_COLORED]:
+        assert np.array_equal(np.asarray(scanned[output]),
+                              np.asarray(indexed[output]))
+
+
+def test_outdated_crop_bounds_index(tmp_path):
+    """
+    Illustrations added or replaced after the index was
+    created shouldn't be looked up in it
+    """
+    images = make_illustrations(str(tmp_path), count=3)
+    index_file = str(tmp_path / "crop_bounds.npz")
+    create_crop_bounds_index(folders=[str(tmp_path / "bw")],
+                             index_file=index_file)
+    index = crop_bounds_index.CropBoundsIndex.load(index_file)
+    assert all(index.get(image) is not None for image in images)
+
+    added = make_illustrations(str(tmp_path / "added"), count=1)[0]
+    replaced = images[1]
+    os.replace(added, replaced)
+    assert index.get(replaced) is None
+    assert index.get(images[0]) is not None
+    assert index.outdated == 1
+
+
+def test_reduced_decode(tmp_path, monkeypatch):
+    """
+    Illustrations twice the page's size should be decoded
+    at half their size and render close to a full decode
+    """
+    images = make_illustrations(str(tmp_path), count=2,
+                                min_size=2*cfg.page_height,
+                                max_size=2*cfg.page_height + 100)
+    index = create_crop_bounds_index(
+        folders=[str(tmp_path / "bw"), str(tmp_path / "colored")],
+        index_file=str(tmp_path / "crop_bounds.npz"))
+    monkeypatch.setattr(crop_bounds_index, "_crop_bounds_index", index)
+    monkeypatch.setattr(crop_bounds_index, "_crop_bounds_index_loaded", True)
+    monkeypatch.setattr(illustration_cache, "max_bytes", 0)
+
+    img, box = open_reduced(images[0], "L", get_crop_box(images[0]))
+    assert img.size[0] < 2*cfg.page_height
+    assert box[2] - box[0] >= cfg.page_width
+
+    page = make_pages(1, images, num_panels=3)[0]
+
+    monkeypatch.setattr(cfg, "reduced_decode", False)
+    full = np.asarray(page.render(), dtype=int)
+
+    monkeypatch.setattr(cfg, "reduced_decode", True)
+    reduced = np.asarray(page.render(), dtype=int)
+
+    assert np.abs(full - reduced).mean() < 2
+
+    # Illustrations decoded at a reduced size stay
+    # cached apart from the ones decoded at full size
+    monkeypatch.setattr(illustration_cache, "max_bytes", 1024**3)
+    illustration_cache.clear()
+    page.background = images[1]
+    page.render()
+    monkeypatch.setattr(cfg, "reduced_decode", False)
+    cached = page.render()
+    illustration_cache.clear()
+    assert np.array_equal(np.asarray(cached), np.asarray(page.render()))
+    illustration_cache.clear()
+
+
+@pytest.mark.parametrize("num_panels", [1, 2, 3, 4, 5, 6, 7, 8])
+@pytest.mark.parametrize("speech_bubbles", [False, True])
+def test_numpy_compositor(num_panels, speech_bubbles, illustrations,
+                          speech_bubble_files, monkeypatch):
+    """
+    The NumPy compositor should draw the same pages as
+    the PIL compositor except around the edges
+
+    :param num_panels: Number of panels of the page
+
+    :type num_panels: int
+
+    :param speech_bubbles: Whether or not to populate the panels
+
+    :type speech_bubbles: bool
+
+    :param illustrations: Paths of the illustrations
+
+    :type illustrations: list
+
+    :param speech_bubble_files: Writing areas and font of the bubbles
+
+    :type speech_bubble_files: tuple
+    """
+    page = make_pages(1, illustrations, num_panels=num_panels)[0]
+    if speech_bubbles:
+        add_speech_bubbles([page], *speech_bubble_files)
+
+    images = {}
+    for compositor in [COMPOSITOR_PIL, COMPOSITOR_NUMPY]:
+        monkeypatch.setattr(cfg, "compositor", compositor)
+        images[compositor] = page.render_outputs(RENDER_OUTPUTS)
+
+    for output in RENDER_OUTPUTS:
+        pil = images[COMPOSITOR_PIL][output]
+        numpy = images[COMPOSITOR_NUMPY][output]
+        assert pil.mode == numpy.mode and pil.size == numpy.size
+
+        differing = np.asarray(pil) != np.asarray(numpy)
+        if differing.ndim == 3:
+            differing = differing.any(axis=2)
+        assert differing.mean() <= COMPOSITOR_MAX_DIFFERING_PIXELS
+
+
+def test_numpy_compositor_buffers(illustrations, monkeypatch):
+    """
+    Rendering a page with the NumPy compositor shouldn't
+    change the images of pages rendered before it
+
+    :param illustrations: Paths of the illustrations
+
+    :type illustrations: list
+    """
+    monkeypatch.setattr(cfg, "compositor", COMPOSITOR_NUMPY)
+    first, second = make_pages(2, illustrations, num_panels=4)
+
+    image = first.render_outputs([RENDER_BW])[RENDER_BW]
+    before = np.array(image)
+    second.render_outputs([RENDER_BW])
+
+    assert (np.asarray(image) == before).all()
+
+
+@pytest.mark.parametrize("compositor", [COMPOSITOR_PIL, COMPOSITOR_NUMPY])
+def test_grayscale_bw_pages(compositor, illustrations, speech_bubble_files,
+                            monkeypatch):
+    """
+    Black and white pages rendered in grayscale should match
+    pages rendered in color and converted when saving
+
+    :param compositor: Compositor to draw the pages with
+
+    :type compositor: str
+
+    :param illustrations: Paths of the illustrations
+
+    :type illustrations: list
+
+    :param speech_bubble_files: Writing areas and font of the bubbles
+
+    :type speech_bubble_files: tuple
+    """
+    monkeypatch.setattr(cfg, "compositor", compositor)
+    page = make_pages(1, illustrations, num_panels=4)[0]
+    add_speech_bubbles([page], *speech_bubble_files)
+    for panel in page.leaf_children:
+        for speech_bubble in panel.speech_bubbles[:1]:
+            speech_bubble.transforms.append("invert")
+
+    monkeypatch.setattr(cfg, "grayscale_bw_pages", False)
+    color = page.render()
+
+    monkeypatch.setattr(cfg, "grayscale_bw_pages", True)
+    grayscale = page.render()
+
+    assert color.mode == "RGB" and grayscale.mode == "L"
+    difference = np.abs(np.asarray(color.convert("L"), dtype=int) -
+                        np.asarray(grayscale, dtype=int))
+    assert difference.max() <= 1
+
+
+def test_speech_bubble_grayscale_inversion(illustrations, speech_bubble_files):
+    """
+    Inverted speech bubbles rendered in grayscale should
+    match converted inverted speech bubbles
+
+    :param illustrations: Paths of the illustrations
+
+    :type illustrations: list
+
+    :param speech_bubble_files: Writing areas and font of the bubbles
+
+    :type speech_bubble_files: tuple
+    """
+    page = make_pages(1, illustrations, num_panels=2)[0]
+    add_speech_bubbles([page], *speech_bubble_files)
+    speech_bubble = page.leaf_children[0].speech_bubbles[0]
+    speech_bubble.transforms.append("invert")
+
+    color, location = speech_bubble.render("RGBA")
+    grayscale, grayscale_location = speech_bubble.render("LA")
+
+    assert grayscale.mode == "LA" and location == grayscale_location
+    difference = np.abs(np.asarray(color.convert("LA"), dtype=int) -
+                        np.asarray(grayscale, dtype=int))
+    assert difference.max() <= 1
+    # Inverted bubbles are dark where their template is opaque
+    luminance, alpha = grayscale.split()
+    assert np.asarray(luminance)[np.asarray(alpha) == 255].mean() < 128
+
+
+def test_fit_text(speech_bubble_files):
+    """
+    Fonts should be loaded once per size and text should be fit
+    to the width within the allowed font sizes
+
+    :param speech_bubble_files: Writing areas and font of the bubbles
+
+    :type speech_bubble_files: tuple
+    """
+    _, font_path = speech_bubble_files
+    get_font.cache_clear()
+
+    for width in [10, 150, 200, 5000]:
+        font, (w, h) = fit_text(font_path, "hello there\nno way", width)
+        assert cfg.min_font_size <= font.size <= cfg.max_font_size
+        if cfg.min_font_size < font.size < cfg.max_font_size:
+            assert abs(w - width) <= w/font.size + 1
+    assert get_font(font_path, cfg.min_font_size) is get_font(font_path,
+                                                              cfg.min_font_size)
+    assert get_font.cache_info().misses <= 4
+
+
+def test_speech_bubble_templates(illustrations, speech_bubble_files):
+    """
+    Speech bubble templates should be decoded once per mode and
+    inversion and stay unchanged by the bubbles rendered from them
+
+    :param illustrations: Paths of the illustrations
+
+    :type illustrations: list
+
+    :param speech_bubble_files: Writing areas and font of the bubbles
+
+    :type speech_bubble_files: tuple
+    """
+    page = make_pages(1, illustrations, num_panels=2)[0]
+    add_speech_bubbles([page], *speech_bubble_files)
+    speech_bubble = page.leaf_children[0].speech_bubbles[0]
+    speech_bubble_templates.clear()
+
+    template = get_speech_bubble_template(speech_bubble.speech_bubble, "LA")
+    before = np.array(template)
+    first, _ = speech_bubble.render("LA")
+    second, _ = speech_bubble.render("LA")
+
+    assert (np.asarray(template) == before).all()
+    assert (np.asarray(first) == np.asarray(second)).all()
+    assert speech_bubble_templates.misses == 1
+
+    inverted = get_speech_bubble_template(speech_bubble.speech_bubble, "LA",
+                                          inverted=True)
+    assert (np.asarray(inverted)[..., 0] == 255 - before[..., 0]).all()
+    assert (np.asarray(inverted)[..., 1] == before[..., 1]).all()
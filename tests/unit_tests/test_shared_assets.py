@@ -0,0 +1,63 @@
+import pickle
+import pytest
+import numpy as np
+from PIL import Image
+from multiprocessing import shared_memory
+
+from tests.factories import make_speech_bubbles
+from preprocesing.speech_bubble_writing_area import get_speech_bubble_templates
+from preprocesing.layout_engine.page_creator.create_page_metadata import get_no_empty_writing_areas
+from preprocesing.layout_engine.objects.speech_bubble import get_speech_bubble_template
+from preprocesing.layout_engine.shared_assets import (
+    create_shared_assets,
+    get_shared_assets,
+    get_template_nbytes,
+    init_shared_assets
+)
+
+
+def test_shared_assets(tmp_path):
+    """
+    Shared templates and writing areas should be what workers
+    decode and load themselves, also once they're attached
+    to from a pickle, and the block removed once it's closed
+    """
+    writing_areas = make_speech_bubbles(str(tmp_path), count=3)
+    writing_areas.append(dict(writing_areas[0], x=2, y=3))
+    no_empty_writing_areas = get_no_empty_writing_areas(writing_areas)
+    speech_bubbles = list(no_empty_writing_areas.keys())
+    templates = get_speech_bubble_templates(speech_bubbles)
+
+    shared_assets = create_shared_assets(speech_bubbles, templates,
+                                         ["RGBA", "LA"],
+                                         no_empty_writing_areas)
+    attached = pickle.loads(pickle.dumps(shared_assets))
+    for assets in (shared_assets, attached):
+        for path in speech_bubbles:
+            assert assets.writing_areas[path] == no_empty_writing_areas[path]
+            for mode in ("RGBA", "LA"):
+                template = assets.get_template(path, mode)
+                assert template.mode == mode
+                assert np.array_equal(np.asarray(template),
+                                      np.asarray(Image.open(path).convert(mode)))
+    assert len(attached.writing_areas[speech_bubbles[0]]) == 2
+    attached.close()
+
+    init_shared_assets(shared_assets)
+    template = get_speech_bubble_template(speech_bubbles[1], "RGBA")
+    assert template.readonly
+    inverted = get_speech_bubble_template(speech_bubbles[1], "RGBA", True)
+    assert not np.array_equal(np.asarray(inverted), np.asarray(template))
+    del template
+    shared_assets.close()
+    assert get_shared_assets() is None
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name=shared_assets.memory.name)
+
+    # Templates over the budget are left for the workers
+    max_bytes = get_template_nbytes(templates[speech_bubbles[0]], "LA")
+    shared_assets = create_shared_assets(speech_bubbles, templates, ["LA"],
+                                         max_bytes=max_bytes)
+    assert shared_assets.get_template(speech_bubbles[0], "LA") is not None
+    assert shared_assets.get_template(speech_bubbles[1], "LA") is None
+    shared_assets.close()
@@ -0,0 +1,63 @@
+import os
+import sys
+import subprocess
+
+# Modules only some of the actions need
+LATE_MODULES = ["pandas", "dask", "scipy", "pytest", "fontTools",
+                "pdf2image", "requests", "bs4", "cv2", "pyarrow"]
+
+# Late modules creating the pages' metadata needs itself
+# since the texts are read from an Arrow store
+METADATA_MODULES = ["pyarrow"]
+
+METADATA_IMPORTS = """
+import main
+from preprocesing.generation_assets import GenerationAssets
+from preprocesing.layout_engine.page_creator.create_page_metadata import create_pages_metadata
+"""
+
+
+def get_imported_modules(code):
+    """
+    Run code in a new interpreter with -X importtime, the
+    time it takes is measured by benchmarks.benchmark_startup
+
+    :param code: Code to run
+
+    :type code: str
+
+    :return: Names of the modules it imported
+
+    :rtype: set
+    """
+    root = os.path.dirname(os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__))))
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                            cwd=root, capture_output=True, text=True,
+                            check=True)
+    modules = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        modules.add(line.split("|")[2].strip())
+    return modules
+
+
+def test_main_startup():
+    """
+    Starting main shouldn't import what any of the actions need
+    """
+    modules = get_imported_modules("import main")
+    assert "main" in modules
+    assert [module for module in LATE_MODULES if module in modules] == []
+
+
+def test_metadata_startup():
+    """
+    Starting to create metadata shouldn't import what
+    other actions need
+    """
+    modules = get_imported_modules(METADATA_IMPORTS)
+    assert "preprocesing.layout_engine.page_creator.create_page_metadata" in modules
+    assert [module for module in LATE_MODULES
+            if module in modules and module not in METADATA_MODULES] == []
@@ -0,0 +1,67 @@
+import os
+import pickle
+import pandas as pd
+
+import paths
+from preprocesing.text_store import (
+    TextStore,
+    create_text_store,
+    load_text_store,
+    open_text_store
+)
+from preprocesing.layout_engine.page_creator.create_page_metadata import create_pages_metadata
+from test_page_seeds import get_assets, read_metadata
+
+
+def test_text_store(tmp_path):
+    """
+    Texts looked up from a mapped store should be the texts of the
+    dataset and the store should only pickle its filename
+    """
+    texts = pd.DataFrame({paths.ENGLISH_LANGUAGE: ["hi", None, "run", "ok"],
+                          paths.JAPANASE_LANGUAGE: ["やあ", "え", "", "はい"]},
+                         index=[5, 6, 7, 8])
+    source = str(tmp_path / "texts.parquet")
+    texts.to_parquet(source)
+    filename = str(tmp_path / "texts.arrow")
+    create_text_store(source, filename)
+
+    store = open_text_store(filename)
+    assert len(store) == 4
+    assert store.languages == [paths.ENGLISH_LANGUAGE, paths.JAPANASE_LANGUAGE]
+    assert store.get_texts([3, 0, 1, 3]) == [
+        {paths.ENGLISH_LANGUAGE: "ok", paths.JAPANASE_LANGUAGE: "はい"},
+        {paths.ENGLISH_LANGUAGE: "hi", paths.JAPANASE_LANGUAGE: "やあ"},
+        {paths.ENGLISH_LANGUAGE: "", paths.JAPANASE_LANGUAGE: "え"},
+        {paths.ENGLISH_LANGUAGE: "ok", paths.JAPANASE_LANGUAGE: "はい"}]
+    assert TextStore.from_dataframe(texts).get_texts([2, 0]) == store.get_texts([2, 0])
+
+    pickled = pickle.dumps(store)
+    assert len(pickled) < 200
+    assert pickle.loads(pickled) is store
+
+    # The store is created again once the dataset changes
+    assert load_text_store(source, filename) is store
+    os.utime(filename, (0, 0))
+    assert load_text_store(source, filename) is not store
+
+
+def test_pages_from_text_store(illustrations, speech_bubble_files,
+                               tmp_path, monkeypatch):
+    """
+    Pages whose texts are looked up from a mapped store should be
+    the pages created from the DataFrame of the same texts
+    """
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(paths.GENERATED_METADATA_FOLDER)
+    assets = get_assets(illustrations, speech_bubble_files)
+    create_pages_metadata(6, *assets, seed=9)
+    expected = read_metadata()
+
+    texts = assets[2]
+    texts.to_parquet("texts.parquet")
+    store = load_text_store("texts.parquet", "texts.arrow")
+    for filename in os.listdir(paths.GENERATED_METADATA_FOLDER):
+        os.remove(paths.GENERATED_METADATA_FOLDER + filename)
+    create_pages_metadata(6, *assets[:2], store, *assets[3:], seed=9)
+    assert read_metadata() == expected
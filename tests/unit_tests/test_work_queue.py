@@ -0,0 +1,247 @@
+import os
+import time
+import pytest
+import multiprocessing
+from types import SimpleNamespace
+
+import paths
+from preprocesing import config_file as cfg
+from preprocesing import work_queue
+from preprocesing.layout_engine import pages_pipeline, pages_renderer
+from preprocesing.multiprocessing import EXECUTOR_INLINE
+from preprocesing.layout_engine.page_creator.create_page_metadata import create_pages_metadata
+from preprocesing.layout_engine.render_engine import RENDER_BW
+from preprocesing.work_queue import (
+    TASK_DONE,
+    TASK_FAILED,
+    TASK_LEASED,
+    TASK_PENDING,
+    WorkQueue,
+    run_worker
+)
+from test_page_seeds import get_assets, read_metadata
+
+
+def get_run(n, seed=3, stream=True):
+    """
+    Get the options of a dry run in black and white
+
+    :rtype: dict
+    """
+    return dict(n=n, seed=seed, language=paths.ENGLISH_LANGUAGE,
+                outputs=[RENDER_BW], segmented=False, dry=True,
+                stream=stream, metadata_sink=cfg.metadata_sink,
+                compositor=cfg.compositor, use_layout_bank=False)
+
+
+def work(filename, assets, worker, results):
+    """
+    Run a worker in a process of its own and send back
+    the number of ranges it did
+    """
+    results.put(run_worker(filename, assets, worker))
+
+
+def hang(filename, assets, worker, started):
+    """
+    Run a worker whose first range never ends, the test kills
+    it once it's generating the range
+    """
+    def generate_range(run, assets, start, n):
+        started.set()
+        time.sleep(60)
+    work_queue.generate_range = generate_range
+    run_worker(filename, assets, worker)
+
+
+def get_single_run(illustrations, speech_bubble_files, n):
+    """
+    Create the metadata of a single run with the seed of get_run,
+    the metadata folder is emptied again
+
+    :return: The assets and the metadata of the pages
+
+    :rtype: tuple
+    """
+    images, fonts, texts, speech_bubbles, writing_areas, language = \
+        get_assets(illustrations, speech_bubble_files)
+    os.makedirs(paths.GENERATED_METADATA_FOLDER)
+    create_pages_metadata(n, images, fonts, texts, speech_bubbles,
+                          writing_areas, language, seed=3)
+    single = read_metadata()
+
+    for filename in os.listdir(paths.GENERATED_METADATA_FOLDER):
+        os.remove(paths.GENERATED_METADATA_FOLDER + filename)
+    assets = SimpleNamespace(images=images, fonts=fonts, texts=texts,
+                             speech_bubbles=speech_bubbles,
+                             speech_bubbles_writing_areas=writing_areas,
+                             speech_bubble_templates=None)
+    return assets, single
+
+
+def test_work_queue(tmp_path, monkeypatch):
+    """
+    Ranges should be leased by one worker at a time, leased
+    again once their lease ended and marked as failed once
+    they were leased too many times
+    """
+    monkeypatch.setattr(cfg, "work_queue_max_attempts", 2)
+    queue = WorkQueue(str(tmp_path / "queue.sqlite"))
+    assert queue.get_run() is None
+    with pytest.raises(Exception):
+        queue.enqueue(get_run(5, seed=None), 5, 2)
+    assert queue.enqueue(get_run(5), 5, 2) == 3
+    assert queue.get_run() == get_run(5)
+    with pytest.raises(Exception):
+        queue.enqueue(get_run(5), 5, 2)
+
+    first = queue.claim("a")
+    assert first[1:] == (0, 2)
+    assert queue.claim("b")[1:] == (2, 2)
+    # The range's lease ends at once, as if its worker crashed
+    assert queue.claim("c", lease_seconds=0)[1:] == (4, 1)
+    time.sleep(0.01)
+    crashed = queue.claim("d", lease_seconds=0)
+    assert crashed[1:] == (4, 1)
+    assert not queue.complete(crashed[0], "c", 1, 0)
+    assert not queue.renew(first[0], "b")
+    assert queue.renew(first[0], "a")
+    assert queue.complete(first[0], "a", 2, 0)
+
+    # The range was leased twice without being done
+    time.sleep(0.01)
+    assert queue.claim("e") is None
+    counts = queue.get_counts()
+    assert (counts[TASK_PENDING], counts[TASK_LEASED], counts[TASK_DONE],
+            counts[TASK_FAILED]) == (0, 1, 1, 1)
+    assert (counts["pages_created"], counts["pages_failed"]) == (2, 0)
+    queue.close()
+
+
+def test_run_worker(illustrations, speech_bubble_files, tmp_path,
+                    monkeypatch):
+    """
+    Workers of a queue should create the pages a single run
+    creates with the same seed, also the ones of a range
+    whose worker crashed
+
+    :param illustrations: Paths of the illustrations
+
+    :type illustrations: list
+
+    :param speech_bubble_files: Writing areas and font of the bubbles
+
+    :type speech_bubble_files: tuple
+    """
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(cfg, "metadata_sink", cfg.metadata_sink)
+    monkeypatch.setattr(cfg, "compositor", cfg.compositor)
+    monkeypatch.setattr(cfg, "use_layout_bank", cfg.use_layout_bank)
+    assets, single = get_single_run(illustrations, speech_bubble_files, 6)
+    # The run doesn't use the layout bank, there's none to load
+    cfg.use_layout_bank = True
+
+    queue = WorkQueue("queue.sqlite")
+    queue.enqueue(get_run(6), 6, 2)
+    queue.claim("crashed", lease_seconds=0)
+    time.sleep(0.01)
+
+    assert run_worker("queue.sqlite", assets, "worker") == 3
+    assert not cfg.use_layout_bank
+    assert read_metadata() == single
+    counts = queue.get_counts()
+    assert counts[TASK_DONE] == 3
+    assert (counts["pages_created"], counts["pages_failed"]) == (6, 0)
+    queue.close()
+
+
+@pytest.mark.parametrize("stream", [True, False])
+def test_worker_render_failures(illustrations, speech_bubble_files, tmp_path,
+                                monkeypatch, stream):
+    """
+    Pages which couldn't be rendered should be counted as
+    failed whether the run is streamed or staged
+
+    :param illustrations: Paths of the illustrations
+
+    :type illustrations: list
+
+    :param speech_bubble_files: Writing areas and font of the bubbles
+
+    :type speech_bubble_files: tuple
+    """
+    def save_page_outputs(page, outputs, segmented=False, dry=False):
+        raise Exception("Rendering failed")
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(cfg, "metadata_sink", cfg.metadata_sink)
+    monkeypatch.setattr(cfg, "compositor", cfg.compositor)
+    monkeypatch.setattr(cfg, "use_layout_bank", cfg.use_layout_bank)
+    monkeypatch.setattr(cfg, "pool_backend", EXECUTOR_INLINE)
+    monkeypatch.setattr(pages_renderer, "save_page_outputs", save_page_outputs)
+    monkeypatch.setattr(pages_pipeline, "save_page_outputs", save_page_outputs)
+    assets, _ = get_single_run(illustrations, speech_bubble_files, 4)
+
+    queue = WorkQueue("queue.sqlite")
+    queue.enqueue(get_run(4, stream=stream), 4, 2)
+    assert run_worker("queue.sqlite", assets, "worker") == 2
+    counts = queue.get_counts()
+    assert (counts["pages_created"], counts["pages_failed"]) == (0, 4)
+    queue.close()
+
+
+@pytest.mark.parametrize("stream", [True, False])
+def test_worker_processes(illustrations, speech_bubble_files, tmp_path,
+                          monkeypatch, stream):
+    """
+    Worker processes sharing a queue should do every range once,
+    the range of a worker killed while generating it included,
+    and create the pages a single run creates with the same seed
+
+    :param illustrations: Paths of the illustrations
+
+    :type illustrations: list
+
+    :param speech_bubble_files: Writing areas and font of the bubbles
+
+    :type speech_bubble_files: tuple
+    """
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(cfg, "metadata_sink", cfg.metadata_sink)
+    monkeypatch.setattr(cfg, "compositor", cfg.compositor)
+    monkeypatch.setattr(cfg, "use_layout_bank", cfg.use_layout_bank)
+    monkeypatch.setattr(cfg, "pool_backend", EXECUTOR_INLINE)
+    monkeypatch.setattr(cfg, "work_queue_lease_seconds", 1)
+    monkeypatch.setattr(cfg, "work_queue_poll_seconds", 0.1)
+    assets, single = get_single_run(illustrations, speech_bubble_files, 8)
+
+    queue = WorkQueue("queue.sqlite")
+    queue.enqueue(get_run(8, stream=stream), 8, 2)
+    context = multiprocessing.get_context("fork")
+    started = context.Event()
+    results = context.Queue()
+    killed = context.Process(target=hang, args=("queue.sqlite", assets,
+                                                "killed", started))
+    workers = [context.Process(target=work,
+                               args=("queue.sqlite", assets, str(i), results))
+               for i in range(3)]
+    try:
+        killed.start()
+        assert started.wait(30)
+        for process in workers:
+            process.start()
+        killed.kill()
+        done = [results.get(timeout=30) for _ in workers]
+    finally:
+        for process in [killed] + workers:
+            if process.is_alive():
+                process.kill()
+            process.join()
+
+    assert sum(done) == 4
+    assert read_metadata() == single
+    counts = queue.get_counts()
+    assert (counts[TASK_PENDING], counts[TASK_LEASED], counts[TASK_DONE],
+            counts[TASK_FAILED]) == (0, 0, 4, 0)
+    assert (counts["pages_created"], counts["pages_failed"]) == (8, 0)
+    queue.close()
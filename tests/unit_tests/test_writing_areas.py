@@ -0,0 +1,74 @@
+import os
+import cv2
+import PIL.Image
+
+import paths
+from tests.factories import make_speech_bubbles
+from preprocesing.speech_bubble_writing_area import (
+    create_speech_bubbles_writing_areas,
+    load_speech_bubbles_writing_areas
+)
+from preprocesing.layout_engine.page_creator.create_page_metadata import create_pages_metadata
+from test_page_seeds import get_assets, read_metadata
+
+
+def test_writing_areas_templates(tmp_path, monkeypatch):
+    """
+    The writing areas file should store the size and the visible
+    box of every template, and older files without them should
+    still load with the templates' sizes
+    """
+    folder = str(tmp_path / "bubbles") + "/"
+    file = str(tmp_path / "writing_areas.csv")
+    monkeypatch.setattr(paths, "DATASET_IMAGES_SPEECH_BUBBLES_FOLDER", folder)
+    monkeypatch.setattr(paths, "DATASET_IMAGES_SPEECH_BUBBLES_WRITING_AREAS_FILE",
+                        file)
+    make_speech_bubbles(folder)
+    create_speech_bubbles_writing_areas(save=False)
+
+    writing_areas, templates = load_speech_bubbles_writing_areas(file)
+    assert len(templates) == len(os.listdir(folder))
+    for path, template in templates.items():
+        w, h = PIL.Image.open(path).size
+        # The bubbles are ellipses drawn 4 pixels inside the template
+        assert template == dict(width=w, height=h, bbox=(4, 4, w - 8, h - 8))
+
+    with open(file) as f:
+        lines = f.readlines()
+    with open(file, "w") as f:
+        f.writelines(",".join(line.split(",")[:5]) + "\n" for line in lines)
+    old_writing_areas, old_templates = load_speech_bubbles_writing_areas(file)
+    assert old_writing_areas == writing_areas
+    for path, template in old_templates.items():
+        assert (template["width"], template["height"]) == \
+            (templates[path]["width"], templates[path]["height"])
+
+
+def test_metadata_without_decoding(illustrations, speech_bubble_files,
+                                   tmp_path, monkeypatch):
+    """
+    Given the templates, generating metadata shouldn't open
+    any speech bubble and should give the same pages
+    """
+    monkeypatch.chdir(tmp_path)
+    assets = get_assets(illustrations, speech_bubble_files)
+    templates = {}
+    for area in assets[4]:
+        w, h = PIL.Image.open(area["path"]).size
+        templates[area["path"]] = dict(width=w, height=h, bbox=(0, 0, w, h))
+
+    os.makedirs(paths.GENERATED_METADATA_FOLDER)
+    create_pages_metadata(6, *assets, seed=4)
+    expected = read_metadata()
+
+    def fail(*args, **kwargs):
+        raise AssertionError("A speech bubble was opened")
+
+    monkeypatch.setattr(cv2, "imread", fail)
+    monkeypatch.setattr(PIL.Image, "open", fail)
+    os.makedirs("second")
+    monkeypatch.chdir("second")
+    os.makedirs(paths.GENERATED_METADATA_FOLDER)
+    create_pages_metadata(6, *assets, speech_bubble_templates=templates,
+                          seed=4)
+    assert read_metadata() == expected